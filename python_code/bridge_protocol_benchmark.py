@@ -0,0 +1,86 @@
+import argparse
+import random
+import timeit
+
+from common import EMPTY, AllKeyValueFactory, IntKeyValueFactory
+from js_reimpl_common import CODECS, dump_pairs
+
+
+def setitem_request(dump_obj, keys, values):
+    return {"dict": "dict32", "op": "__setitem__", "args": {"key": dump_obj(keys[0]), "value": dump_obj(values[0])}, "session": True}
+
+
+def getitem_response(dump_obj, keys, values):
+    return {"exception": False, "result": dump_obj(values[0])}
+
+
+def batch_request(dump_obj, keys, values):
+    return {"batch": [
+        {"dict": "dict32", "op": "__setitem__", "args": {"key": dump_obj(k), "value": dump_obj(v)}, "session": True}
+        for k, v in zip(keys, values)
+    ]}
+
+
+def init_request(dump_obj, keys, values):
+    return {"dict": "dict32", "op": "__init__", "args": {"pairs": dump_pairs(zip(keys, values), dump_obj)}, "session": True}
+
+
+# what every op of the non-session mode sends and gets back: the whole table, 2/3 full
+def table_state(dump_obj, keys, values):
+    slots = []
+    for k, v in zip(keys, values):
+        slots.append({"hashCode": str(hash(k)), "key": dump_obj(k), "value": dump_obj(v)})
+        if len(slots) % 2 == 0:
+            slots.append({"hashCode": None, "key": dump_obj(EMPTY), "value": dump_obj(EMPTY)})
+    return {"exception": False, "result": None, "self": {"slots": slots, "used": len(keys), "fill": len(keys)}}
+
+
+MESSAGES = [
+    ("setitem", setitem_request),
+    ("getitem response", getitem_response),
+    ("batch of setitems", batch_request),
+    ("init", init_request),
+    ("table state", table_state),
+]
+
+
+def run(kv_factory, num_keys, num_messages):
+    keys = [kv_factory.generate_key() for _ in range(num_keys)]
+    values = [kv_factory.generate_value() for _ in range(num_keys)]
+    timer = timeit.default_timer
+
+    for name, make_message in MESSAGES:
+        for codec_name in sorted(CODECS):
+            codec = CODECS[codec_name]
+            # the dump of the python objects is a part of encoding: for json, it's where ints get wrapped in dicts
+            start = timer()
+            for _ in range(num_messages):
+                frame = codec.encode(make_message(codec.dump_obj, keys, values))
+            encode_time = (timer() - start) / num_messages
+
+            # the frame header or the trailing newline is not a part of the payload
+            payload = frame[4:] if codec_name == "binary" else frame[:-1]
+            start = timer()
+            for _ in range(num_messages):
+                codec.decode(payload)
+            decode_time = (timer() - start) / num_messages
+
+            print("{:<20}{:<8}{:>10} bytes {:>12.2f}us encode {:>12.2f}us decode".format(
+                name, codec_name, len(frame), encode_time * 10 ** 6, decode_time * 10 ** 6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare message sizes and encode/decode time of the json and the binary protocol of the js bridge')
+    parser.add_argument('--kv', choices=["numbers", "all"], required=True)
+    parser.add_argument('--num-keys', type=int, default=100, help='keys in batches, inits and table states')
+    parser.add_argument('--num-messages', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.kv == "numbers":
+        kv_factory = IntKeyValueFactory(args.num_keys)
+    elif args.kv == "all":
+        kv_factory = AllKeyValueFactory(args.num_keys)
+
+    run(kv_factory, args.num_keys, args.num_messages)
@@ -1,6 +1,5 @@
-import json
 from common import AllKeyValueFactory
-from js_reimpl_common import _init_sock_stuff, dump_simple_py_obj
+from js_reimpl_common import _init_sock_stuff, dump_simple_py_obj, send_request
 from pprint import pprint
 
 sock, sockfile = _init_sock_stuff()
@@ -18,8 +17,7 @@ def probe_all_js(key, slots_count):
         },
     }
 
-    sock.send(bytes(json.dumps(data) + "\n", 'UTF-8'))
-    response = json.loads(sockfile.readline())
+    response = send_request(sock, sockfile, data)
 
     return response['result']
 
@@ -1,5 +1,6 @@
 import random
 import string
+from ctypes import c_ssize_t, py_object
 
 
 class EmptyValueClass(object):
@@ -29,6 +30,28 @@ def get_object_field_or_null(obj, field_name):
         return EMPTY
 
 
+# The entry tables of CPython dicts are arrays of (hash, key, value) words. Reading the table as one array of words
+# gets all hashes and key pointers with two slices, and python objects are only created for the occupied slots.
+def read_entry_table(address, size, dummy):
+    words = (c_ssize_t * (3 * size)).from_address(address)
+    objects = (py_object * (3 * size)).from_address(address)
+    all_hashes, key_pointers, value_pointers = words[0::3], words[1::3], words[2::3]
+    dummy_pointer = id(dummy)
+
+    hashes = [EMPTY] * size
+    keys = [EMPTY] * size
+    values = [EMPTY] * size
+    for i, key_pointer in enumerate(key_pointers):
+        if not key_pointer:
+            continue
+        hashes[i] = all_hashes[i]
+        keys[i] = DUMMY if key_pointer == dummy_pointer else objects[3 * i + 1]
+        if value_pointers[i]:
+            values[i] = objects[3 * i + 2]
+
+    return hashes, keys, values
+
+
 def get_object_field_or_none(obj, field_name):
     try:
         return getattr(obj, field_name)
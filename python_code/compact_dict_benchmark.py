@@ -0,0 +1,87 @@
+import argparse
+import timeit
+import tracemalloc
+
+from common import DUMMY, EMPTY, AllKeyValueFactory, IntKeyValueFactory
+from dict_reimplementation import PyDictReimplementation32, PyDictReimplementation36
+
+
+def iterate_dict32(d):
+    for key in d.slots.keys:
+        if key is not EMPTY and key is not DUMMY:
+            yield key
+
+
+def iterate_dict36(d):
+    return iter(d)
+
+
+IMPLEMENTATIONS = {
+    "dict32_reimpl_py": (PyDictReimplementation32, iterate_dict32),
+    "dict36_reimpl_py": (PyDictReimplementation36, iterate_dict36),
+}
+
+
+def generate_dicts_pairs(kv_factory, num_dicts, dict_size):
+    return [[(kv_factory.generate_key(), kv_factory.generate_value()) for _ in range(dict_size)]
+            for _ in range(num_dicts)]
+
+
+def build_dicts(klass, dicts_pairs):
+    dicts = []
+    for pairs in dicts_pairs:
+        d = klass()
+        for k, v in pairs:
+            d[k] = v
+        dicts.append(d)
+    return dicts
+
+
+def bytes_per_dict(klass, dicts_pairs):
+    tracemalloc.start()
+    dicts = build_dicts(klass, dicts_pairs)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del dicts
+    return size / len(dicts_pairs)
+
+
+def iteration_time(klass, iterate, dicts_pairs, repeat):
+    dicts = build_dicts(klass, dicts_pairs)
+
+    def iterate_all():
+        for d in dicts:
+            for _ in iterate(d):
+                pass
+
+    return min(timeit.repeat(iterate_all, number=1, repeat=repeat))
+
+
+def run(kv_factory, num_dicts, dict_size, repeat):
+    dicts_pairs = generate_dicts_pairs(kv_factory, num_dicts, dict_size)
+    num_keys = sum(len(set(k for k, _ in pairs)) for pairs in dicts_pairs)
+
+    print("{} dicts with {} inserts each".format(num_dicts, dict_size))
+    for name in sorted(IMPLEMENTATIONS):
+        klass, iterate = IMPLEMENTATIONS[name]
+        memory = bytes_per_dict(klass, dicts_pairs)
+        iteration = iteration_time(klass, iterate, dicts_pairs, repeat)
+        print("    {:<20}{:>10.1f} bytes/dict {:>12.1f} ns/key iterated".format(
+            name, memory, iteration * 10 ** 9 / num_keys))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare memory and iteration speed of the sparse and the compact dict layouts')
+    parser.add_argument('--kv', choices=["numbers", "all"], required=True)
+    parser.add_argument('--num-dicts', type=int, default=10000)
+    parser.add_argument('--dict-size', type=int, action='append')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for dict_size in args.dict_size or [1, 5, 10, 50]:
+        if args.kv == "numbers":
+            kv_factory = IntKeyValueFactory(dict_size * 2)
+        elif args.kv == "all":
+            kv_factory = AllKeyValueFactory(dict_size * 2)
+
+        run(kv_factory, args.num_dicts, dict_size, args.repeat)
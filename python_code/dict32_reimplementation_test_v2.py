@@ -1,13 +1,20 @@
 import random
 import argparse
+import sys
 import json
+import operator
+from contextlib import contextmanager
 
-from common import EMPTY, AllKeyValueFactory, IntKeyValueFactory
-from dictinfo import dump_py_dict
-from dict_reimplementation import PyDictReimplementation32, dump_reimpl_dict
-from js_reimplementation_interface import Dict32JsImpl, AlmostPythonDictRecyclingJsImpl, AlmostPythonDictNoRecyclingJsImpl
+from common import DUMMY, EMPTY
+from dictinfo import dump_py_dict, py_dict_table_view
+from dict_reimplementation import PyDictReimplementation32, PyDictReimplementation36, PyDictReimplementation311, dump_reimpl_dict, dump_compact_dict
+from js_reimplementation_interface import JsImplBase, Dict32JsImpl, AlmostPythonDictRecyclingJsImpl, AlmostPythonDictNoRecyclingJsImpl
 import hash_chapter3_class_impl
 import build_autogenerated_chapter3_chapter4
+from robin_hood_dict import RobinHoodDict
+from direct_address_dict import DirectAddressDict
+from split_table_dict import SplitTableDict
+from workloads import KV_CHOICES, make_kv_factory
 
 
 def dict_factory(pairs=None):
@@ -21,13 +28,34 @@ def dict_factory(pairs=None):
     return d
 
 
+# A dict literal is presized differently depending on the number of items and on the version,
+# so for the compact dicts of 3.6+ the initial state is inserted one by one, like the reimplementations do it
+def setitem_dict_factory(pairs=None):
+    d = {}
+    for k, v in pairs or []:
+        d[k] = v
+    return d
+
+
+def dump_contents(d):
+    if hasattr(d, 'keys'):
+        return dict((k, d[k]) for k in d.keys())
+    return dict((slot.key, slot.value) for slot in d.slots if slot.key is not EMPTY and slot.key is not DUMMY)
+
+
+# Implementations without a dump function lay out their tables differently from every other implementation,
+# so only their contents can be compared
 IMPLEMENTATIONS = {
     "dict_actual": (dict_factory, dump_py_dict),
+    "dict_actual_setitem": (setitem_dict_factory, dump_py_dict),
     "dict32_reimpl_py": (PyDictReimplementation32, dump_reimpl_dict),
     "dict32_reimpl_js": (Dict32JsImpl, dump_reimpl_dict),
 
     "dict32_reimpl_py_extracted": (build_autogenerated_chapter3_chapter4.Dict32Extracted, dump_reimpl_dict),
 
+    "dict36_reimpl_py": (PyDictReimplementation36, dump_compact_dict),
+    "dict311_reimpl_py": (PyDictReimplementation311, dump_compact_dict),
+
     "almost_python_dict_recycling_py": (hash_chapter3_class_impl.AlmostPythonDictImplementationRecycling, dump_reimpl_dict),
     "almost_python_dict_no_recycling_py": (hash_chapter3_class_impl.AlmostPythonDictImplementationNoRecycling, dump_reimpl_dict),
     "almost_python_dict_no_recycling_py_simpler": (hash_chapter3_class_impl.AlmostPythonDictImplementationNoRecyclingSimplerVersion, dump_reimpl_dict),
@@ -36,6 +64,54 @@ IMPLEMENTATIONS = {
 
     "almost_python_dict_recycling_py_extracted": (build_autogenerated_chapter3_chapter4.HashClassRecyclingExtracted, dump_reimpl_dict),
     "almost_python_dict_no_recycling_py_extracted": (build_autogenerated_chapter3_chapter4.HashClassNoRecyclingExtracted, dump_reimpl_dict),
+
+    "robin_hood_py": (RobinHoodDict, None),
+    "direct_address_py": (DirectAddressDict, None),
+    "split_table_py": (SplitTableDict, None),
+}
+
+
+def print_slots_diff(dump_orig, dump_new):
+    hashes_orig, keys_orig, values_orig, fill_orig, used_orig = dump_orig
+    hashes_new, keys_new, values_new, fill_new, used_new = dump_new
+    print("ORIG SIZE", len(hashes_orig))
+    print("NEW SIZE", len(hashes_new))
+    print("ORIG fill/used: ", fill_orig, used_orig)
+    print("NEW fill/used: ", fill_new, used_new)
+    if len(hashes_orig) == len(hashes_new):
+        size = len(hashes_orig)
+        print("NEW | ORIG")
+        for i in range(size):
+            if hashes_new[i] is not EMPTY or hashes_orig[i] is not EMPTY:
+                print(i, " " * 3,
+                      hashes_new[i], keys_new[i], values_new[i], " " * 3,
+                      hashes_orig[i], keys_orig[i], values_orig[i])
+
+
+def print_compact_diff(dump_orig, dump_new):
+    indices_orig, hashes_orig, keys_orig, values_orig, usable_orig, nentries_orig, used_orig = dump_orig
+    indices_new, hashes_new, keys_new, values_new, usable_new, nentries_new, used_new = dump_new
+    print("ORIG SIZE", len(indices_orig))
+    print("NEW SIZE", len(indices_new))
+    print("ORIG usable/nentries/used: ", usable_orig, nentries_orig, used_orig)
+    print("NEW usable/nentries/used: ", usable_new, nentries_new, used_new)
+    if indices_orig != indices_new:
+        print("ORIG INDICES", indices_orig)
+        print("NEW INDICES", indices_new)
+    print("NEW | ORIG")
+    for i in range(max(nentries_orig, nentries_new)):
+        entry_new = (hashes_new[i], keys_new[i], values_new[i]) if i < nentries_new else ()
+        entry_orig = (hashes_orig[i], keys_orig[i], values_orig[i]) if i < nentries_orig else ()
+        if entry_new != entry_orig:
+            print(i, " " * 3, *(entry_new + (" " * 3,) + entry_orig))
+
+
+# dump function -> printer of the differences between two dumps in its format
+DIFF_PRINTERS = {
+    dump_reimpl_dict: print_slots_diff,
+    dump_compact_dict: print_compact_diff,
+    # 3.6+ dicts are dumped in the format of dump_compact_dict()
+    dump_py_dict: print_slots_diff if sys.version_info[:2] < (3, 6) else print_compact_diff,
 }
 
 
@@ -44,25 +120,52 @@ def verify_same(d, dump_d_func, dreimpl, dump_dreimpl_func):
     dump_reimpl = dump_dreimpl_func(dreimpl)
 
     if dump_d != dump_reimpl:
-        hashes_orig, keys_orig, values_orig, fill_orig, used_orig = dump_d
-        hashes_new, keys_new, values_new, fill_new, used_new = dump_reimpl
-        print("ORIG SIZE", len(hashes_orig))
-        print("NEW SIZE", len(hashes_new))
-        print("ORIG fill/used: ", fill_orig, used_orig)
-        print("NEW fill/used: ", fill_new, used_new)
-        if len(hashes_orig) == len(hashes_new):
-            size = len(hashes_orig)
-            print("NEW | ORIG")
-            for i in range(size):
-                if hashes_new[i] is not EMPTY or hashes_orig[i] is not EMPTY:
-                    print(i, " " * 3,
-                          hashes_new[i], keys_new[i], values_new[i], " " * 3,
-                          hashes_orig[i], keys_orig[i], values_orig[i])
+        # dump_contents() and mismatched formats are printed as they are
+        print_diff = DIFF_PRINTERS.get(dump_d_func)
+        if print_diff is not None and print_diff is DIFF_PRINTERS.get(dump_dreimpl_func):
+            print_diff(dump_d, dump_reimpl)
+        else:
+            print("ORIG", dump_d)
+            print("NEW", dump_reimpl)
 
     assert dump_d == dump_reimpl
 
 
-def run(ref_impl_factory, ref_impl_dump, test_impl_factory, test_impl_dump, n_inserts, extra_checks, key_value_factory, initial_state, verbose):
+def reimpl_table_view(d):
+    slots = d.slots
+
+    def read_slot(idx):
+        slot = slots[idx]
+        return slot.hash_code, slot.key, slot.value
+
+    return len(slots), d.fill, d.used, read_slot
+
+
+# For incremental verification: dump function -> function returning size, fill, used and a reader of single slots
+TABLE_VIEWS = {
+    dump_py_dict: py_dict_table_view,
+    dump_reimpl_dict: reimpl_table_view,
+}
+
+
+def reference_probe_sequence(d):
+    if isinstance(d, dict):
+        return PyDictReimplementation32().probe_sequence
+    return getattr(d, "probe_sequence", None)
+
+
+def supports_incremental_verify(ref_impl, test_impl):
+    return ref_impl[1] in TABLE_VIEWS and test_impl[1] in TABLE_VIEWS and (
+        ref_impl[0] is dict_factory or hasattr(ref_impl[0], "probe_sequence"))
+
+
+@contextmanager
+def no_batch():
+    yield None
+
+
+def run(ref_impl_factory, ref_impl_dump, test_impl_factory, test_impl_dump, n_inserts, extra_checks, key_value_factory, initial_state, verbose, bulk_ops=False, verify_every=1, batch=False,
+        incremental=False, full_verify_every=1000):
     SINGLE_REMOVE_CHANCE = 0.3
     MASS_REMOVE_CHANCE = 0.002
     MASS_REMOVE_COEFF = 0.8
@@ -74,76 +177,192 @@ def run(ref_impl_factory, ref_impl_dump, test_impl_factory, test_impl_dump, n_in
     else:
         d = ref_impl_factory()
 
-    if initial_state:
+    if initial_state and bulk_ops:
+        dreimpl = test_impl_factory()
+        dreimpl.update(initial_state)
+    elif initial_state:
         dreimpl = test_impl_factory(initial_state)
     else:
         dreimpl = test_impl_factory()
 
+    # the keys of d in a list, so that picking a random key doesn't copy all keys on every iteration
+    present_keys = list(d.keys())
+    key_positions = dict((k, i) for i, k in enumerate(present_keys))
+
+    def forget_key(k):
+        idx = key_positions.pop(k)
+        last = present_keys.pop()
+        if idx < len(present_keys):
+            present_keys[idx] = last
+            key_positions[last] = idx
+
+    # In batch mode, the ops on dreimpl don't return their results right away, so what every op should have returned
+    # is remembered and compared with the results of the batch at the next checkpoint
+    batch_results = None
+    expected_results = []
+
+    def check_op(op, *args, **kwargs):
+        expect_key_error = kwargs.get("expect_key_error", False)
+        if batch_results is not None:
+            op(dreimpl, *args)
+            expected_results.append((kwargs.get("expected", EMPTY), expect_key_error))
+            return
+
+        try:
+            result = op(dreimpl, *args)
+            assert not expect_key_error
+            assert "expected" not in kwargs or result == kwargs["expected"]
+        except KeyError:
+            assert expect_key_error
+
+    def check_keys(keys):
+        for k in keys:
+            if k in d:
+                check_op(operator.getitem, k, expected=d[k])
+            else:
+                check_op(operator.getitem, k, expect_key_error=True)
+
+    # Incremental verification compares only the slots of the keys touched since the last checkpoint.
+    # The whole tables are compared every full_verify_every checkpoints and after every resize:
+    # a resize changes the size or, when it only cleans up DUMMY slots, makes the fill go down.
+    # The fill is watched on every op, the inserts after a resize between two checkpoints can bring it back up.
+    ref_table_view = TABLE_VIEWS.get(ref_impl_dump)
+    test_table_view = TABLE_VIEWS.get(test_impl_dump)
+    probe_sequence = reference_probe_sequence(d)
+    dirty_slots = set()
+    touched_keys = set()
+    last_full_verify = {"size": None, "fill": None, "checkpoints": 0, "resized": True}
+
+    def watch_resizes():
+        size, fill, _, read_slot = ref_table_view(d)
+        if size != last_full_verify["size"] or fill < last_full_verify["fill"]:
+            last_full_verify["resized"] = True
+        last_full_verify["fill"] = fill
+        return size, read_slot
+
+    def touch(key):
+        if not incremental:
+            return
+        touched_keys.add(key)
+        size, read_slot = watch_resizes()
+        hash_code = hash(key)
+        for probes, idx in enumerate(probe_sequence(hash_code, size)):
+            slot_hash, slot_key, _ = read_slot(idx)
+            if slot_key is EMPTY or probes > size:
+                break
+            if slot_hash == hash_code and slot_key == key:
+                dirty_slots.add(idx)
+                break
+
+    def verify_dirty_slots():
+        watch_resizes()
+        if last_full_verify["resized"] or last_full_verify["checkpoints"] >= full_verify_every:
+            return False
+
+        ref_size, ref_fill, ref_used, ref_read_slot = ref_table_view(d)
+        test_size, test_fill, test_used, test_read_slot = test_table_view(dreimpl)
+        last_full_verify["checkpoints"] += 1
+        if (ref_size, ref_fill, ref_used) != (test_size, test_fill, test_used):
+            return False
+        for idx in dirty_slots:
+            if ref_read_slot(idx) != test_read_slot(idx):
+                print("Slot {}: ORIG {} NEW {}".format(idx, ref_read_slot(idx), test_read_slot(idx)))
+                return False
+        if extra_checks:
+            check_keys(touched_keys)
+        return True
+
+    def checkpoint():
+        if batch_results is not None:
+            dreimpl.flush()
+            assert len(batch_results) == len(expected_results)
+            for (result, is_exception), (expected, expect_key_error) in zip(batch_results, expected_results):
+                assert is_exception == expect_key_error
+                assert expected is EMPTY or result == expected
+            del batch_results[:]
+            del expected_results[:]
+
+        if not incremental or not verify_dirty_slots():
+            verify_same(d, ref_impl_dump, dreimpl, test_impl_dump)
+            if incremental:
+                size, fill, _, _ = ref_table_view(d)
+                last_full_verify.update(size=size, fill=fill, checkpoints=0, resized=False)
+                if extra_checks:
+                    check_keys(present_keys)
+                    check_keys(removed)
+        dirty_slots.clear()
+        touched_keys.clear()
+
     if verbose:
         print("Starting test")
 
-    for i in range(n_inserts):
-        should_remove = (random.random() < SINGLE_REMOVE_CHANCE)
-        if should_remove and d and d.keys():  # TODO: ugly, written while on a plane
-            to_remove = random.choice(list(d.keys()))
-            if verbose:
-                print("Removing {}".format(to_remove))
-            del d[to_remove]
-            del dreimpl[to_remove]
-            if verbose:
-                print(d)
-            verify_same(d, ref_impl_dump, dreimpl, test_impl_dump)
-            removed.add(to_remove)
+    with (dreimpl.batch() if batch else no_batch()) as batch_results:
+        for i in range(n_inserts):
+            should_verify = i % verify_every == 0
+            should_remove = (random.random() < SINGLE_REMOVE_CHANCE)
+            if should_remove and present_keys:
+                to_remove = random.choice(present_keys)
+                if verbose:
+                    print("Removing {}".format(to_remove))
+                touch(to_remove)
+                del d[to_remove]
+                if incremental:
+                    watch_resizes()
+                check_op(operator.delitem, to_remove)
+                forget_key(to_remove)
+                if verbose:
+                    print(d)
+                if should_verify:
+                    checkpoint()
+                removed.add(to_remove)
 
-        should_mass_remove = (random.random() < MASS_REMOVE_CHANCE)
-        if should_mass_remove and len(d) > 10:
-            to_remove_list = random.sample(list(d.keys()), int(MASS_REMOVE_COEFF * len(d)))
-            if verbose:
-                print("Mass-Removing {} elements".format(len(to_remove_list)))
-            for k in to_remove_list:
-                del d[k]
-                del dreimpl[k]
-                removed.add(k)
+            should_mass_remove = (random.random() < MASS_REMOVE_CHANCE)
+            if should_mass_remove and len(d) > 10:
+                to_remove_list = random.sample(present_keys, int(MASS_REMOVE_COEFF * len(d)))
+                if verbose:
+                    print("Mass-Removing {} elements".format(len(to_remove_list)))
+                for k in to_remove_list:
+                    touch(k)
+                    del d[k]
+                    forget_key(k)
+                    removed.add(k)
+                if incremental:
+                    watch_resizes()
+                if bulk_ops:
+                    dreimpl.delete_many(to_remove_list)
+                else:
+                    for k in to_remove_list:
+                        check_op(operator.delitem, k)
 
-        if extra_checks:
-            for k in d.keys():
-                assert d[k] == dreimpl[k]
-
-            for r in removed:
-                try:
-                    dreimpl[r]
-                    assert False
-                except KeyError:
-                    pass
-
-        key_to_insert = key_value_factory.generate_key()
-        value_to_insert = key_value_factory.generate_value()
-        _keys_set = getattr(d, '_keys_set', None)
-        # TODO: ugly code written on a plane
-        # TODO: properly implement in/not in when I land
-        if _keys_set is not None:
-            key_present = key_to_insert in _keys_set
-        else:
-            key_present = key_to_insert in d
+            if extra_checks and not incremental:
+                for k in d.keys():
+                    check_op(operator.getitem, k, expected=d[k])
 
-        if not key_present:
-            if verbose:
-                print("Inserting ({key}, {value})".format(key=key_to_insert, value=value_to_insert))
-            try:
-                dreimpl[key_to_insert]
-                assert False
-            except KeyError:
-                pass
-        else:
+                for r in removed:
+                    check_op(operator.getitem, r, expect_key_error=True)
+
+            key_to_insert = key_value_factory.generate_key()
+            value_to_insert = key_value_factory.generate_value()
+            if key_to_insert not in d:
+                if verbose:
+                    print("Inserting ({key}, {value})".format(key=key_to_insert, value=value_to_insert))
+                check_op(operator.getitem, key_to_insert, expect_key_error=True)
+                key_positions[key_to_insert] = len(present_keys)
+                present_keys.append(key_to_insert)
+            else:
+                if verbose:
+                    print("Replacing ({key}, {value1}) with ({key}, {value2})".format(key=key_to_insert, value1=d[key_to_insert], value2=value_to_insert))
+            removed.discard(key_to_insert)
+            d[key_to_insert] = value_to_insert
+            touch(key_to_insert)
+            check_op(operator.setitem, key_to_insert, value_to_insert)
             if verbose:
-                print("Replacing ({key}, {value1}) with ({key}, {value2})".format(key=key_to_insert, value1=d[key_to_insert], value2=value_to_insert))
-        removed.discard(key_to_insert)
-        d[key_to_insert] = value_to_insert
-        dreimpl[key_to_insert] = value_to_insert
-        if verbose:
-            print(d)
-        verify_same(d, ref_impl_dump, dreimpl, test_impl_dump)
-        assert dreimpl[key_to_insert] == value_to_insert
+                print(d)
+            if should_verify:
+                checkpoint()
+            check_op(operator.getitem, key_to_insert, expected=value_to_insert)
+
+        checkpoint()
 
 
 if __name__ == "__main__":
@@ -153,18 +372,31 @@ if __name__ == "__main__":
     parser.add_argument('--no-extra-getitem-checks', dest='extra_checks', action='store_false')
     parser.add_argument('--num-inserts',  type=int, default=500)
     parser.add_argument('--forever', action='store_true')
-    parser.add_argument('--kv', choices=["numbers", "all"], required=True)
+    parser.add_argument('--kv', choices=KV_CHOICES, required=True)
     parser.add_argument('--initial-size', type=int, default=-1)
     parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--compare-contents', action='store_true', help='compare keys and values instead of the table layouts')
+    parser.add_argument('--verify-every', type=int, default=1, help='compare the dumps only on every n-th iteration (and at the end)')
+    parser.add_argument('--bulk-ops', action='store_true', help='use update() and delete_many() on the tested implementation, implies --compare-contents')
+    parser.add_argument('--protocol', choices=["json", "binary"], default="json", help='wire format of the js implementations')
+    parser.add_argument('--incremental-verify', action='store_true', help='compare only the slots of the keys touched since the last check, and the whole tables after resizes')
+    parser.add_argument('--full-verify-every', type=int, default=1000, help='with --incremental-verify, compare the whole tables on every n-th check')
+    parser.add_argument('--batch', action='store_true', help='send the ops to the tested js implementation in batches, one batch per --verify-every iterations')
     args = parser.parse_args()
 
-    if args.kv == "numbers":
-        kv_factory = IntKeyValueFactory(args.num_inserts)
-    elif args.kv == "all":
-        kv_factory = AllKeyValueFactory(args.num_inserts)
+    JsImplBase.PROTOCOL = args.protocol
+
+    kv_factory = make_kv_factory(args.kv, args.num_inserts)
 
     ref_impl = IMPLEMENTATIONS[args.reference_implementation]
     test_impl = IMPLEMENTATIONS[args.test_implementation]
+    if args.compare_contents or args.bulk_ops or ref_impl[1] is None or test_impl[1] is None:
+        ref_impl = (ref_impl[0], dump_contents)
+        test_impl = (test_impl[0], dump_contents)
+    if args.batch and not hasattr(test_impl[0], 'batch'):
+        parser.error("--batch only works with the js implementations")
+    if args.incremental_verify and not supports_incremental_verify(ref_impl, test_impl):
+        parser.error("--incremental-verify needs the table layouts of both implementations and the probing of the reference")
 
     def test_iteration():
         initial_size = args.initial_size if args.initial_size >= 0 else random.randint(0, 100)
@@ -174,7 +406,12 @@ if __name__ == "__main__":
             extra_checks=args.extra_checks,
             key_value_factory=kv_factory,
             initial_state=initial_state,
-            verbose=args.verbose)
+            verbose=args.verbose,
+            bulk_ops=args.bulk_ops,
+            verify_every=args.verify_every,
+            batch=args.batch,
+            incremental=args.incremental_verify,
+            full_verify_every=args.full_verify_every)
 
     if args.forever:
         while True:
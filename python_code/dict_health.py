@@ -0,0 +1,166 @@
+import argparse
+import gc
+import random
+import struct
+import sys
+import threading
+from collections import deque
+from itertools import islice
+
+from common import DUMMY, EMPTY
+from dictinfo import dump_py_dict
+
+WORD_SIZE = struct.calcsize('P')
+
+
+# The bytes of the hash table itself, without the dict object and the keys and the values.
+# Compact dicts: the indices and the entries array (counted as (hash, key, value) entries, the str-only ones of 3.11+
+# are a word smaller); the older dicts: a single array of (hash, key, value) slots.
+def table_bytes(size, compact):
+    if not compact:
+        return size * 3 * WORD_SIZE
+
+    index_width = 1
+    while size > 1 << (8 * index_width - 1):
+        index_width *= 2
+    return size * index_width + (size * 2 // 3) * 3 * WORD_SIZE
+
+
+def fresh_size(used):
+    size = 8
+    while size * 2 < used * 3:
+        size *= 2
+    return size
+
+
+def longest_cluster(occupied):
+    # the probing wraps around, so a cluster at the end of the table continues at the start
+    size = len(occupied)
+    if all(occupied):
+        return size
+
+    start = occupied.index(False)
+    longest = current = 0
+    for i in range(start, start + size):
+        if occupied[i % size]:
+            current += 1
+            longest = max(longest, current)
+        else:
+            current = 0
+    return longest
+
+
+def table_health(dump):
+    if len(dump) == 7:
+        slots, _, _, _, _, _, used = dump
+        compact = True
+    else:
+        _, slots, _, _, used = dump
+        compact = False
+
+    size = len(slots)
+    occupied = [slot is not EMPTY for slot in slots]
+    fill = sum(occupied)
+    dummies = sum(1 for slot in slots if slot is DUMMY)
+    return {
+        "size": size,
+        "fill": fill,
+        "used": used,
+        "dummies": dummies,
+        # the share of the occupied slots that only make the probing longer
+        "tombstone_ratio": float(dummies) / fill if fill else 0.0,
+        "longest_cluster": longest_cluster(occupied),
+        # what rebuilding the dict from its live keys would save
+        "wasted_bytes": max(0, table_bytes(size, compact) - table_bytes(fresh_size(used), compact)),
+    }
+
+
+def dump_dict_atomically(d):
+    # ctypes reads the table as plain memory: if another thread resized the dict in the middle of the dump,
+    # the dump would read freed memory. With a long switch interval, the GIL is not handed over during the dump.
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1000)
+    try:
+        return dump_py_dict(d)
+    finally:
+        sys.setswitchinterval(old_interval)
+
+
+# Dicts that only hold atomic keys and values (e.g. ints and strs) are not tracked by the gc,
+# so gc.get_objects() misses them. Walking the references from roots finds them too.
+def reachable_dicts(roots):
+    seen = set()
+    queue = deque(roots)
+    while queue:
+        obj = queue.popleft()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if type(obj) is dict:
+            yield obj
+        queue.extend(gc.get_referents(obj))
+
+
+def sample_dicts(roots=None, sample_rate=1.0, min_bytes=0, top=None):
+    if roots is None:
+        candidates = [obj for obj in gc.get_objects() if type(obj) is dict]
+    else:
+        candidates = list(reachable_dicts(roots))
+
+    reports = []
+    for d in candidates:
+        # sys.getsizeof() is O(1), so the small dicts are skipped before anything is dumped
+        if random.random() >= sample_rate or sys.getsizeof(d) < min_bytes:
+            continue
+        report = table_health(dump_dict_atomically(d))
+        report["id"] = id(d)
+        report["keys_preview"] = [repr(k)[:40] for k in islice(d, 3)]
+        reports.append(report)
+
+    reports.sort(key=lambda report: report["wasted_bytes"], reverse=True)
+    return reports[:top] if top is not None else reports
+
+
+# Samples the dicts of the process every interval seconds in a daemon thread and passes the reports to callback
+class DictHealthSampler(threading.Thread):
+    def __init__(self, interval, callback, sample_rate=0.01, min_bytes=64 * 1024, top=10):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.callback = callback
+        self.sample_rate = sample_rate
+        self.min_bytes = min_bytes
+        self.top = top
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.callback(sample_dicts(sample_rate=self.sample_rate, min_bytes=self.min_bytes, top=self.top))
+
+    def stop(self):
+        self._stopped.set()
+
+
+def print_reports(reports):
+    print("{:>10}{:>10}{:>10}{:>10}{:>12}{:>10}{:>14}  {}".format(
+        "size", "fill", "used", "dummies", "tombstones", "cluster", "wasted bytes", "keys"))
+    for report in reports:
+        print("{size:>10}{fill:>10}{used:>10}{dummies:>10}{tombstone_ratio:>12.2f}{longest_cluster:>10}{wasted_bytes:>14}  {keys}".format(
+            keys=", ".join(report["keys_preview"]), **report))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report the table health of the dicts of a process. '
+                                                 'Run standalone, it samples itself after building a dict full of tombstones')
+    parser.add_argument('--num-keys', type=int, default=100000)
+    parser.add_argument('--keep-fraction', type=float, default=0.05, help='fraction of the keys that are not deleted')
+    parser.add_argument('--sample-rate', type=float, default=1.0)
+    parser.add_argument('--min-bytes', type=int, default=64 * 1024)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    bloated = dict((i, i) for i in range(args.num_keys))
+    for i in range(int(args.num_keys * args.keep_fraction), args.num_keys):
+        del bloated[i]
+
+    print_reports(sample_dicts([bloated, sys.modules], args.sample_rate, args.min_bytes, args.top))
@@ -0,0 +1,53 @@
+import sys
+import unittest
+
+from dict_health import longest_cluster, reachable_dicts, sample_dicts, table_health
+from dictinfo import dump_py_dict
+
+SUPPORTED = sys.version_info[:2] in [(3, 2), (3, 3)] or (3, 6) <= sys.version_info[:2] <= (3, 13)
+
+
+class DictHealthTest(unittest.TestCase):
+    def test_longest_cluster(self):
+        self.assertEqual(longest_cluster([False, True, True, False, True]), 2)
+        # wraps around the end of the table
+        self.assertEqual(longest_cluster([True, True, False, False, True, True, True]), 5)
+        self.assertEqual(longest_cluster([False] * 4), 0)
+        self.assertEqual(longest_cluster([True] * 4), 4)
+
+    def test_reachable_dicts(self):
+        # only ints inside, so the gc doesn't track the inner dict
+        inner = {1: 2}
+        outer = [[{"x": inner}]]
+        found = list(reachable_dicts([outer]))
+        self.assertTrue(any(d is inner for d in found))
+        self.assertTrue(any(d is outer[0][0] for d in found))
+
+    @unittest.skipUnless(SUPPORTED, "dictinfo doesn't support this version")
+    def test_tombstones(self):
+        d = dict((i, i) for i in range(1000))
+        for i in range(100, 1000):
+            del d[i]
+
+        health = table_health(dump_py_dict(d))
+        self.assertEqual(health["used"], 100)
+        self.assertEqual(health["dummies"], 900)
+        self.assertEqual(health["fill"], 1000)
+        self.assertAlmostEqual(health["tombstone_ratio"], 0.9)
+        self.assertGreaterEqual(health["longest_cluster"], 1000)
+        self.assertGreater(health["wasted_bytes"], 0)
+
+        self.assertEqual(table_health(dump_py_dict(dict(d)))["wasted_bytes"], 0)
+
+        reports = sample_dicts([d, {}], top=1)
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0]["id"], id(d))
+        self.assertEqual(sample_dicts([d], sample_rate=0.0), [])
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
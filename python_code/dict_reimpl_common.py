@@ -1,4 +1,14 @@
-from common import EMPTY
+import json
+from array import array
+from common import DUMMY, EMPTY
+
+try:
+    from collections.abc import KeysView, ValuesView, ItemsView
+except ImportError:
+    from collections import KeysView, ValuesView, ItemsView
+
+# 'q' only exists since python 3.3, on 3.2 a C long is 64 bits wide on the platforms we care about
+HASH_TYPECODE = 'q' if 'q' in getattr(array, 'typecodes', '') else 'l'
 
 
 class Slot(object):
@@ -8,11 +18,248 @@ class Slot(object):
         self.value = value
 
 
+# Struct-of-arrays replacement for a list of Slot objects: hashes live in a typed array, keys and values in two lists.
+# The hash is only meaningful when the key is not EMPTY, so it is stored as 0 for empty slots.
+# Indexing returns a detached Slot, the code that modifies the table works with the columns directly.
+class SlotsArray(object):
+    def __init__(self, size):
+        self.hashes = array(HASH_TYPECODE, [0]) * size
+        self.keys = [EMPTY] * size
+        self.values = [EMPTY] * size
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, idx):
+        key = self.keys[idx]
+        if key is EMPTY:
+            return Slot()
+        return Slot(self.hashes[idx], key, self.values[idx])
+
+    def __setitem__(self, idx, slot):
+        self.hashes[idx] = slot.hash_code if slot.key is not EMPTY else 0
+        self.keys[idx] = slot.key
+        self.values[idx] = slot.value
+
+    def __iter__(self):
+        for idx in range(len(self.keys)):
+            yield self[idx]
+
+    def dump(self):
+        hash_codes = [EMPTY if key is EMPTY else h for h, key in zip(self.hashes, self.keys)]
+        return hash_codes, list(self.keys), list(self.values)
+
+
+# Probe counts of every operation, collected by a table after enable_stats() is called.
+# probes[op][n] is the number of operations of this type that looked at n slots, including the last one.
+class ProbeStats(object):
+    def __init__(self):
+        self.probes = {}
+        self.dummies_skipped = {}
+        self.resizes = 0
+        self.resize_moved = 0
+        self.compactions = 0
+        self.compaction_probes_saved = 0
+
+    def record_probes(self, op, probes, dummies):
+        histogram = self.probes.setdefault(op, [])
+        if len(histogram) <= probes:
+            histogram.extend([0] * (probes + 1 - len(histogram)))
+        histogram[probes] += 1
+        self.dummies_skipped[op] = self.dummies_skipped.get(op, 0) + dummies
+
+    def record_resize(self, moved):
+        self.resizes += 1
+        self.resize_moved += moved
+
+    def record_compaction(self, probes_saved):
+        self.compactions += 1
+        self.compaction_probes_saved += probes_saved
+
+    def as_dict(self):
+        return {
+            "probes": self.probes,
+            "dummies_skipped": self.dummies_skipped,
+            "resizes": self.resizes,
+            "resize_moved": self.resize_moved,
+            "compactions": self.compactions,
+            "compaction_probes_saved": self.compaction_probes_saved,
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+
+# The views walk the slots directly instead of looking up every key, they stay valid while the table changes
+class SlotsKeysView(KeysView):
+    pass
+
+
+class SlotsValuesView(ValuesView):
+    def __iter__(self):
+        for _, value in self._mapping.iteritems():
+            yield value
+
+
+class SlotsItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping.iteritems()
+
+
 class BaseDictImpl(object):
+    # When set, resize() only allocates the new table, and every following operation moves
+    # this many slots of the old table. Until everything is moved, lookups and deletes check both tables.
+    INCREMENTAL_RESIZE_STEP = None
+
+    # When set, a delete that leaves more than this fraction of the slots DUMMY rebuilds the table at its current
+    # or a smaller size. Otherwise the DUMMY slots stay until fill reaches the resize threshold, and if deletes
+    # keep up with inserts, the resize happens into a table of the same size or larger.
+    COMPACT_DUMMY_RATIO = None
+
+    # The probing loops don't count anything. When stats are enabled, the probe sequence of an operation
+    # is replayed after the loop, so a table without stats only pays for checking this attribute.
+    stats = None
+
     def __init__(self):
-        self.slots = [Slot() for _ in range(self.START_SIZE)]
+        # the tables that override clear() and never resize incrementally still have the fields
+        self.old_slots = None
+        self.old_slots_idx = 0
+        self.clear()
+
+    def clear(self):
+        self.slots = SlotsArray(self.START_SIZE)
         self.fill = 0
         self.used = 0
+        self.old_slots = None
+        self.old_slots_idx = 0
+
+    def iterentries(self):
+        tables = [self.slots] if self.old_slots is None else [self.old_slots, self.slots]
+        for slots in tables:
+            for hash_code, key, value in zip(slots.hashes, slots.keys, slots.values):
+                if key is not EMPTY and key is not DUMMY:
+                    yield hash_code, key, value
+
+    def iteritems(self):
+        for _, key, value in self.iterentries():
+            yield key, value
+
+    def __iter__(self):
+        for key, _ in self.iteritems():
+            yield key
+
+    def __len__(self):
+        return self.used
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def keys(self):
+        return SlotsKeysView(self)
+
+    def values(self):
+        return SlotsValuesView(self)
+
+    def items(self):
+        return SlotsItemsView(self)
+
+    def enable_stats(self):
+        self.stats = ProbeStats()
+        return self.stats
+
+    def count_probes(self, hash_code, end_idx, keys):
+        probes = dummies = 0
+        for idx in self.probe_sequence(hash_code, len(keys)):
+            probes += 1
+            if idx == end_idx:
+                return probes, dummies
+            if keys[idx] is DUMMY:
+                dummies += 1
+
+    def total_probe_length(self):
+        # the number of slots looked at by looking up every key once
+        hashes, keys = self.slots.hashes, self.slots.keys
+        total = 0
+        for idx in range(len(keys)):
+            if keys[idx] is not EMPTY and keys[idx] is not DUMMY:
+                total += self.count_probes(hashes[idx], idx, keys)[0]
+        return total
+
+    def maybe_compact(self):
+        # fill - used is the number of DUMMY slots, except during an incremental resize
+        if self.old_slots is None and self.fill - self.used > self.COMPACT_DUMMY_RATIO * len(self.slots):
+            self.compact()
+
+    def compact(self):
+        new_size = min(len(self.slots), self.find_nearest_size(2 * self.used))
+        if self.stats is None:
+            self.rebuild(new_size)
+            return
+
+        probes_before = self.total_probe_length()
+        self.rebuild(new_size)
+        # an incremental rebuild has not moved anything yet, so there is nothing to measure
+        self.stats.record_compaction(probes_before - self.total_probe_length() if self.old_slots is None else 0)
+
+    def presize(self, count):
+        # make room for count more keys, so that inserting them doesn't resize the table
+        # fill doesn't count the entries still in the old table of an incremental resize
+        if self.old_slots is not None or (self.fill + count) * 3 >= len(self.slots) * 2:
+            self.rebuild(self.find_nearest_size(2 * (self.used + count)))
+
+    def insert_new_entries(self, entries):
+        # the keys are known to be unique and missing from the table, so the stored hashes are reused
+        self.presize(len(entries))
+        for hash_code, key, value in entries:
+            self.insert_clean(hash_code, key, value)
+            self.used += 1
+
+    def update(self, other):
+        if isinstance(other, BaseDictImpl):
+            entries = list(other.iterentries())
+            if not self.used:
+                self.insert_new_entries(entries)
+                return
+            pairs = [(key, value) for _, key, value in entries]
+        elif hasattr(other, 'keys'):
+            pairs = [(key, other[key]) for key in other.keys()]
+        else:
+            pairs = list(other)
+
+        self.presize(len(pairs))
+        for key, value in pairs:
+            self[key] = value
+
+    @classmethod
+    def fromkeys(cls, keys, value=None):
+        d = cls()
+        d.update((key, value) for key in keys)
+        return d
+
+    def delete_many(self, keys):
+        to_delete = set(keys)
+        # rebuilding the table from the remaining keys only pays off when most of the keys are deleted
+        if len(to_delete) * 3 < self.used * 2:
+            # like the rebuild below, a missing key raises KeyError before anything is deleted
+            for key in to_delete:
+                if key not in self:
+                    raise KeyError(key)
+            for key in to_delete:
+                del self[key]
+            return
+
+        remaining = [entry for entry in self.iterentries() if entry[1] not in to_delete]
+        if self.used - len(remaining) != len(to_delete):
+            for key in to_delete:
+                if key not in self:
+                    raise KeyError(key)
+
+        self.clear()
+        self.insert_new_entries(remaining)
 
     def find_nearest_size(self, minused):
         new_size = 8
@@ -20,3 +267,69 @@ class BaseDictImpl(object):
             new_size *= 2
 
         return new_size
+
+    def start_incremental_resize(self, new_size):
+        pending, pending_idx = self.old_slots, self.old_slots_idx
+
+        self.old_slots = self.slots
+        self.old_slots_idx = 0
+        self.slots = SlotsArray(new_size)
+        self.fill = 0
+        if self.stats is not None:
+            self.stats.record_resize(0)
+
+        # The entries still waiting in the previous old table go straight to the new table, which is sized from used
+        # and so has room for them. The table that is now being migrated may not have any room left.
+        if pending is not None:
+            self.move_entries(pending, pending_idx, len(pending))
+
+    def move_entries(self, old_slots, start, end, stop_at_resize=False):
+        # returns the index of the first slot that was not moved
+        idx = start
+        moved = 0
+        resize_fill = len(self.slots) * 2
+        while idx < end:
+            # with stop_at_resize, the moved entries don't fill the table past the point where an insert resizes it
+            if stop_at_resize and self.fill * 3 >= resize_fill:
+                break
+            key = old_slots.keys[idx]
+            if key is not EMPTY and key is not DUMMY:
+                self.insert_clean(old_slots.hashes[idx], key, old_slots.values[idx])
+                old_slots.keys[idx] = DUMMY
+                old_slots.values[idx] = EMPTY
+                moved += 1
+            idx += 1
+
+        if self.stats is not None:
+            self.stats.resize_moved += moved
+        return idx
+
+    def migrate_slots(self, count):
+        old_slots = self.old_slots
+        end = min(self.old_slots_idx + count, len(old_slots))
+        idx = self.move_entries(old_slots, self.old_slots_idx, end, stop_at_resize=True)
+
+        self.old_slots_idx = idx
+        if idx == len(old_slots):
+            self.old_slots = None
+        elif idx < end:
+            self.resize()
+
+    def lookdict_old_slots(self, key):
+        self.migrate_slots(self.INCREMENTAL_RESIZE_STEP)
+        if self.old_slots is None:
+            return None
+        try:
+            return self.lookdict(key, self.old_slots)
+        except KeyError:
+            return None
+
+    def remove_from_old_slots(self, key):
+        idx = self.lookdict_old_slots(key)
+        if idx is None:
+            return False
+
+        self.used -= 1
+        self.old_slots.keys[idx] = DUMMY
+        self.old_slots.values[idx] = EMPTY
+        return True
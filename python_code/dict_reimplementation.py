@@ -1,5 +1,6 @@
 from common import DUMMY, EMPTY
-from dict_reimpl_common import BaseDictImpl, Slot
+from array import array
+from dict_reimpl_common import BaseDictImpl, SlotsArray
 from operator import attrgetter
 
 
@@ -9,84 +10,149 @@ class PyDictReimplementationBase(BaseDictImpl):
 
     def __init__(self, pairs=None):
         BaseDictImpl.__init__(self)
+        # sized like a dict literal in CPython 3.2, presize() would make the table larger
         start_size = self.find_nearest_size(len(pairs)) if pairs else self.START_SIZE
-        self.slots = [Slot() for _ in range(start_size)]
+        self.slots = SlotsArray(start_size)
         if pairs:
             for k, v in pairs:
                 self[k] = v
 
     def __setitem__(self, key, value):
+        if self.old_slots is not None:
+            self.remove_from_old_slots(key)
+
         hash_code = hash(key)
+        hashes, keys = self.slots.hashes, self.slots.keys
         perturb = self.signed_to_unsigned(hash_code)
-        idx = hash_code % len(self.slots)
+        idx = hash_code % len(keys)
         target_idx = None
-        while self.slots[idx].key is not EMPTY:
-            if self.slots[idx].hash_code == hash_code and self.slots[idx].key == key:
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and keys[idx] == key:
                 target_idx = idx
                 break
-            if target_idx is None and self.slots[idx].key is DUMMY:
+            if target_idx is None and keys[idx] is DUMMY:
                 target_idx = idx
 
-            idx = (idx * 5 + perturb + 1) % len(self.slots)
+            idx = (idx * 5 + perturb + 1) % len(keys)
             perturb >>= self.PERTURB_SHIFT
 
+        if self.stats is not None:
+            self.stats.record_probes("setitem", *self.count_probes(hash_code, idx, keys))
+
         if target_idx is None:
             target_idx = idx
 
-        if self.slots[target_idx].key is EMPTY:
+        if keys[target_idx] is EMPTY:
             self.used += 1
             self.fill += 1
-        elif self.slots[target_idx].key is DUMMY:
+        elif keys[target_idx] is DUMMY:
             self.used += 1
 
-        self.slots[target_idx] = Slot(hash_code, key, value)
-        if self.fill * 3 >= len(self.slots) * 2:
+        hashes[target_idx] = hash_code
+        keys[target_idx] = key
+        self.slots.values[target_idx] = value
+        if self.fill * 3 >= len(keys) * 2:
             self.resize()
 
     def __delitem__(self, key):
+        if self.old_slots is not None and self.remove_from_old_slots(key):
+            return
+
         idx = self.lookdict(key)
 
         self.used -= 1
-        self.slots[idx].key = DUMMY
-        self.slots[idx].value = EMPTY
+        self.slots.keys[idx] = DUMMY
+        self.slots.values[idx] = EMPTY
+        if self.COMPACT_DUMMY_RATIO is not None:
+            self.maybe_compact()
 
     def __getitem__(self, key):
+        if self.old_slots is not None:
+            idx = self.lookdict_old_slots(key)
+            if idx is not None:
+                return self.old_slots.values[idx]
+
         idx = self.lookdict(key)
 
-        return self.slots[idx].value
+        return self.slots.values[idx]
 
     @staticmethod
     def signed_to_unsigned(hash_code):
         return 2**64 + hash_code if hash_code < 0 else hash_code
 
-    def lookdict(self, key):
+    def probe_sequence(self, hash_code, size):
+        perturb = self.signed_to_unsigned(hash_code)
+        idx = hash_code % size
+        while True:
+            yield idx
+            idx = (idx * 5 + perturb + 1) % size
+            perturb >>= self.PERTURB_SHIFT
+
+    def lookdict(self, key, slots=None):
         hash_code = hash(key)
+        slots = self.slots if slots is None else slots
+        hashes, keys = slots.hashes, slots.keys
         perturb = self.signed_to_unsigned(hash_code)
 
-        idx = hash_code % len(self.slots)
-        while self.slots[idx].key is not EMPTY:
-            if self.slots[idx].hash_code == hash_code and self.slots[idx].key == key:
-                return idx
+        idx = hash_code % len(keys)
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and keys[idx] == key:
+                break
 
-            idx = (idx * 5 + perturb + 1) % len(self.slots)
+            idx = (idx * 5 + perturb + 1) % len(keys)
             perturb >>= self.PERTURB_SHIFT
 
-        raise KeyError()
+        if self.stats is not None:
+            self.stats.record_probes("lookdict", *self.count_probes(hash_code, idx, keys))
+
+        if keys[idx] is EMPTY:
+            raise KeyError()
+        return idx
 
     def resize(self):
+        self.rebuild(self.find_nearest_size(self._next_size()))
+
+    def rebuild(self, new_size):
         old_slots = self.slots
-        new_size = self.find_nearest_size(self._next_size())
-        self.slots = [Slot() for _ in range(new_size)]
+        if self.INCREMENTAL_RESIZE_STEP is not None:
+            self.start_incremental_resize(new_size)
+            return
+
+        self.slots = SlotsArray(new_size)
+        hashes, keys, values = self.slots.hashes, self.slots.keys, self.slots.values
         self.fill = self.used
-        for slot in old_slots:
-            if slot.key is not EMPTY and slot.key is not DUMMY:
-                perturb = self.signed_to_unsigned(slot.hash_code)
-                idx = slot.hash_code % len(self.slots)
-                while self.slots[idx].key is not EMPTY:
-                    idx = (idx * 5 + perturb + 1) % len(self.slots)
+        stats = self.stats
+        for hash_code, key, value in zip(old_slots.hashes, old_slots.keys, old_slots.values):
+            if key is not EMPTY and key is not DUMMY:
+                perturb = self.signed_to_unsigned(hash_code)
+                idx = hash_code % new_size
+                while keys[idx] is not EMPTY:
+                    idx = (idx * 5 + perturb + 1) % new_size
                     perturb >>= self.PERTURB_SHIFT
 
-                self.slots[idx] = Slot(slot.hash_code, slot.key, slot.value)
+                if stats is not None:
+                    stats.record_probes("resize", *self.count_probes(hash_code, idx, keys))
+                hashes[idx] = hash_code
+                keys[idx] = key
+                values[idx] = value
+
+        if stats is not None:
+            stats.record_resize(self.used)
+
+    def insert_clean(self, hash_code, key, value):
+        keys = self.slots.keys
+        perturb = self.signed_to_unsigned(hash_code)
+        idx = hash_code % len(keys)
+        while keys[idx] is not EMPTY:
+            idx = (idx * 5 + perturb + 1) % len(keys)
+            perturb >>= self.PERTURB_SHIFT
+
+        if self.stats is not None:
+            self.stats.record_probes("resize", *self.count_probes(hash_code, idx, keys))
+        self.fill += 1
+        self.slots.hashes[idx] = hash_code
+        keys[idx] = key
+        self.slots.values[idx] = value
 
 
 class PyDictReimplementation32(PyDictReimplementationBase):
@@ -94,7 +160,255 @@ class PyDictReimplementation32(PyDictReimplementationBase):
         return self.used * (4 if self.used <= 50000 else 2)
 
 
+class PyDictReimplementation36(BaseDictImpl):
+    START_SIZE = 8
+    PERTURB_SHIFT = 5
+
+    IX_EMPTY = -1
+    IX_DUMMY = -2
+
+    def __init__(self, pairs=None):
+        BaseDictImpl.__init__(self)
+        # not presized: the layout has to match a dict filled key by key
+        if pairs:
+            for k, v in pairs:
+                self[k] = v
+
+    @staticmethod
+    def usable_fraction(size):
+        return (size * 2) // 3
+
+    @staticmethod
+    def index_typecode(size):
+        if size <= 0xff:
+            return 'b'
+        if size <= 0xffff:
+            return 'h'
+        if size <= 0xffffffff:
+            return 'i'
+        return 'q'
+
+    def _init_table(self, size):
+        self.indices = array(self.index_typecode(size), [self.IX_EMPTY]) * size
+        self.entries = SlotsArray(self.usable_fraction(size))
+        self.usable = self.usable_fraction(size)
+        self.nentries = 0
+
+    def clear(self):
+        self._init_table(self.START_SIZE)
+        self.used = 0
+
+    def probe_sequence(self, hash_code, size):
+        mask = size - 1
+        perturb = PyDictReimplementationBase.signed_to_unsigned(hash_code)
+        idx = hash_code & mask
+        while True:
+            yield idx
+            perturb >>= self.PERTURB_SHIFT
+            idx = (idx * 5 + perturb + 1) & mask
+
+    def count_probes(self, hash_code, end_idx, indices):
+        probes = dummies = 0
+        for idx in self.probe_sequence(hash_code, len(indices)):
+            probes += 1
+            if idx == end_idx:
+                return probes, dummies
+            if indices[idx] == self.IX_DUMMY:
+                dummies += 1
+
+    def lookdict(self, key, op="lookdict"):
+        hash_code = hash(key)
+        hashes, keys = self.entries.hashes, self.entries.keys
+        mask = len(self.indices) - 1
+        perturb = PyDictReimplementationBase.signed_to_unsigned(hash_code)
+
+        idx = hash_code & mask
+        while self.indices[idx] != self.IX_EMPTY:
+            ix = self.indices[idx]
+            if ix != self.IX_DUMMY and hashes[ix] == hash_code and keys[ix] == key:
+                break
+
+            perturb >>= self.PERTURB_SHIFT
+            idx = (idx * 5 + perturb + 1) & mask
+
+        if self.stats is not None:
+            self.stats.record_probes(op, *self.count_probes(hash_code, idx, self.indices))
+
+        if self.indices[idx] == self.IX_EMPTY:
+            raise KeyError()
+        return idx
+
+    def _find_empty_slot(self, hash_code, op):
+        mask = len(self.indices) - 1
+        perturb = PyDictReimplementationBase.signed_to_unsigned(hash_code)
+
+        idx = hash_code & mask
+        while self.indices[idx] != self.IX_EMPTY:
+            perturb >>= self.PERTURB_SHIFT
+            idx = (idx * 5 + perturb + 1) & mask
+
+        if self.stats is not None and op is not None:
+            self.stats.record_probes(op, *self.count_probes(hash_code, idx, self.indices))
+        return idx
+
+    def __setitem__(self, key, value):
+        # the probes of the lookup are the probes of the operation, looking for the empty slot again is not counted
+        try:
+            idx = self.lookdict(key, "setitem")
+            self.entries.values[self.indices[idx]] = value
+            return
+        except KeyError:
+            pass
+
+        if self.usable <= 0:
+            self.resize()
+
+        self.insert_clean(hash(key), key, value, None)
+        self.used += 1
+
+    def insert_clean(self, hash_code, key, value, op="resize"):
+        ix = self.nentries
+        self.indices[self._find_empty_slot(hash_code, op)] = ix
+        self.entries.hashes[ix] = hash_code
+        self.entries.keys[ix] = key
+        self.entries.values[ix] = value
+        self.usable -= 1
+        self.nentries += 1
+
+    def __delitem__(self, key):
+        idx = self.lookdict(key)
+        ix = self.indices[idx]
+
+        self.indices[idx] = self.IX_DUMMY
+        self.entries.keys[ix] = DUMMY
+        self.entries.values[ix] = EMPTY
+        self.used -= 1
+
+    def __getitem__(self, key):
+        idx = self.lookdict(key)
+
+        return self.entries.values[self.indices[idx]]
+
+    # the entries are dense, so iterating walks them directly instead of going through the index table
+    def iterentries(self):
+        entries, nentries = self.entries, self.nentries
+        for hash_code, key, value in zip(entries.hashes[:nentries], entries.keys[:nentries], entries.values[:nentries]):
+            if key is not DUMMY:
+                yield hash_code, key, value
+
+    def iteritems(self):
+        nentries = self.nentries
+        for key, value in zip(self.entries.keys[:nentries], self.entries.values[:nentries]):
+            if key is not DUMMY:
+                yield key, value
+
+    def __iter__(self):
+        for key in self.entries.keys[:self.nentries]:
+            if key is not DUMMY:
+                yield key
+
+    def presize(self, count):
+        if self.usable < count:
+            self.rebuild(self.find_nearest_size((self.used + count) * 3 // 2))
+
+    def _next_size(self):
+        return self.used * 2 + len(self.indices) // 2
+
+    def resize(self):
+        self.rebuild(self.find_nearest_size(self._next_size()))
+
+    def rebuild(self, new_size):
+        old_entries, old_nentries = self.entries, self.nentries
+        self._init_table(new_size)
+        hashes, keys, values = self.entries.hashes, self.entries.keys, self.entries.values
+
+        ix = 0
+        for i in range(old_nentries):
+            key = old_entries.keys[i]
+            if key is DUMMY:
+                continue
+            hashes[ix] = old_entries.hashes[i]
+            keys[ix] = key
+            values[ix] = old_entries.values[i]
+            self.indices[self._find_empty_slot(hashes[ix], "resize")] = ix
+            ix += 1
+
+        self.nentries = ix
+        self.usable -= ix
+        if self.stats is not None:
+            self.stats.record_resize(ix)
+
+
+# The policies of the 3.11+ dicts, so that the reimplementation can be checked against the real dict
+# of a modern interpreter (dictinfo36.py):
+# - an empty or cleared dict shares a table of size 1 without usable entries, the first insert resizes it
+# - tables grow to fit used * 3, rounded up the way calculate_log2_keysize() does it
+# - tables with only str keys don't store the hashes; inserting another key rebuilds the table first
+# - a new key takes the first EMPTY or DUMMY index on its probe sequence
+class PyDictReimplementation311(PyDictReimplementation36):
+    def clear(self):
+        self._init_table(1)
+        self.used = 0
+        self.unicode = True
+
+    def __setitem__(self, key, value):
+        is_str = type(key) is str
+        if len(self.indices) == 1:
+            # the first insert allocates a new table anyway, its kind depends on the key
+            self.unicode = is_str
+        elif self.unicode and not is_str:
+            self.unicode = False
+            self.resize()
+
+        PyDictReimplementation36.__setitem__(self, key, value)
+
+    def _find_empty_slot(self, hash_code, op):
+        mask = len(self.indices) - 1
+        perturb = PyDictReimplementationBase.signed_to_unsigned(hash_code)
+
+        idx = hash_code & mask
+        while self.indices[idx] >= 0:
+            perturb >>= self.PERTURB_SHIFT
+            idx = (idx * 5 + perturb + 1) & mask
+
+        if self.stats is not None and op is not None:
+            self.stats.record_probes(op, *self.count_probes(hash_code, idx, self.indices))
+        return idx
+
+    def _next_size(self):
+        return self.used * 3
+
+    def find_nearest_size(self, minused):
+        # calculate_log2_keysize(), e.g. 3 -> 16, 15 -> 16, 16 -> 32
+        return 1 << max(((minused | 8) - 1).bit_length(), 3)
+
+
 def dump_reimpl_dict(d):
+    if d.slots is None:
+        # a split table (split_table_dict.SplitTableDict): the keys of the shared table and the values of this dict,
+        # with the number of shared keys as fill, like dictinfo33.dump_py_dict() of a split dict
+        shared_keys = d.shared_keys
+        hashes = [EMPTY if key is EMPTY else h for h, key in zip(shared_keys.hashes, shared_keys.keys)]
+        fill = sum(1 for key in shared_keys.keys if key is not EMPTY)
+        return hashes, list(shared_keys.keys), list(d.split_values), fill, d.used
+
+    if isinstance(d.slots, SlotsArray):
+        return d.slots.dump() + (d.fill, d.used)
+
     def extract_fields(field_name):
         return list(map(attrgetter(field_name), d.slots))
     return extract_fields('hash_code'), extract_fields('key'), extract_fields('value'), d.fill, d.used
+
+
+def dump_compact_dict(d):
+    def dump_index(ix):
+        if ix == PyDictReimplementation36.IX_EMPTY:
+            return EMPTY
+        if ix == PyDictReimplementation36.IX_DUMMY:
+            return DUMMY
+        return ix
+
+    hashes, keys, values = d.entries.dump()
+    nentries = d.nentries
+    hashes = [EMPTY if key is DUMMY else h for h, key in zip(hashes[:nentries], keys)]
+    return list(map(dump_index, d.indices)), hashes, keys[:nentries], values[:nentries], d.usable, nentries, d.used
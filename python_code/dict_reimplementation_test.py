@@ -0,0 +1,282 @@
+import random
+import sys
+import unittest
+from common import DUMMY, EMPTY
+from hash_chapter3_class_impl import AlmostPythonDictImplementationRecycling
+from dict_reimplementation import PyDictReimplementation32, PyDictReimplementation36, PyDictReimplementation311, dump_compact_dict
+
+
+class DictReimplementationTest(unittest.TestCase):
+    def test_incremental_resize(self):
+        class IncrementalDict32(PyDictReimplementation32):
+            INCREMENTAL_RESIZE_STEP = 2
+
+        d = IncrementalDict32()
+        ref = {}
+        resizes = 0
+        for i in range(5000):
+            key = random.randint(0, 1000)
+            if random.random() < 0.3 and key in ref:
+                del ref[key]
+                del d[key]
+            else:
+                ref[key] = i
+                d[key] = i
+            self.assertEqual(d.used, len(ref))
+            resizes += d.old_slots is not None and d.old_slots_idx == 0
+
+        self.assertGreater(resizes, 0)
+        for key in range(1000):
+            if key in ref:
+                self.assertEqual(d[key], ref[key])
+            else:
+                with self.assertRaises(KeyError):
+                    d[key]
+
+    def test_compaction(self):
+        for step in [None, 2]:
+            class CompactingDict32(PyDictReimplementation32):
+                COMPACT_DUMMY_RATIO = 0.1
+                INCREMENTAL_RESIZE_STEP = step
+
+            d = CompactingDict32()
+            stats = d.enable_stats()
+            ref = {}
+            for i in range(5000):
+                key = random.randint(0, 1000)
+                if random.random() < 0.5 and key in ref:
+                    del ref[key]
+                    del d[key]
+                    # the DUMMY ratio is checked by deletes, unless a resize is in progress
+                    if d.old_slots is None:
+                        self.assertLessEqual(d.fill - d.used, 0.1 * len(d.slots))
+                else:
+                    ref[key] = i
+                    d[key] = i
+                self.assertEqual(d.used, len(ref))
+
+            self.assertGreater(stats.compactions, 0)
+            for key in range(1000):
+                if key in ref:
+                    self.assertEqual(d[key], ref[key])
+                else:
+                    with self.assertRaises(KeyError):
+                        d[key]
+
+    def test_compaction_during_incremental_resize(self):
+        # a compaction shrinks the table to fit the keys, then the inserts resize it again while most keys
+        # still wait in the old table: these have to go to the new table, the shrunk one has no room for them
+        for klass in [PyDictReimplementation32, AlmostPythonDictImplementationRecycling]:
+            class CompactingIncrementalDict(klass):
+                COMPACT_DUMMY_RATIO = 0.2
+                INCREMENTAL_RESIZE_STEP = 2
+
+            for seed in range(20):
+                rng = random.Random(seed)
+                d = CompactingIncrementalDict()
+                stats = d.enable_stats()
+                ref = {}
+                present = []
+                for i in range(3000):
+                    # phases of 50/50 inserts and deletes and of mostly deletes
+                    if present and rng.random() < (0.5 if i // 500 % 2 == 0 else 0.8):
+                        idx = rng.randrange(len(present))
+                        present[idx], present[-1] = present[-1], present[idx]
+                        key = present.pop()
+                        del ref[key]
+                        del d[key]
+                    else:
+                        present.append(i)
+                        ref[i] = i
+                        d[i] = i
+                    if i % 100 == 0:
+                        d.update([(key, -key) for key in present[-3:]])
+                        ref.update((key, -key) for key in present[-3:])
+                    self.assertEqual(d.used, len(ref))
+
+                self.assertGreater(stats.compactions, 0)
+                self.assertEqual(dict(d.items()), ref)
+
+    def test_probe_stats(self):
+        d = PyDictReimplementation32()
+        stats = d.enable_stats()
+        d[0] = 0
+        # hash(8) % 8 == 0, the next slot is (0 * 5 + 8 + 1) % 8
+        d[8] = 8
+        del d[0]
+        self.assertEqual(d[8], 8)
+
+        self.assertEqual(stats.probes, {"setitem": [0, 1, 1], "lookdict": [0, 1, 1]})
+        self.assertEqual(stats.dummies_skipped, {"setitem": 0, "lookdict": 1})
+        self.assertEqual(stats.resizes, 0)
+
+
+class CompactDictReimplementationTest(unittest.TestCase):
+    def test_handcrafted(self):
+        d = PyDictReimplementation36()
+        self.assertEqual(len(d.indices), 8)
+        self.assertEqual(d.indices.typecode, 'b')
+        self.assertEqual(d.usable, 5)
+
+        # hash(x) == x for small ints, so 1, 9 and 17 all start probing from the index 1
+        d[1] = "a"
+        d[9] = "b"
+        d[17] = "c"
+        self.assertEqual(d[1], "a")
+        self.assertEqual(d[9], "b")
+        self.assertEqual(d[17], "c")
+
+        indices, hashes, keys, values, usable, nentries, used = dump_compact_dict(d)
+        self.assertEqual(indices, [EMPTY, 0, EMPTY, EMPTY, EMPTY, EMPTY, 1, 2])
+        self.assertEqual(keys, [1, 9, 17])
+        self.assertEqual(values, ["a", "b", "c"])
+        self.assertEqual((usable, nentries, used), (2, 3, 3))
+
+        with self.assertRaises(KeyError):
+            del d[25]
+
+        del d[9]
+        with self.assertRaises(KeyError):
+            d[9]
+        indices, hashes, keys, values, usable, nentries, used = dump_compact_dict(d)
+        self.assertEqual(indices, [EMPTY, 0, EMPTY, EMPTY, EMPTY, EMPTY, DUMMY, 2])
+        self.assertEqual(hashes, [1, EMPTY, 17])
+        self.assertEqual(keys, [1, DUMMY, 17])
+        self.assertEqual((usable, nentries, used), (2, 3, 2))
+
+        # new keys never reuse dummy indices
+        d[25] = "d"
+        d[2] = "e"
+        indices, hashes, keys, values, usable, nentries, used = dump_compact_dict(d)
+        self.assertEqual(indices, [EMPTY, 0, 4, EMPTY, 3, EMPTY, DUMMY, 2])
+        self.assertEqual((usable, nentries, used), (0, 5, 4))
+
+        d[2] = "f"
+        self.assertEqual(d[2], "f")
+        self.assertEqual(d.nentries, 5)
+
+        # no usable entries left, so inserting a new key resizes the table to fit used * 2 + size // 2
+        d[3] = "g"
+        self.assertEqual(len(d.indices), 16)
+        indices, hashes, keys, values, usable, nentries, used = dump_compact_dict(d)
+        self.assertEqual(keys, [1, 17, 25, 2, 3])
+        self.assertEqual(values, ["a", "c", "d", "f", "g"])
+        self.assertEqual(indices[1], 0)
+        self.assertEqual(indices[6], 1)
+        self.assertEqual(indices[9], 2)
+        self.assertEqual(indices[2], 3)
+        self.assertEqual(indices[3], 4)
+        self.assertEqual((usable, nentries, used), (5, 5, 5))
+
+    def test_index_width(self):
+        self.assertEqual(PyDictReimplementation36.index_typecode(2 ** 7), 'b')
+        self.assertEqual(PyDictReimplementation36.index_typecode(2 ** 8), 'h')
+        self.assertEqual(PyDictReimplementation36.index_typecode(2 ** 15), 'h')
+        self.assertEqual(PyDictReimplementation36.index_typecode(2 ** 16), 'i')
+
+        d = PyDictReimplementation36((i, i) for i in range(1000))
+        self.assertEqual(d.indices.typecode, 'h')
+
+    def test_insertion_order(self):
+        d = PyDictReimplementation36()
+        ref = {}
+        for i in range(3000):
+            key = random.randint(0, 500)
+            if random.random() < 0.3 and key in ref:
+                del ref[key]
+                del d[key]
+            else:
+                ref[key] = i
+                d[key] = i
+
+        self.assertEqual(len(d), len(ref))
+        self.assertEqual(list(d), list(ref))
+        for key in ref:
+            self.assertEqual(d[key], ref[key])
+
+    def test_probe_stats(self):
+        d = PyDictReimplementation36()
+        stats = d.enable_stats()
+        for key in range(0, 48, 8):
+            d[key] = key
+
+        # one record per __setitem__: looking for the key ends at the empty slot the new key takes,
+        # the 6th key does not fit into 8 slots and is inserted after the resize
+        self.assertEqual(stats.probes, {
+            "setitem": [0, 1, 2, 2, 1],
+            "resize": [0, 2, 3],
+        })
+        self.assertEqual(stats.resizes, 1)
+        self.assertEqual(stats.resize_moved, 5)
+
+    def test_bulk_operations(self):
+        d = PyDictReimplementation36()
+        d.update((key, str(key)) for key in range(100))
+        self.assertEqual(len(d.indices), 256)
+        self.assertEqual(list(d), list(range(100)))
+
+        copy = PyDictReimplementation36.fromkeys(["x"])
+        copy.update(d)
+        # a missing key deletes nothing, whether the keys are deleted one by one or the table is rebuilt
+        for missing in [[10, 12, "y"], list(range(100)) + ["y"]]:
+            with self.assertRaises(KeyError):
+                copy.delete_many(missing)
+            self.assertEqual(len(copy), 101)
+        copy.delete_many(range(10, 100, 2))
+        self.assertEqual(list(copy), ["x"] + list(range(10)) + list(range(11, 100, 2)))
+        copy.delete_many([key for key in copy if key != "x" and key < 80])
+        self.assertEqual(list(copy.items()), [("x", None)] + [(key, str(key)) for key in range(81, 100, 2)])
+        self.assertEqual(copy.nentries, len(copy))
+
+    @unittest.skipUnless(sys.version_info[:2] >= (3, 11), "needs the dict layout of 3.11+")
+    def test_dict311_matches_actual_dict(self):
+        from dictinfo import dump_py_dict
+
+        d = {}
+        reimpl = PyDictReimplementation311()
+        self.assertEqual(dump_py_dict(d), dump_compact_dict(reimpl))
+        self.assertEqual(len(reimpl.indices), 1)
+
+        # str keys first, then an int key converts the table, then deletes leave DUMMY indices that get reused
+        keys = ["a", "b", "c", 3, 11, 19] + list(range(100, 2000, 7)) + ["x" * i for i in range(1, 50)]
+        for i, key in enumerate(keys):
+            d[key] = reimpl[key] = i
+            self.assertEqual(dump_py_dict(d), dump_compact_dict(reimpl))
+            if i % 3 == 0:
+                del d[keys[i // 2]]
+                del reimpl[keys[i // 2]]
+                self.assertEqual(dump_py_dict(d), dump_compact_dict(reimpl))
+
+        self.assertEqual(reimpl.indices.typecode, 'h')
+        self.assertFalse(reimpl.unicode)
+
+    @unittest.skipUnless(sys.version_info[:2] >= (3, 6), "needs compact dicts")
+    def test_dump_actual_split_table(self):
+        from dictinfo import dump_py_dict
+
+        class Obj(object):
+            pass
+
+        a, b = Obj(), Obj()
+        a.x, a.y = 1, 2
+        b.x = 3
+        indices, hashes, keys, values, usable, nentries, used = dump_py_dict(a.__dict__)
+        self.assertEqual(keys, ["x", "y"])
+        self.assertEqual(values, [1, 2])
+        self.assertEqual(hashes, [hash("x"), hash("y")])
+        self.assertEqual((nentries, used), (2, 2))
+        self.assertEqual(sorted(ix for ix in indices if ix is not EMPTY), [0, 1])
+
+        # the keys are shared, b doesn't have a value for y
+        indices, hashes, keys, values, usable, nentries, used = dump_py_dict(b.__dict__)
+        self.assertEqual(keys, ["x", "y"])
+        self.assertEqual(values, [3, EMPTY])
+        self.assertEqual(used, 1)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import timeit
+
+from dict32_reimplementation_test_v2 import IMPLEMENTATIONS
+from workloads import KV_CHOICES, make_kv_factory
+
+WORKLOADS = ["insert", "lookup_hit", "lookup_miss", "delete", "mixed"]
+
+# mixed workload: the rest of the operations are lookups of present keys
+MIXED_INSERT_CHANCE = 0.2
+MIXED_DELETE_CHANCE = 0.2
+
+
+def generate_unique_keys(kv_factory, count):
+    keys = []
+    seen = set()
+    attempts = 0
+    while len(keys) < count:
+        key = kv_factory.generate_key()
+        attempts += 1
+        if key not in seen:
+            seen.add(key)
+            keys.append(key)
+        elif attempts > 100 * count:
+            raise Exception("Could not generate {} unique keys, the key space of the factory is too small".format(count))
+    return keys
+
+
+def generate_mixed_ops(keys, extra_keys, num_ops):
+    present = list(keys)
+    absent = list(extra_keys)
+    ops = []
+    for _ in range(num_ops):
+        r = random.random()
+        if r < MIXED_INSERT_CHANCE and absent:
+            key = absent.pop()
+            present.append(key)
+            ops.append((0, key))
+        elif r < MIXED_INSERT_CHANCE + MIXED_DELETE_CHANCE and present:
+            idx = random.randrange(len(present))
+            present[idx], present[-1] = present[-1], present[idx]
+            key = present.pop()
+            absent.append(key)
+            ops.append((1, key))
+        else:
+            ops.append((2, random.choice(present)))
+    return ops
+
+
+def build(factory, keys, values):
+    d = factory()
+    for k, v in zip(keys, values):
+        d[k] = v
+    return d
+
+
+# Small tables are benchmarked in batches, so that every measurement covers at least min_ops operations
+def measure(workload, factory, keys, extra_keys, values, batches):
+    timer = timeit.default_timer
+    if workload == "insert":
+        start = timer()
+        for _ in range(batches):
+            d = factory()
+            for k, v in zip(keys, values):
+                d[k] = v
+        return timer() - start, batches * len(keys)
+
+    if workload in ("lookup_hit", "lookup_miss"):
+        d = build(factory, keys, values)
+        lookup_keys = keys if workload == "lookup_hit" else extra_keys
+        start = timer()
+        for _ in range(batches):
+            for k in lookup_keys:
+                try:
+                    d[k]
+                except KeyError:
+                    pass
+        return timer() - start, batches * len(lookup_keys)
+
+    if workload == "delete":
+        dicts = [build(factory, keys, values) for _ in range(batches)]
+        start = timer()
+        for d in dicts:
+            for k in keys:
+                del d[k]
+        return timer() - start, batches * len(keys)
+
+    if workload == "mixed":
+        ops = generate_mixed_ops(keys, extra_keys, len(keys))
+        dicts = [build(factory, keys, values) for _ in range(batches)]
+        start = timer()
+        for d in dicts:
+            for op, k in ops:
+                if op == 0:
+                    d[k] = k
+                elif op == 1:
+                    del d[k]
+                else:
+                    d[k]
+        return timer() - start, batches * len(ops)
+
+    raise ValueError("Unknown workload: {}".format(workload))
+
+
+def run(implementations, workloads, kv, sizes, repeat, min_ops, seed):
+    results = []
+    for size in sizes:
+        random.seed(seed)
+        kv_factory = make_kv_factory(kv, 4 * size)
+        all_keys = generate_unique_keys(kv_factory, 2 * size)
+        keys, extra_keys = all_keys[:size], all_keys[size:]
+        values = [kv_factory.generate_value() for _ in range(size)]
+        batches = max(1, min_ops // size)
+
+        for name in implementations:
+            factory = IMPLEMENTATIONS[name][0]
+            for workload in workloads:
+                random.seed(seed)
+                seconds, ops = min(measure(workload, factory, keys, extra_keys, values, batches) for _ in range(repeat))
+                result = {
+                    "implementation": name,
+                    "workload": workload,
+                    "kv": kv,
+                    "size": size,
+                    "ops": ops,
+                    "seconds": seconds,
+                    "ns_per_op": seconds * 10 ** 9 / ops,
+                    "ops_per_sec": ops / seconds,
+                }
+                print("{:<46}{:<12}size {:<10}{:>12.1f} ns/op {:>14.0f} ops/sec".format(
+                    name, workload, size, result["ns_per_op"], result["ops_per_sec"]))
+                results.append(result)
+    return results
+
+
+def result_key(result):
+    return result["implementation"], result["workload"], result["kv"], result["size"]
+
+
+def compare(old_results, new_results):
+    old = dict((result_key(r), r) for r in old_results)
+    for r in new_results:
+        if result_key(r) in old:
+            old_ns = old[result_key(r)]["ns_per_op"]
+            print("{:<46}{:<12}size {:<10}{:>12.1f} -> {:>10.1f} ns/op ({:+.1f}%)".format(
+                r["implementation"], r["workload"], r["size"], old_ns, r["ns_per_op"],
+                (r["ns_per_op"] / old_ns - 1) * 100))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure throughput of the dict implementations')
+    parser.add_argument('--implementation', choices=IMPLEMENTATIONS.keys(), action='append')
+    parser.add_argument('--workload', choices=WORKLOADS, action='append')
+    # the benchmark needs 2 * size different keys, zipf draws them from 4 * size keys and mostly repeats the hot ones
+    parser.add_argument('--kv', choices=[kv for kv in KV_CHOICES if kv != "zipf"], required=True)
+    parser.add_argument('--size', type=int, action='append')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-ops', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='compare with the results of a previous run written with --output')
+    args = parser.parse_args()
+
+    # the js implementations need a running node server, so they are only benchmarked when asked for explicitly
+    implementations = args.implementation or sorted(name for name in IMPLEMENTATIONS if not name.endswith("_js"))
+    results = run(implementations, args.workload or WORKLOADS, args.kv,
+                  args.size or [10, 100, 1000, 10000, 100000], args.repeat, args.min_ops, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                "python": sys.version,
+                "platform": platform.platform(),
+                "args": vars(args),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], results)
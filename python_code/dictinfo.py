@@ -9,12 +9,27 @@ def dump_py_dict(d):
 
     if vi.minor < 2:
         raise Exception("Unsupported minor version (too old)")
-    if vi.minor > 3:
+    if vi.minor > 13:
         raise Exception("Unsupported minor version (too new)")
+    if vi.minor in (4, 5):
+        raise Exception("Unsupported minor version")
 
     if vi.minor == 2:
         import dictinfo32
         return dictinfo32.dump_py_dict(d)
-    else:
+    elif vi.minor == 3:
         import dictinfo33
         return dictinfo33.dump_py_dict(d)
+    else:
+        # compact dicts, in the format of dict_reimplementation.dump_compact_dict()
+        import dictinfo36
+        return dictinfo36.dump_py_dict(d)
+
+
+def py_dict_table_view(d):
+    # only the 3.2 layout is a single table of (hash, key, value) slots
+    if sys.version_info[:2] != (3, 2):
+        raise Exception("Unsupported version, only 3.2 dicts have a table view")
+
+    import dictinfo32
+    return dictinfo32.table_view(d)
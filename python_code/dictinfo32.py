@@ -1,5 +1,5 @@
-from ctypes import Structure, c_ulong, POINTER, cast, py_object, c_long
-from common import get_object_field_or_null, EMPTY, DUMMY
+from ctypes import Structure, c_ulong, POINTER, cast, addressof, py_object, c_long
+from common import get_object_field_or_null, read_entry_table, EMPTY, DUMMY
 
 
 class PyDictEntry(Structure):
@@ -31,25 +31,26 @@ dummy_internal = dictobject(d).ma_table[0].me_key
 del d
 
 
-def dump_py_dict(d):
-    do = dictobject(d)
+def read_entry(entry):
+    key = get_object_field_or_null(entry, 'me_key')
+    if key is EMPTY:
+        return EMPTY, EMPTY, EMPTY
+    return entry.me_hash, key if key is not dummy_internal else DUMMY, get_object_field_or_null(entry, 'me_value')
+
 
-    keys = []
-    hashes = []
-    values = []
+# size, fill, used and a function that reads one (hash, key, value) slot, so that a few slots can be compared
+# without dumping the whole table
+def table_view(d):
+    do = dictobject(d)
+    table = do.ma_table
 
-    size = do.ma_mask + 1
+    def read_slot(idx):
+        return read_entry(table[idx])
 
-    for i in range(size):
-        key = get_object_field_or_null(do.ma_table[i], 'me_key')
-        keys.append(key if key is not dummy_internal else DUMMY)
+    return do.ma_mask + 1, do.ma_fill, do.ma_used, read_slot
 
-    for i, key in enumerate(keys):
-        if key is EMPTY:
-            hashes.append(EMPTY)
-            values.append(EMPTY)
-        else:
-            hashes.append(do.ma_table[i].me_hash)
-            values.append(get_object_field_or_null(do.ma_table[i], 'me_value'))
 
+def dump_py_dict(d):
+    do = dictobject(d)
+    hashes, keys, values = read_entry_table(addressof(do.ma_table.contents), do.ma_mask + 1, dummy_internal)
     return hashes, keys, values, do.ma_fill, do.ma_used
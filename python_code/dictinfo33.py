@@ -1,5 +1,5 @@
 from ctypes import Structure, c_ulong, POINTER, cast, addressof, py_object, c_long, c_void_p
-from common import get_object_field_or_null, EMPTY, DUMMY
+from common import read_entry_table
 
 
 class PyDictKeyEntry(Structure):
@@ -48,23 +48,7 @@ def usable_fraction(size):
 
 def dump_py_dict(d):
     do = dictobject(d)
+    keys_object = do.ma_keys.contents
 
-    keys = []
-    hashes = []
-    values = []
-
-    size = do.ma_keys.contents.dk_size
-    entries = cast(addressof(do.ma_keys.contents.dk_entries), POINTER(PyDictKeyEntry))
-    for i in range(size):
-        key = get_object_field_or_null(entries[i], 'me_key')
-        keys.append(key if key is not dummy_internal else DUMMY)
-
-    for i, key in enumerate(keys):
-        if key is EMPTY:
-            hashes.append(EMPTY)
-            values.append(EMPTY)
-        else:
-            hashes.append(entries[i].me_hash)
-            values.append(get_object_field_or_null(entries[i], 'me_value'))
-
-    return hashes, keys, values, usable_fraction(do.ma_keys.contents.dk_size) - do.ma_keys.contents.dk_usable, do.ma_used
+    hashes, keys, values = read_entry_table(addressof(keys_object.dk_entries), keys_object.dk_size, dummy_internal)
+    return hashes, keys, values, usable_fraction(keys_object.dk_size) - keys_object.dk_usable, do.ma_used
@@ -0,0 +1,155 @@
+import sys
+import sysconfig
+from ctypes import Structure, POINTER, cast, addressof, sizeof, py_object, c_ssize_t, c_void_p, c_uint8, c_uint32, c_uint64, c_int8, c_int16, c_int32, c_int64
+from common import get_object_field_or_null, EMPTY, DUMMY
+
+# The compact dicts of 3.6 - 3.13: an index table of 1, 2, 4 or 8 byte signed ints (depending on the size),
+# followed by the entries array in insertion order. Deleted entries have a NULL key and a DKIX_DUMMY index.
+#
+# 3.11+ store the size as log2 and don't store the hashes of str-only tables (dk_kind != DICT_KEYS_GENERAL),
+# the hash of a str is cached in the str itself.
+# Split tables (instance dicts) share the keys object between the instances and keep the values in ma_values.
+DKIX_EMPTY = -1
+DKIX_DUMMY = -2
+
+DICT_KEYS_GENERAL = 0
+
+INDEX_TYPES = {1: c_int8, 2: c_int16, 4: c_int32, 8: c_int64}
+
+if sys.version_info[:2] >= (3, 13) and sysconfig.get_config_var("Py_GIL_DISABLED"):
+    raise ImportError("Free-threaded builds have a different object header, they are not supported")
+
+
+class PyDictKeyEntry(Structure):
+    _fields_ = [
+        ('me_hash', c_ssize_t),
+        ('me_key', py_object),
+        ('me_value', py_object),
+    ]
+
+
+class PyDictUnicodeEntry(Structure):
+    _fields_ = [
+        ('me_key', py_object),
+        ('me_value', py_object),
+    ]
+
+
+if sys.version_info[:2] >= (3, 11):
+    class PyDictKeysObject(Structure):
+        _fields_ = [
+            ('dk_refcnt', c_ssize_t),
+            ('dk_log2_size', c_uint8),
+            ('dk_log2_index_bytes', c_uint8),
+            ('dk_kind', c_uint8),
+            ('dk_version', c_uint32),
+            ('dk_usable', c_ssize_t),
+            ('dk_nentries', c_ssize_t),
+            # char dk_indices[], followed by the entries
+        ]
+
+    def keys_size(keys):
+        return 1 << keys.dk_log2_size
+
+    def index_bytes(keys):
+        return 1 << (keys.dk_log2_index_bytes - keys.dk_log2_size)
+
+    def entry_type(keys):
+        return PyDictKeyEntry if keys.dk_kind == DICT_KEYS_GENERAL else PyDictUnicodeEntry
+else:
+    class PyDictKeysObject(Structure):
+        _fields_ = [
+            ('dk_refcnt', c_ssize_t),
+            ('dk_size', c_ssize_t),
+            ('dk_lookup', c_void_p),
+            ('dk_usable', c_ssize_t),
+            ('dk_nentries', c_ssize_t),
+            # char dk_indices[], followed by the entries
+        ]
+
+    def keys_size(keys):
+        return keys.dk_size
+
+    def index_bytes(keys):
+        size = keys.dk_size
+        if size <= 0xff:
+            return 1
+        if size <= 0xffff:
+            return 2
+        if size <= 0xffffffff:
+            return 4
+        return 8
+
+    def entry_type(keys):
+        return PyDictKeyEntry
+
+
+# 3.13 puts capacity, size, embedded and valid bytes in front of the values
+VALUES_OFFSET = 8 if sys.version_info[:2] >= (3, 13) else 0
+
+
+class PyDictObject(Structure):
+    _fields_ = [
+        ('ob_refcnt', c_ssize_t),
+        ('ob_type', c_void_p),
+        ('ma_used', c_ssize_t),
+        ('ma_version_tag', c_uint64),
+        ('ma_keys', POINTER(PyDictKeysObject)),
+        ('ma_values', c_void_p),
+    ]
+
+
+def dictobject(d):
+    return cast(id(d), POINTER(PyDictObject)).contents
+
+
+def dump_index(ix):
+    if ix == DKIX_EMPTY:
+        return EMPTY
+    if ix == DKIX_DUMMY:
+        return DUMMY
+    return ix
+
+
+def read_split_value(split_values, i):
+    try:
+        return split_values[i]
+    except ValueError:
+        return EMPTY
+
+
+# The same format as dict_reimplementation.dump_compact_dict(): indices, hashes, keys, values, usable, nentries, used.
+# For split tables, the keys are the shared ones, and the keys the instance doesn't have get EMPTY values.
+def dump_py_dict(d):
+    do = dictobject(d)
+    keys_object = do.ma_keys.contents
+
+    size = keys_size(keys_object)
+    width = index_bytes(keys_object)
+    indices_address = addressof(keys_object) + sizeof(PyDictKeysObject)
+    indices = cast(indices_address, POINTER(INDEX_TYPES[width]))
+    klass = entry_type(keys_object)
+    entries = cast(indices_address + size * width, POINTER(klass))
+    nentries = keys_object.dk_nentries
+    split_values = cast(do.ma_values + VALUES_OFFSET, POINTER(py_object)) if do.ma_values else None
+
+    hashes = []
+    keys = []
+    values = []
+    for i in range(nentries):
+        entry = entries[i]
+        key = get_object_field_or_null(entry, 'me_key')
+        if key is EMPTY:
+            hashes.append(EMPTY)
+            keys.append(DUMMY)
+            values.append(EMPTY)
+            continue
+
+        hashes.append(entry.me_hash if klass is PyDictKeyEntry else hash(key))
+        keys.append(key)
+        if split_values is not None:
+            values.append(read_split_value(split_values, i))
+        else:
+            values.append(get_object_field_or_null(entry, 'me_value'))
+
+    return [dump_index(indices[i]) for i in range(size)], hashes, keys, values, keys_object.dk_usable, nentries, do.ma_used
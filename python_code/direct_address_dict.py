@@ -0,0 +1,159 @@
+from common import EMPTY
+from dict_reimpl_common import BaseDictImpl
+from dict_reimplementation import PyDictReimplementation32
+
+
+# For int keys from a dense range: the value of the key k is values[k - base], and present tells which keys are there,
+# so there is no hashing and no probing. The range grows (like a list, with room to spare) as long as it stays
+# dense enough. A key of another type, or a key that would make the range too sparse, moves everything
+# to an open addressing table, and from then on the dict is a wrapper around that table.
+class DirectAddressDict(BaseDictImpl):
+    MIN_SPAN = 8
+    # the range is dense enough while it has at most this many positions per key, or is this short anyway
+    # (the first keys of a dense range inserted in random order look sparse)
+    MAX_SPAN_PER_KEY = 4
+    MAX_SHORT_SPAN = 1024
+    FALLBACK = PyDictReimplementation32
+
+    def __init__(self, pairs=None):
+        BaseDictImpl.__init__(self)
+        # not presized: the array grows with the range of the keys, which is not known before they are inserted
+        if pairs:
+            for k, v in pairs:
+                self[k] = v
+
+    def clear(self):
+        self.base = 0
+        # the smallest and the largest keys inserted (the deletions don't move them)
+        self.low_key = self.high_key = None
+        self.values_array = [EMPTY] * self.MIN_SPAN
+        self.present = bytearray(self.MIN_SPAN)
+        self.used = 0
+        self.fallback = None
+
+    def _direct_index(self, key):
+        # keys of other types can still be equal to an int key, like True == 1
+        if type(key) is not int:
+            try:
+                int_key = int(key)
+            except (TypeError, ValueError, OverflowError):
+                return None
+            if int_key != key:
+                return None
+            key = int_key
+
+        idx = key - self.base
+        if 0 <= idx < len(self.present) and self.present[idx]:
+            return idx
+        return None
+
+    def __getitem__(self, key):
+        if self.fallback is not None:
+            return self.fallback[key]
+
+        idx = self._direct_index(key)
+        if idx is None:
+            raise KeyError()
+        return self.values_array[idx]
+
+    def __setitem__(self, key, value):
+        if self.fallback is not None:
+            self.fallback[key] = value
+            # used counts the keys in both modes, update() and delete_many() of BaseDictImpl rely on it
+            self.used = self.fallback.used
+            return
+
+        if type(key) is not int:
+            self.convert_to_fallback()
+            self[key] = value
+            return
+
+        idx = key - self.base
+        if not 0 <= idx < len(self.present):
+            if not self.extend_range(key):
+                self.convert_to_fallback()
+                self[key] = value
+                return
+            idx = key - self.base
+
+        if not self.present[idx]:
+            self.present[idx] = 1
+            self.used += 1
+            if self.used == 1:
+                self.low_key = self.high_key = key
+            elif key < self.low_key:
+                self.low_key = key
+            elif key > self.high_key:
+                self.high_key = key
+        self.values_array[idx] = value
+
+    def __delitem__(self, key):
+        if self.fallback is not None:
+            del self.fallback[key]
+            self.used = self.fallback.used
+            return
+
+        idx = self._direct_index(key)
+        if idx is None:
+            raise KeyError()
+        self.present[idx] = 0
+        self.values_array[idx] = EMPTY
+        self.used -= 1
+
+    def extend_range(self, key):
+        if not self.used:
+            # nothing to keep, the range starts at the key
+            self.base = key
+            self.values_array = [EMPTY] * len(self.present)
+            self.present = bytearray(len(self.present))
+            return True
+
+        low = min(self.low_key, key)
+        high = max(self.high_key, key)
+        span = high - low + 1
+        if span > max(self.MAX_SPAN_PER_KEY * (self.used + 1), self.MAX_SHORT_SPAN):
+            return False
+
+        # room for as many keys again in the direction the range grows, only the keys between low_key and high_key
+        # are copied
+        new_span = 2 * span
+        new_base = low if key > self.high_key else high - new_span + 1
+        start, end = self.low_key - self.base, self.high_key - self.base + 1
+        offset = self.low_key - new_base
+        values_array = [EMPTY] * new_span
+        present = bytearray(new_span)
+        values_array[offset:offset + end - start] = self.values_array[start:end]
+        present[offset:offset + end - start] = self.present[start:end]
+        self.base, self.values_array, self.present = new_base, values_array, present
+        return True
+
+    def convert_to_fallback(self):
+        fallback = self.FALLBACK()
+        fallback.insert_new_entries(list(self.iterentries()))
+        self.fallback = fallback
+        self.values_array = None
+        self.present = None
+
+    def iterentries(self):
+        if self.fallback is not None:
+            for entry in self.fallback.iterentries():
+                yield entry
+            return
+
+        base = self.base
+        for idx, is_present in enumerate(self.present):
+            if is_present:
+                key = base + idx
+                yield hash(key), key, self.values_array[idx]
+
+    def presize(self, count):
+        if self.fallback is not None:
+            self.fallback.presize(count)
+
+    def insert_new_entries(self, entries):
+        if self.fallback is not None:
+            self.fallback.insert_new_entries(entries)
+            self.used = self.fallback.used
+            return
+        for _, key, value in entries:
+            self[key] = value
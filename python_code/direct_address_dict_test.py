@@ -0,0 +1,87 @@
+import unittest
+from direct_address_dict import DirectAddressDict
+from dict_reimplementation import PyDictReimplementation32
+from reimpl_test_common import check_random_operations
+
+
+class DirectAddressDictTest(unittest.TestCase):
+    def test_dense_range(self):
+        d = DirectAddressDict()
+        # the range grows at both ends
+        for key in list(range(100, 200)) + list(range(99, 49, -1)):
+            d[key] = key * 2
+        self.assertIsNone(d.fallback)
+        self.assertEqual(len(d), 150)
+        self.assertLessEqual(len(d.present), 4 * 150)
+        self.assertEqual(list(d.keys()), list(range(50, 200)))
+        self.assertEqual(d[150], 300)
+        self.assertNotIn(200, d)
+        self.assertNotIn(49, d)
+
+        # keys of other types equal to an int key
+        self.assertEqual(d[150.0], 300)
+        d[1] = 1
+        self.assertIn(True, d)
+        self.assertNotIn(150.5, d)
+        self.assertNotIn("150", d)
+        self.assertIsNone(d.fallback)
+
+        del d[150]
+        self.assertNotIn(150, d)
+        self.assertEqual(len(d), 150)
+        with self.assertRaises(KeyError):
+            del d[150]
+
+    def test_fallback(self):
+        for outlier in [10 ** 6, -10 ** 6, "a", None, True]:
+            d = DirectAddressDict()
+            for key in range(10):
+                d[key] = key
+            d[outlier] = "outlier"
+            self.assertIsInstance(d.fallback, PyDictReimplementation32)
+            self.assertEqual(len(d), 10 if outlier is True else 11)
+            self.assertEqual(d[outlier], "outlier")
+            self.assertEqual(d[5], 5)
+
+            # the dict stays an open addressing table
+            del d[outlier]
+            d[11] = 11
+            self.assertIsNotNone(d.fallback)
+            self.assertEqual(sorted(d.keys()), [k for k in range(12) if k not in (1, 10)] if outlier is True else list(range(10)) + [11])
+
+    def test_bulk_operations_after_fallback(self):
+        d = DirectAddressDict([(5, 5), ("a", 1)])
+        self.assertIsNotNone(d.fallback)
+        self.assertEqual(d.used, 2)
+
+        # update() only skips the checks for keys already in the table when the dict is empty
+        d.update(PyDictReimplementation32([("a", 2), (5, 6)]))
+        self.assertEqual(len(d), 2)
+        self.assertEqual(dict(d.items()), {5: 6, "a": 2})
+
+        d.update([(i, i) for i in range(10)])
+        self.assertEqual(len(d), 11)
+        d.delete_many([5, "a"])
+        self.assertEqual(sorted(d.keys()), [i for i in range(10) if i != 5])
+        d.delete_many([i for i in range(10) if i != 5])
+        self.assertEqual(len(d), 0)
+        with self.assertRaises(KeyError):
+            d.delete_many(["a"])
+
+    def test_random_operations(self):
+        for key_range in [1000, 10 ** 9]:
+            def generate_key(rng):
+                return rng.randrange(key_range) if rng.random() < 0.9 else rng.randint(0, 1000)
+
+            for seed in range(3):
+                d = DirectAddressDict()
+                check_random_operations(self, d, generate_key, seed, check_keys=range(1000))
+                self.assertEqual(d.fallback is None, key_range == 1000)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import random
+import timeit
+
+import hash_chapter1_impl
+import hash_chapter1_vectorized
+import hash_chapter2_impl
+import hash_chapter2_vectorized
+
+
+def build_chapter1(n, load_factor):
+    numbers = random.sample(range(10 * n), n)
+    return numbers, (hash_chapter1_impl.create_new(numbers),)
+
+
+def build_chapter2(n, load_factor):
+    keys = random.sample(range(10 * n), n)
+    # create_new() always makes tables with the load factor of 0.5, so insert some keys later to get higher ones
+    initial_count = min(n, int(n / (2 * load_factor)))
+    hash_codes, table_keys = hash_chapter2_vectorized.create_new(keys[:initial_count])
+    for key in keys[initial_count:]:
+        hash_chapter2_impl.insert(hash_codes, table_keys, key)
+    # and resize to get lower ones
+    while load_factor < 0.5 and n > load_factor * len(table_keys):
+        hash_codes, table_keys = hash_chapter2_impl.resize(hash_codes, table_keys)
+    return keys, (hash_codes, table_keys)
+
+
+CHAPTERS = {
+    "chapter1": (build_chapter1, hash_chapter1_impl.has_key, hash_chapter1_vectorized.prepare_has_key_many),
+    "chapter2": (build_chapter2, hash_chapter2_impl.has_key, hash_chapter2_vectorized.prepare_has_key_many),
+}
+
+
+def run(chapter, table_sizes, load_factors, num_queries):
+    build, has_key, prepare_has_key_many = CHAPTERS[chapter]
+    if chapter == "chapter1":
+        # chapter 1 tables are always twice as big as the number of keys
+        load_factors = [0.5]
+    print(chapter)
+    for n in table_sizes:
+        for load_factor in load_factors:
+            keys, table = build(n, load_factor)
+            queries = [random.choice(keys) if random.random() < 0.5 else random.randint(10 * n, 20 * n) for _ in range(num_queries)]
+
+            has_key_many = prepare_has_key_many(*table)
+
+            scalar_time = min(timeit.repeat(lambda: [has_key(*(table + (key,))) for key in queries], number=1, repeat=3))
+            prepare_time = min(timeit.repeat(lambda: prepare_has_key_many(*table), number=1, repeat=3))
+            batch_time = min(timeit.repeat(lambda: has_key_many(queries), number=1, repeat=3))
+            print("    keys={:<10} load={:<6.2f}{:>8.0f} ns/key scalar {:>8.0f} ns/key batched {:>8.1f}x (+{:.3f}s to prepare the table)".format(
+                n, len(keys) / len(table[-1]), scalar_time * 10 ** 9 / num_queries, batch_time * 10 ** 9 / num_queries,
+                scalar_time / batch_time, prepare_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare has_key() called in a loop with has_key_many()')
+    parser.add_argument('--chapter', choices=CHAPTERS.keys(), action='append')
+    parser.add_argument('--table-size', type=int, action='append')
+    parser.add_argument('--load-factor', type=float, action='append')
+    parser.add_argument('--num-queries', type=int, default=100000)
+    args = parser.parse_args()
+
+    for chapter in args.chapter or sorted(CHAPTERS.keys()):
+        run(chapter, args.table_size or [1000, 100000, 1000000], args.load_factor or [0.25, 0.5, 0.66], args.num_queries)
@@ -0,0 +1,39 @@
+import hash_chapter1_impl
+from hash_chapter2_vectorized import as_int64_array, np
+
+
+def prepare_has_key_many(keys):
+    # see hash_chapter2_vectorized.prepare_has_key_many()
+    table = as_int64_array([key if key is not None else 0 for key in keys])
+    if table is None:
+        return lambda query_keys: [hash_chapter1_impl.has_key(keys, key) for key in query_keys]
+
+    size = len(keys)
+    is_occupied = np.array([key is not None for key in keys], dtype=bool)
+
+    def has_key_many(query_keys):
+        query_ints = as_int64_array(query_keys)
+        if query_ints is None:
+            return [hash_chapter1_impl.has_key(keys, key) for key in query_keys]
+
+        found = np.zeros(len(query_ints), dtype=bool)
+        pending = np.arange(len(query_ints), dtype=np.int64)
+        positions = query_ints % size
+        for _ in range(size):
+            if not len(pending):
+                break
+            occupied = is_occupied[positions]
+            pending, positions = pending[occupied], positions[occupied]
+
+            is_equal = table[positions] == query_ints[pending]
+            found[pending[is_equal]] = True
+            pending, positions = pending[~is_equal], positions[~is_equal] + 1
+            positions[positions == size] = 0
+
+        return found
+
+    return has_key_many
+
+
+def has_key_many(keys, query_keys):
+    return prepare_has_key_many(keys)(query_keys)
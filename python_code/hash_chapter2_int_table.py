@@ -0,0 +1,98 @@
+from array import array
+
+from dict_reimpl_common import HASH_TYPECODE
+
+# The chapter 2 table for int keys only: the keys are unboxed in a typed array and a byte per slot tells
+# whether the slot is empty, used or removed, instead of two lists of pointers to boxed ints and EMPTY/DUMMY objects.
+# A key is its own hash code (hash(k) == k for most ints anyway), and the table sizes are powers of two,
+# so the index is key & mask. Keys have to fit into 64 bit signed ints.
+#
+# create_new() and resize() return (states, keys), the other functions take them like the chapter 2 functions
+# take (hash_codes, keys).
+
+STATE_EMPTY = 0
+STATE_USED = 1
+STATE_DUMMY = 2
+
+MIN_SIZE = 8
+
+
+def _table_size(n):
+    size = MIN_SIZE
+    while size < 2 * n:
+        size *= 2
+    return size
+
+
+def _new_table(size):
+    return bytearray(size), array(HASH_TYPECODE, [0]) * size
+
+
+def create_new(from_keys):
+    states, keys = _new_table(_table_size(len(from_keys)))
+    mask = len(keys) - 1
+
+    for key in from_keys:
+        idx = key & mask
+        while states[idx] != STATE_EMPTY:
+            if keys[idx] == key:
+                break
+            idx = (idx + 1) & mask
+
+        # the key first: a key that doesn't fit raises OverflowError before the slot is marked used
+        keys[idx] = key
+        states[idx] = STATE_USED
+
+    return states, keys
+
+
+def insert(states, keys, key):
+    mask = len(keys) - 1
+    idx = key & mask
+
+    # like chapter 2, removed slots are probed over and never reused
+    while states[idx] != STATE_EMPTY:
+        if states[idx] == STATE_USED and keys[idx] == key:
+            return
+        idx = (idx + 1) & mask
+
+    keys[idx] = key
+    states[idx] = STATE_USED
+
+
+def remove(states, keys, key):
+    mask = len(keys) - 1
+    idx = key & mask
+
+    while states[idx] != STATE_EMPTY:
+        if states[idx] == STATE_USED and keys[idx] == key:
+            states[idx] = STATE_DUMMY
+            return
+        idx = (idx + 1) & mask
+
+    raise KeyError()
+
+
+def has_key(states, keys, key):
+    mask = len(keys) - 1
+    idx = key & mask
+    while states[idx] != STATE_EMPTY:
+        if states[idx] == STATE_USED and keys[idx] == key:
+            return True
+        idx = (idx + 1) & mask
+    return False
+
+
+def resize(states, keys):
+    new_states, new_keys = _new_table(len(keys) * 2)
+    mask = len(new_keys) - 1
+    for state, key in zip(states, keys):
+        if state != STATE_USED:
+            continue
+        idx = key & mask
+        while new_states[idx] != STATE_EMPTY:
+            idx = (idx + 1) & mask
+        new_states[idx] = STATE_USED
+        new_keys[idx] = key
+
+    return new_states, new_keys
@@ -0,0 +1,95 @@
+import random
+import unittest
+import hash_chapter2_impl
+from hash_chapter2_int_table import STATE_DUMMY, STATE_EMPTY, STATE_USED, create_new, has_key, insert, remove, resize
+from common import DUMMY, EMPTY
+
+
+def as_chapter2_keys(states, keys):
+    return [key if state == STATE_USED else (DUMMY if state == STATE_DUMMY else EMPTY) for state, key in zip(states, keys)]
+
+
+class IntTableTest(unittest.TestCase):
+    def test_handcrafted(self):
+        states, keys = create_new([1, 9, 2, 9])
+        self.assertEqual(len(keys), 8)
+        self.assertEqual(list(states), [STATE_EMPTY, STATE_USED, STATE_USED, STATE_USED] + [STATE_EMPTY] * 4)
+        self.assertEqual(list(keys[1:4]), [1, 9, 2])
+
+        remove(states, keys, 9)
+        self.assertEqual(states[2], STATE_DUMMY)
+        self.assertFalse(has_key(states, keys, 9))
+        self.assertTrue(has_key(states, keys, 2))
+        with self.assertRaises(KeyError):
+            remove(states, keys, 9)
+
+        # the removed slot is not reused
+        insert(states, keys, 17)
+        self.assertEqual(keys[4], 17)
+
+        states, keys = resize(states, keys)
+        self.assertEqual(len(keys), 16)
+        self.assertEqual(as_chapter2_keys(states, keys)[:4], [EMPTY, 1, 2, 17])
+
+        states, keys = create_new([-1, -16])
+        self.assertTrue(has_key(states, keys, -1))
+        self.assertTrue(has_key(states, keys, -16))
+        self.assertEqual(keys[7], -1)
+
+        # a key that doesn't fit leaves the table as it was
+        table_before = (list(states), list(keys))
+        for key in [2 ** 64, -2 ** 63 - 1, 2 ** 70]:
+            with self.assertRaises(OverflowError):
+                insert(states, keys, key)
+            self.assertEqual((list(states), list(keys)), table_before)
+        self.assertFalse(has_key(states, keys, 0))
+
+    def test_same_layout_as_chapter2(self):
+        # hash(k) == k for these keys, and 2 * n is a power of two, so chapter 2 probes the same slots
+        for _ in range(50):
+            n = random.choice([4, 8, 16, 64])
+            from_keys = [random.randint(0, random.choice([n, 10 ** 12])) for _ in range(n)]
+            hash_codes, ref_keys = hash_chapter2_impl.create_new(from_keys)
+            states, keys = create_new(from_keys)
+            self.assertEqual(as_chapter2_keys(states, keys), ref_keys)
+
+            for _ in range(n // 2):
+                key = random.choice(from_keys) if random.random() < 0.5 else random.randint(0, 10 ** 12)
+                if random.random() < 0.5 and hash_chapter2_impl.has_key(hash_codes, ref_keys, key):
+                    hash_chapter2_impl.remove(hash_codes, ref_keys, key)
+                    remove(states, keys, key)
+                else:
+                    hash_chapter2_impl.insert(hash_codes, ref_keys, key)
+                    insert(states, keys, key)
+                self.assertEqual(as_chapter2_keys(states, keys), ref_keys)
+
+            hash_codes, ref_keys = hash_chapter2_impl.resize(hash_codes, ref_keys)
+            states, keys = resize(states, keys)
+            self.assertEqual(as_chapter2_keys(states, keys), ref_keys)
+
+    def test_random(self):
+        ref = set()
+        states, keys = create_new([])
+        for _ in range(5000):
+            key = random.randint(-2 ** 63, 2 ** 63 - 1) if random.random() < 0.2 else random.randint(-100, 100)
+            if key in ref and random.random() < 0.5:
+                ref.remove(key)
+                remove(states, keys, key)
+            else:
+                ref.add(key)
+                insert(states, keys, key)
+            if sum(1 for state in states if state != STATE_EMPTY) * 3 >= len(keys) * 2:
+                states, keys = resize(states, keys)
+            self.assertEqual(has_key(states, keys, key), key in ref)
+
+        for key in list(ref) + list(range(-200, 200)):
+            self.assertEqual(has_key(states, keys, key), key in ref)
+        self.assertEqual(sorted(key for state, key in zip(states, keys) if state == STATE_USED), sorted(ref))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import hashlib
+import mmap
+import struct
+
+# The same open addressing as in chapter 2 (2 * n slots, linear probing), but the table lives in a file
+# and lookups read it through mmap, so opening a table of any size is instant and processes share the pages.
+#
+# File layout (little-endian):
+#     header: magic, version, number of slots, number of keys
+#     slots: (hash, offset) pairs, offset 0 means an empty slot
+#     entries: (key length, value length, key, value), the offsets of the slots point here
+# Keys and values are stored with a type tag, so that 1 and "1" are different keys.
+#
+# hash() of str and bytes is randomized for every process, so the table uses a hash that only depends on the key.
+MAGIC = b'PYHT'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQ')
+SLOT = struct.Struct('<QQ')
+ENTRY_HEADER = struct.Struct('<II')
+
+
+def encode(obj):
+    if obj is None:
+        return b'n'
+    if isinstance(obj, int):
+        return b'i' + str(int(obj)).encode('ascii')
+    if isinstance(obj, str):
+        return b's' + obj.encode('utf-8')
+    if isinstance(obj, bytes):
+        return b'b' + obj
+    raise TypeError("Unsupported type: {}".format(type(obj).__name__))
+
+
+def decode(data):
+    tag, payload = data[:1], data[1:]
+    if tag == b'n':
+        return None
+    if tag == b'i':
+        return int(payload.decode('ascii'))
+    if tag == b's':
+        return payload.decode('utf-8')
+    return payload
+
+
+def stable_hash(encoded_key):
+    # md5 is not used for security here, it is just a good hash that is available everywhere
+    return struct.unpack('<Q', hashlib.md5(encoded_key).digest()[:8])[0]
+
+
+def read_key(f, offset):
+    # while the table is being written, the entries are not mapped yet
+    position = f.tell()
+    f.seek(offset)
+    key_len, _ = ENTRY_HEADER.unpack(f.read(ENTRY_HEADER.size))
+    key = f.read(key_len)
+    f.seek(position)
+    return key
+
+
+class MmapHashTable(object):
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_slots, self.num_keys = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a hash table file".format(path))
+
+    @staticmethod
+    def write(path, from_pairs):
+        if not hasattr(from_pairs, '__len__'):
+            from_pairs = list(from_pairs)
+
+        num_slots = max(1, 2 * len(from_pairs))
+        entries_offset = HEADER.size + num_slots * SLOT.size
+        num_keys = 0
+        with open(path, 'w+b') as f:
+            f.truncate(entries_offset)
+            # only the header and the slots are mapped, the entries are appended to the file after them
+            mm = mmap.mmap(f.fileno(), entries_offset)
+            f.seek(entries_offset)
+            offset = entries_offset
+            try:
+                for key, value in from_pairs:
+                    encoded_key, encoded_value = encode(key), encode(value)
+                    hash_code = stable_hash(encoded_key)
+                    idx = hash_code % num_slots
+                    while True:
+                        slot_hash, slot_offset = SLOT.unpack_from(mm, HEADER.size + idx * SLOT.size)
+                        if slot_offset == 0:
+                            num_keys += 1
+                            break
+                        if slot_hash == hash_code and read_key(f, slot_offset) == encoded_key:
+                            # the key is already in the table, the entry with the new value replaces it
+                            break
+                        idx = (idx + 1) % num_slots
+
+                    SLOT.pack_into(mm, HEADER.size + idx * SLOT.size, hash_code, offset)
+                    f.write(ENTRY_HEADER.pack(len(encoded_key), len(encoded_value)))
+                    f.write(encoded_key)
+                    f.write(encoded_value)
+                    offset += ENTRY_HEADER.size + len(encoded_key) + len(encoded_value)
+
+                HEADER.pack_into(mm, 0, MAGIC, VERSION, num_slots, num_keys)
+                mm.flush()
+            finally:
+                mm.close()
+
+    @classmethod
+    def create(cls, path, from_pairs):
+        cls.write(path, from_pairs)
+        return cls(path)
+
+    def _lookup(self, key):
+        try:
+            encoded_key = encode(key)
+        except TypeError:
+            # keys of other types are never stored, but an integral float is equal to the int key, like in a dict
+            if not isinstance(key, float) or not key.is_integer():
+                return None
+            encoded_key = encode(int(key))
+        hash_code = stable_hash(encoded_key)
+        mm = self._mm
+        idx = hash_code % self.num_slots
+        while True:
+            slot_hash, offset = SLOT.unpack_from(mm, HEADER.size + idx * SLOT.size)
+            if offset == 0:
+                return None
+            if slot_hash == hash_code:
+                key_len, value_len = ENTRY_HEADER.unpack_from(mm, offset)
+                start = offset + ENTRY_HEADER.size
+                if key_len == len(encoded_key) and mm[start:start + key_len] == encoded_key:
+                    return start + key_len, value_len
+            idx = (idx + 1) % self.num_slots
+
+    def has_key(self, key):
+        return self._lookup(key) is not None
+
+    def __contains__(self, key):
+        return self.has_key(key)
+
+    def get(self, key, default=None):
+        found = self._lookup(key)
+        if found is None:
+            return default
+        start, value_len = found
+        return decode(self._mm[start:start + value_len])
+
+    def __getitem__(self, key):
+        found = self._lookup(key)
+        if found is None:
+            raise KeyError(key)
+        start, value_len = found
+        return decode(self._mm[start:start + value_len])
+
+    def __len__(self):
+        return self.num_keys
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
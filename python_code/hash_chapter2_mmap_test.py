@@ -0,0 +1,80 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from hash_chapter2_mmap import HEADER, SLOT, MmapHashTable, encode, stable_hash
+from common import generate_random_string
+
+
+class MmapHashTableTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "table.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_handcrafted(self):
+        with MmapHashTable.create(self.path, [(1, "one"), ("1", b"1"), (b"1", None), (1, "uno")]) as table:
+            self.assertEqual(len(table), 3)
+            self.assertEqual(table.num_slots, 8)
+            self.assertEqual(table[1], "uno")
+            self.assertEqual(table["1"], b"1")
+            self.assertIsNone(table[b"1"])
+            self.assertIn(b"1", table)
+            self.assertTrue(table.has_key(True))
+            self.assertNotIn(2, table)
+            self.assertNotIn("2", table)
+            self.assertEqual(table.get(2, "default"), "default")
+            # keys that can't be stored are just missing, unless they are equal to a stored key
+            self.assertNotIn(1.5, table)
+            self.assertFalse(table.has_key(float("nan")))
+            self.assertNotIn(("1",), table)
+            self.assertEqual(table[1.0], "uno")
+            with self.assertRaises(KeyError):
+                table["one"]
+
+            # chapter 2 layout: every key is in the first free slot after hash % num_slots
+            slots = [SLOT.unpack_from(table._mm, HEADER.size + i * SLOT.size) for i in range(table.num_slots)]
+            for key in [1, "1", b"1"]:
+                hash_code = stable_hash(encode(key))
+                idx = hash_code % table.num_slots
+                while slots[idx][0] != hash_code:
+                    self.assertNotEqual(slots[idx][1], 0)
+                    idx = (idx + 1) % table.num_slots
+
+    def test_empty(self):
+        with MmapHashTable.create(self.path, []) as table:
+            self.assertEqual(len(table), 0)
+            self.assertNotIn(0, table)
+
+    def test_not_a_table(self):
+        with open(self.path, 'wb') as f:
+            f.write(b"\0" * HEADER.size)
+        with self.assertRaises(ValueError):
+            MmapHashTable(self.path)
+
+    def test_random(self):
+        def random_obj():
+            return random.choice([random.randint(-2**70, 2**70), generate_random_string(random.randint(0, 10)),
+                                  generate_random_string().encode('ascii'), random.randint(0, 100)])
+
+        pairs = [(random_obj(), random_obj()) for _ in range(5000)]
+        MmapHashTable.write(self.path, iter(pairs))
+        ref = dict(pairs)
+        with MmapHashTable(self.path) as table:
+            self.assertEqual(len(table), len(ref))
+            for key, value in ref.items():
+                self.assertEqual(table[key], value)
+            for _ in range(5000):
+                key = random_obj()
+                self.assertEqual(key in table, key in ref)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
 import random
 import argparse
 
-from common import DUMMY, EMPTY, AllKeyValueFactory, IntKeyValueFactory
+from common import DUMMY, EMPTY
 
+import js_reimpl_common
 import hash_chapter2_reimpl_js
 import hash_chapter2_impl
 import build_autogenerated_chapter2
+from workloads import KV_CHOICES, make_kv_factory
 
 TEST_IMPLEMENTATIONS = {
     'js_reimpl': hash_chapter2_reimpl_js,
@@ -29,7 +31,17 @@ def verify_same(ref_hash_codes, ref_keys, hash_codes, keys):
     assert ref_hash_codes == hash_codes and ref_keys == keys
 
 
-def run(ref_impl, test_impl, n_inserts, key_value_factory, initial_state, extra_checks, verbose):
+def find_slot(hash_codes, keys, key):
+    hash_code = hash(key)
+    idx = hash_code % len(keys)
+    while hash_codes[idx] is not EMPTY:
+        if hash_codes[idx] == hash_code and keys[idx] == key:
+            return idx
+        idx = (idx + 1) % len(keys)
+    return None
+
+
+def run(ref_impl, test_impl, n_inserts, key_value_factory, initial_state, extra_checks, verbose, incremental=False, full_verify_every=1000):
     SINGLE_REMOVE_CHANCE = 0.3
 
     ref_hash_codes, ref_keys = ref_impl.create_new(initial_state)
@@ -40,52 +52,88 @@ def run(ref_impl, test_impl, n_inserts, key_value_factory, initial_state, extra_
 
     vs()
 
+    # kept up to date instead of rescanning ref_keys on every iteration: insert() never reuses DUMMY slots,
+    # so only the inserts of new keys and resizes change the fill
+    existing_keys = [k for k in ref_keys if k is not DUMMY and k is not EMPTY]
+    key_positions = dict((k, i) for i, k in enumerate(existing_keys))
+    fill = sum(1 for k in ref_keys if k is not EMPTY)
+
+    def forget_key(k):
+        idx = key_positions.pop(k)
+        last = existing_keys.pop()
+        if idx < len(existing_keys):
+            existing_keys[idx] = last
+            key_positions[last] = idx
+
+    # In incremental mode only the slots of the keys touched by an iteration are compared, the whole tables are
+    # compared after resizes and on every full_verify_every iteration
+    dirty_slots = set()
+
+    def verify(touched_keys, is_full):
+        if not incremental or is_full:
+            vs()
+            checked_keys = existing_keys
+        else:
+            assert len(ref_keys) == len(test_keys)
+            for idx in dirty_slots:
+                if (ref_hash_codes[idx], ref_keys[idx]) != (test_hash_codes[idx], test_keys[idx]):
+                    print("Slot {}: ORIG {} {} NEW {} {}".format(idx, ref_hash_codes[idx], ref_keys[idx], test_hash_codes[idx], test_keys[idx]))
+                    vs()
+            checked_keys = [k for k in touched_keys if k in key_positions]
+        dirty_slots.clear()
+
+        if extra_checks:
+            for k in checked_keys:
+                assert test_impl.has_key(test_hash_codes, test_keys, k)
+                assert ref_impl.has_key(ref_hash_codes, ref_keys, k)
+
     if verbose:
         print("Starting test")
 
     for i in range(n_inserts):
         key_to_insert = key_value_factory.generate_key()
+        touched_keys = [key_to_insert]
 
-        existing_keys = set([k for k in ref_keys if k is not DUMMY and k is not EMPTY])
-        fill = sum(1 for k in ref_keys if k is not EMPTY)
         if existing_keys and random.random() < SINGLE_REMOVE_CHANCE:
-            key_to_remove = random.choice(list(existing_keys))
+            key_to_remove = random.choice(existing_keys)
+            touched_keys.append(key_to_remove)
             assert ref_impl.has_key(ref_hash_codes, ref_keys, key_to_remove)
             assert test_impl.has_key(test_hash_codes, test_keys, key_to_remove)
 
+            dirty_slots.add(find_slot(ref_hash_codes, ref_keys, key_to_remove))
             ref_impl.remove(ref_hash_codes, ref_keys, key_to_remove)
             test_impl.remove(test_hash_codes, test_keys, key_to_remove)
-            existing_keys.remove(key_to_remove)
+            forget_key(key_to_remove)
 
             assert not ref_impl.has_key(ref_hash_codes, ref_keys, key_to_remove)
             assert not test_impl.has_key(test_hash_codes, test_keys, key_to_remove)
 
         is_key_present = ref_impl.has_key(ref_hash_codes, ref_keys, key_to_insert)
-        assert (key_to_insert in existing_keys) == is_key_present
+        assert (key_to_insert in key_positions) == is_key_present
 
         if not is_key_present:
             if verbose:
                 print("Inserting {}".format(key_to_insert))
             assert not test_impl.has_key(test_hash_codes, test_keys, key_to_insert)
+            key_positions[key_to_insert] = len(existing_keys)
+            existing_keys.append(key_to_insert)
+            fill += 1
         else:
             if verbose:
                 print("Re-Inserting {}".format(key_to_insert))
 
         ref_impl.insert(ref_hash_codes, ref_keys, key_to_insert)
         test_impl.insert(test_hash_codes, test_keys, key_to_insert)
-        vs()
+        dirty_slots.add(find_slot(ref_hash_codes, ref_keys, key_to_insert))
+        verify(touched_keys, i % full_verify_every == 0)
         assert test_impl.has_key(test_hash_codes, test_keys, key_to_insert)
         assert ref_impl.has_key(ref_hash_codes, ref_keys, key_to_insert)
 
         if fill / len(ref_keys) > 0.66:
             ref_hash_codes, ref_keys = ref_impl.resize(ref_hash_codes, ref_keys)
             test_hash_codes, test_keys = test_impl.resize(test_hash_codes, test_keys)
-        vs()
-
-        if extra_checks:
-            for k in existing_keys:
-                assert test_impl.has_key(test_hash_codes, test_keys, k)
-                assert ref_impl.has_key(ref_hash_codes, ref_keys, k)
+            fill = len(existing_keys)
+            verify(touched_keys, True)
 
 
 if __name__ == "__main__":
@@ -93,16 +141,18 @@ if __name__ == "__main__":
     parser.add_argument('--test-implementation', choices=TEST_IMPLEMENTATIONS.keys(), required=True)
     parser.add_argument('--num-inserts',  type=int, default=500)
     parser.add_argument('--forever', action='store_true')
-    parser.add_argument('--kv', choices=["numbers", "all"], required=True)
+    parser.add_argument('--kv', choices=KV_CHOICES, required=True)
     parser.add_argument('--initial-size', type=int, default=-1)
     parser.add_argument('--extra-getitem-checks', action='store_true', default=False)
     parser.add_argument('--verbose', action='store_true', default=False)
+    parser.add_argument('--incremental-verify', action='store_true', help='compare only the slots touched by every iteration, and the whole tables after resizes')
+    parser.add_argument('--full-verify-every', type=int, default=1000, help='with --incremental-verify, compare the whole tables on every n-th iteration')
+    parser.add_argument('--protocol', choices=["json", "binary"], default="json", help='wire format of the js implementation')
     args = parser.parse_args()
 
-    if args.kv == "numbers":
-        kv_factory = IntKeyValueFactory(args.num_inserts)
-    elif args.kv == "all":
-        kv_factory = AllKeyValueFactory(args.num_inserts)
+    js_reimpl_common.PROTOCOL = args.protocol
+
+    kv_factory = make_kv_factory(args.kv, args.num_inserts)
 
     def test_iteration():
         initial_size = args.initial_size if args.initial_size >= 0 else random.randint(0, 100)
@@ -113,7 +163,9 @@ if __name__ == "__main__":
             key_value_factory=kv_factory,
             initial_state=initial_state,
             extra_checks=args.extra_getitem_checks,
-            verbose=args.verbose)
+            verbose=args.verbose,
+            incremental=args.incremental_verify,
+            full_verify_every=args.full_verify_every)
 
     if args.forever:
         while True:
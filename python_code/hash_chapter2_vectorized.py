@@ -0,0 +1,240 @@
+from array import array
+
+from common import DUMMY, EMPTY
+from dict_reimpl_common import HASH_TYPECODE
+import hash_chapter2_impl
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# hash() of an int is its value modulo this prime, keeping the sign (and -1 is replaced with -2)
+_PY_HASH_MODULUS = 2**61 - 1
+
+
+def int_hashes(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    negative = keys < 0
+    # -x overflows back to itself for the smallest int64, but reinterpreted as unsigned it is the correct magnitude
+    magnitudes = np.where(negative, -keys, keys).view(np.uint64) % np.uint64(_PY_HASH_MODULUS)
+    hashes = magnitudes.astype(np.int64)
+    hashes[negative] = -hashes[negative]
+    hashes[hashes == -1] = -2
+    return hashes
+
+
+def as_int64_array(from_keys):
+    if np is None:
+        return None
+    if isinstance(from_keys, list):
+        # array() converts a list twice as fast as numpy, and raises for anything but ints that fit
+        try:
+            return np.frombuffer(array(HASH_TYPECODE, from_keys), dtype=np.int64)
+        except (TypeError, OverflowError):
+            return None
+    try:
+        keys = np.asarray(from_keys)
+    except (OverflowError, ValueError):
+        return None
+    if keys.ndim != 1 or keys.dtype.kind not in 'iu':
+        return None
+    if keys.dtype.kind == 'u' and len(keys) and keys.max() > np.iinfo(np.int64).max:
+        return None
+    return keys.astype(np.int64, copy=False)
+
+
+def _place(hash_codes, size, keys=None):
+    # Insert keys with linear probing in batched rounds. Every pending key looks at its current slot,
+    # and the slot goes to the key that came first in the input, even if the slot is already taken by a later key.
+    # The evicted keys continue probing from the next slot. When nothing is pending, every slot between
+    # the home slot of a key and its final slot is taken by an earlier key, which means that
+    # the layout is exactly the same as the layout created by inserting the keys one by one.
+    # If keys are passed, a later copy of a key is dropped when it meets an earlier copy.
+    n = len(hash_codes)
+    owners = np.full(size, n, dtype=np.int64)
+    # (slot, key index) pairs packed into a single int64, so that a single sort groups the keys by slot
+    pending = (hash_codes % size) * n + np.arange(n, dtype=np.int64)
+
+    while len(pending):
+        pending.sort()
+        positions, candidates = np.divmod(pending, n)
+
+        is_first = np.ones(len(pending), dtype=bool)
+        is_first[1:] = positions[1:] != positions[:-1]
+        moving = ~is_first
+        # gathering keys at random indices is the slow part, so only the keys that collide are compared
+        later = np.flatnonzero(moving)
+        if keys is not None and len(later):
+            first_candidates = np.maximum.accumulate(np.where(is_first, np.arange(len(pending)), 0))[later]
+            moving[later] = keys[candidates[later]] != keys[candidates[first_candidates]]
+        candidates, candidate_positions = candidates[is_first], positions[is_first]
+
+        current_owners = owners[candidate_positions]
+        is_taken = current_owners != n
+        wins = candidates < current_owners
+        is_evicted = wins & is_taken
+        stays = wins
+        if keys is not None:
+            taken = np.flatnonzero(is_taken)
+            is_duplicate = np.zeros(len(candidates), dtype=bool)
+            is_duplicate[taken] = keys[candidates[taken]] == keys[current_owners[taken]]
+            is_evicted &= ~is_duplicate
+            stays = wins | is_duplicate
+        owners[candidate_positions[wins]] = candidates[wins]
+
+        moving[np.flatnonzero(is_first)[~stays]] = True
+        moved = np.concatenate([pending[moving], candidate_positions[is_evicted] * n + current_owners[is_evicted]])
+        next_positions = moved // n + 1
+        next_positions[next_positions == size] = 0
+        pending = next_positions * n + moved % n
+
+    return owners
+
+
+def _layout(owners, hash_codes, keys, size):
+    # The lists are built from object arrays filled with EMPTY. int keys are gathered in slot order as int64
+    # and boxed in that order: boxing them first and gathering the objects touches them at random, which is slower.
+    placed = np.flatnonzero(owners < len(keys))
+    placed_idx = owners[placed]
+
+    def to_list(values):
+        out = np.full(size, EMPTY, dtype=object)
+        out[placed] = values[placed_idx]
+        return out.tolist()
+
+    out_keys = to_list(keys)
+
+    if keys.dtype != object and (hash_codes == keys).all():
+        # hash(x) == x for most ints, so the same objects can be reused
+        return list(out_keys), out_keys
+
+    return to_list(hash_codes), out_keys
+
+
+def _object_array(values):
+    try:
+        # numpy 1.23+, np.array() would try to unpack tuple keys
+        return np.fromiter(values, dtype=object, count=len(values))
+    except ValueError:
+        objects = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            objects[i] = value
+        return objects
+
+
+def _first_occurrences(hash_codes, keys):
+    # Only the first occurrence of every key matters, and equal keys have equal hashes: with the keys sorted by hash,
+    # every key is compared with the first key with the same hash. A key that differs from it shares its hash
+    # with a different key, which is rare, and the keys with such hashes are compared in python.
+    n = len(keys)
+    order = np.argsort(hash_codes, kind='stable')
+    sorted_hashes = hash_codes[order]
+    is_first = np.ones(n, dtype=bool)
+    is_first[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+    later = np.flatnonzero(~is_first)
+    first_idx = order[np.maximum.accumulate(np.where(is_first, np.arange(n), 0))[later]]
+    later_idx = order[later]
+
+    is_unique = np.ones(n, dtype=bool)
+    is_same = keys[later_idx] == keys[first_idx]
+    is_unique[later_idx[is_same]] = False
+    if not is_same.all():
+        collided = np.flatnonzero(np.isin(hash_codes, hash_codes[later_idx[~is_same]]))
+        first_occurrence = {}
+        for i in collided.tolist():
+            is_unique[i] = first_occurrence.setdefault(keys[i], i) == i
+    return np.flatnonzero(is_unique)
+
+
+def create_new_from_hashes(hash_codes, from_keys):
+    if np is None or not len(from_keys):
+        return hash_chapter2_impl.create_new(from_keys)
+
+    size = 2 * len(from_keys)
+    hash_codes = np.asarray(hash_codes, dtype=np.int64)
+    keys = _object_array(from_keys)
+    unique_idx = _first_occurrences(hash_codes, keys)
+    hash_codes, keys = hash_codes[unique_idx], keys[unique_idx]
+
+    return _layout(_place(hash_codes, size), hash_codes, keys, size)
+
+
+def create_new(from_keys):
+    int_keys = as_int64_array(from_keys)
+    if int_keys is None or not len(int_keys):
+        return hash_chapter2_impl.create_new(from_keys)
+
+    size = 2 * len(int_keys)
+    hash_codes = int_hashes(int_keys)
+    owners = _place(hash_codes, size, int_keys)
+
+    placed_keys = np.sort(int_keys[owners[owners < len(int_keys)]])
+    if (placed_keys[1:] == placed_keys[:-1]).any():
+        # Rare: a copy of a key got past the slot where the first copy ended up, dedupe upfront and start over
+        _, unique_idx = np.unique(int_keys, return_index=True)
+        unique_idx.sort()
+        int_keys, hash_codes = int_keys[unique_idx], hash_codes[unique_idx]
+        owners = _place(hash_codes, size)
+
+    return _layout(owners, hash_codes, int_keys, size)
+
+
+_SLOT_EMPTY, _SLOT_DUMMY, _SLOT_INT, _SLOT_OTHER = range(4)
+
+
+def _query_hashes(query_keys):
+    query_ints = as_int64_array(query_keys)
+    if query_ints is not None:
+        return query_ints, int_hashes(query_ints)
+    return None, np.fromiter((hash(key) for key in query_keys), dtype=np.int64, count=len(query_keys))
+
+
+def prepare_has_key_many(hash_codes, keys):
+    # Converting the table to arrays costs about as much as a scalar lookup per slot, so when the same table is
+    # queried many times, convert it once. The returned function is only valid until the table is modified.
+    if np is None:
+        return lambda query_keys: [hash_chapter2_impl.has_key(hash_codes, keys, key) for key in query_keys]
+
+    size = len(keys)
+    # an int stored with hash(key) == key can be compared by its hash
+    kinds = np.array([_SLOT_EMPTY if h is EMPTY else _SLOT_DUMMY if k is DUMMY else
+                      _SLOT_INT if type(k) is int and h == k else _SLOT_OTHER for h, k in zip(hash_codes, keys)],
+                     dtype=np.int8)
+    table_hashes = np.array([0 if h is EMPTY else h for h in hash_codes], dtype=np.int64)
+
+    def has_key_many(query_keys):
+        query_ints, query_hashes = _query_hashes(query_keys)
+
+        found = np.zeros(len(query_keys), dtype=bool)
+        pending = np.arange(len(query_keys), dtype=np.int64)
+        positions = query_hashes % size if size else pending
+        # like the scalar version, every probe stops at the first EMPTY slot, the limit only matters for full tables
+        for _ in range(size):
+            if not len(pending):
+                break
+            slot_kinds = kinds[positions]
+            is_occupied = slot_kinds != _SLOT_EMPTY
+            pending, positions, slot_kinds = pending[is_occupied], positions[is_occupied], slot_kinds[is_occupied]
+
+            same_hash = (table_hashes[positions] == query_hashes[pending]) & (slot_kinds != _SLOT_DUMMY)
+            if query_ints is not None:
+                is_equal = same_hash & (slot_kinds == _SLOT_INT) & (table_hashes[positions] == query_ints[pending])
+                to_compare = np.flatnonzero(same_hash & (slot_kinds == _SLOT_OTHER))
+            else:
+                is_equal = np.zeros(len(pending), dtype=bool)
+                to_compare = np.flatnonzero(same_hash)
+            for i in to_compare.tolist():
+                is_equal[i] = keys[int(positions[i])] == query_keys[int(pending[i])]
+
+            found[pending[is_equal]] = True
+            pending, positions = pending[~is_equal], positions[~is_equal] + 1
+            positions[positions == size] = 0
+
+        return found
+
+    return has_key_many
+
+
+def has_key_many(hash_codes, keys, query_keys):
+    return prepare_has_key_many(hash_codes, keys)(query_keys)
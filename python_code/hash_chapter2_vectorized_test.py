@@ -0,0 +1,91 @@
+import random
+import unittest
+import hash_chapter1_impl
+import hash_chapter1_vectorized
+import hash_chapter2_impl
+import hash_chapter2_vectorized
+from hash_chapter2_vectorized import create_new, create_new_from_hashes, has_key_many, np
+from common import EMPTY, generate_random_string
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class VectorizedCreateNewTest(unittest.TestCase):
+    def assert_same_as_scalar(self, keys):
+        self.assertEqual(create_new(keys), hash_chapter2_impl.create_new(list(keys)))
+
+    def test_handcrafted(self):
+        hashes, keys = create_new([42, 43, 12])
+        self.assertEqual(hashes, [42, 43, 12, EMPTY, EMPTY, EMPTY])
+        self.assertEqual(keys, [42, 43, 12, EMPTY, EMPTY, EMPTY])
+
+        hashes, keys = create_new([42, 43, 12, 42])
+        self.assertEqual(keys, [EMPTY, EMPTY, 42, 43, 12, EMPTY, EMPTY, EMPTY])
+
+        self.assert_same_as_scalar([42, 43, 12, 42])
+        # the lists hold python ints, not numpy scalars
+        self.assertEqual(set(type(k) for k in hashes + keys if k is not EMPTY), set([int]))
+        self.assert_same_as_scalar([-1, -2, 2**61 - 1, 2**61, -2**63, 2**63 - 1])
+
+    def test_int_hashes(self):
+        keys = [0, 1, -1, -2, 2**61 - 2, 2**61 - 1, 2**61, -2**61, -2**63, 2**63 - 1, 12345678901234]
+        self.assertEqual(hash_chapter2_vectorized.int_hashes(keys).tolist(), [hash(k) for k in keys])
+
+    def test_random(self):
+        for _ in range(100):
+            n = random.randint(1, 500)
+            max_key = random.choice([10, n, 10 ** 12])
+            keys = [random.randint(-max_key, max_key) for _ in range(n)]
+            self.assert_same_as_scalar(keys)
+            self.assertEqual(create_new(np.array(keys)), hash_chapter2_impl.create_new(keys))
+
+    def test_fallback(self):
+        self.assert_same_as_scalar([])
+        self.assert_same_as_scalar([1, 2**64])
+        self.assert_same_as_scalar([1, 2.5, 3.0])
+        self.assert_same_as_scalar([generate_random_string() for _ in range(50)])
+
+    def test_from_hashes(self):
+        for _ in range(50):
+            keys = [random.choice([generate_random_string(2), random.randint(0, 100), None]) for _ in range(random.randint(1, 200))]
+            self.assertEqual(create_new_from_hashes([hash(k) for k in keys], keys), hash_chapter2_impl.create_new(keys))
+
+        myhashes, mykeys = create_new_from_hashes([hash(k) for k in ["abc", "def"]], ["abc", "def"])
+        hash_chapter2_impl.insert(myhashes, mykeys, "ghi")
+        hash_chapter2_impl.remove(myhashes, mykeys, "abc")
+        self.assertTrue(hash_chapter2_impl.has_key(myhashes, mykeys, "def"))
+        self.assertTrue(hash_chapter2_impl.has_key(myhashes, mykeys, "ghi"))
+        self.assertFalse(hash_chapter2_impl.has_key(myhashes, mykeys, "abc"))
+
+
+class HasKeyManyTest(unittest.TestCase):
+    def test_chapter1(self):
+        for _ in range(50):
+            numbers = list(set(random.randint(-500, 500) for _ in range(random.randint(1, 200))))
+            keys = hash_chapter1_impl.create_new(numbers)
+            query_keys = [random.randint(-600, 600) for _ in range(300)]
+            self.assertEqual(list(hash_chapter1_vectorized.has_key_many(keys, query_keys)),
+                             [hash_chapter1_impl.has_key(keys, key) for key in query_keys])
+
+    def test_chapter2(self):
+        for _ in range(50):
+            initial_keys = [random.choice([random.randint(-100, 100), generate_random_string(1), 2**61, -1, 1.0, None])
+                            for _ in range(random.randint(1, 200))]
+            hashes, keys = hash_chapter2_impl.create_new(initial_keys)
+            for key in initial_keys[:len(initial_keys) // 3]:
+                if hash_chapter2_impl.has_key(hashes, keys, key):
+                    hash_chapter2_impl.remove(hashes, keys, key)
+
+            int_query_keys = [random.randint(-110, 110) for _ in range(300)] + [0, 1, -1, -2, 2**61 - 1, 2**61]
+            all_query_keys = [random.choice([random.randint(-110, 110), generate_random_string(1), None, 2**70, 1.0])
+                              for _ in range(300)]
+            for query_keys in [int_query_keys, all_query_keys]:
+                self.assertEqual(list(has_key_many(hashes, keys, query_keys)),
+                                 [hash_chapter2_impl.has_key(hashes, keys, key) for key in query_keys])
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from common import DUMMY, EMPTY
-from dict_reimpl_common import BaseDictImpl, Slot
+from dict_reimpl_common import BaseDictImpl, SlotsArray
 
 
 class AlmostPythonDictBase(BaseDictImpl):
@@ -7,130 +7,194 @@ class AlmostPythonDictBase(BaseDictImpl):
 
     def __init__(self, pairs=None):
         BaseDictImpl.__init__(self)
-        self._keys_set = set()
+        # not presized: the layout has to match the js version, which starts at 8 slots and inserts the pairs one by one
         if pairs:
             for k, v in pairs:
                 self[k] = v
 
-    def lookdict(self, key):
+    def probe_sequence(self, hash_code, size):
+        idx = hash_code % size
+        while True:
+            yield idx
+            idx = (idx + 1) % size
+
+    def lookdict(self, key, slots=None):
         hash_code = hash(key)
+        slots = self.slots if slots is None else slots
+        hashes, keys = slots.hashes, slots.keys
+
+        idx = hash_code % len(keys)
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and keys[idx] == key:
+                break
 
-        idx = hash_code % len(self.slots)
-        while self.slots[idx].key is not EMPTY:
-            if self.slots[idx].hash_code == hash_code and self.slots[idx].key == key:
-                return idx
+            idx = (idx + 1) % len(keys)
 
-            idx = (idx + 1) % len(self.slots)
+        if self.stats is not None:
+            self.stats.record_probes("lookdict", *self.count_probes(hash_code, idx, keys))
 
-        raise KeyError()
+        if keys[idx] is EMPTY:
+            raise KeyError()
+        return idx
 
     def __getitem__(self, key):
+        if self.old_slots is not None:
+            idx = self.lookdict_old_slots(key)
+            if idx is not None:
+                return self.old_slots.values[idx]
+
         idx = self.lookdict(key)
 
-        return self.slots[idx].value
+        return self.slots.values[idx]
 
     def __delitem__(self, key):
+        if self.old_slots is not None and self.remove_from_old_slots(key):
+            return
+
         idx = self.lookdict(key)
 
         self.used -= 1
-        self.slots[idx].key = DUMMY
-        self.slots[idx].value = EMPTY
-        self._keys_set.remove(key)
+        self.slots.keys[idx] = DUMMY
+        self.slots.values[idx] = EMPTY
+        if self.COMPACT_DUMMY_RATIO is not None:
+            self.maybe_compact()
 
     def resize(self):
-        old_slots = self.slots
-        new_size = self.find_nearest_size(2 * self.used)
-        self.slots = [Slot() for _ in range(new_size)]
-
-        for slot in old_slots:
-            if slot.key is not EMPTY and slot.key is not DUMMY:
-                idx = slot.hash_code % len(self.slots)
-                while self.slots[idx].key is not EMPTY:
-                    idx = (idx + 1) % len(self.slots)
+        self.rebuild(self.find_nearest_size(2 * self.used))
 
-                self.slots[idx] = Slot(slot.hash_code, slot.key, slot.value)
+    def rebuild(self, new_size):
+        old_slots = self.slots
+        if self.INCREMENTAL_RESIZE_STEP is not None:
+            self.start_incremental_resize(new_size)
+            return
+
+        self.slots = SlotsArray(new_size)
+        hashes, keys, values = self.slots.hashes, self.slots.keys, self.slots.values
+        stats = self.stats
+
+        for hash_code, key, value in zip(old_slots.hashes, old_slots.keys, old_slots.values):
+            if key is not EMPTY and key is not DUMMY:
+                idx = hash_code % new_size
+                while keys[idx] is not EMPTY:
+                    idx = (idx + 1) % new_size
+
+                if stats is not None:
+                    stats.record_probes("resize", *self.count_probes(hash_code, idx, keys))
+                hashes[idx] = hash_code
+                keys[idx] = key
+                values[idx] = value
 
         self.fill = self.used
+        if stats is not None:
+            stats.record_resize(self.used)
 
-    def keys(self):
-        return self._keys_set
+    def insert_clean(self, hash_code, key, value):
+        keys = self.slots.keys
+        idx = hash_code % len(keys)
+        while keys[idx] is not EMPTY:
+            idx = (idx + 1) % len(keys)
 
-    def __len__(self):
-        return len(self.keys())
+        if self.stats is not None:
+            self.stats.record_probes("resize", *self.count_probes(hash_code, idx, keys))
+        self.fill += 1
+        self.slots.hashes[idx] = hash_code
+        keys[idx] = key
+        self.slots.values[idx] = value
 
 
 class AlmostPythonDictImplementationRecycling(AlmostPythonDictBase):
     def __setitem__(self, key, value):
+        if self.old_slots is not None:
+            self.remove_from_old_slots(key)
+
         hash_code = hash(key)
-        idx = hash_code % len(self.slots)
+        hashes, keys = self.slots.hashes, self.slots.keys
+        idx = hash_code % len(keys)
         target_idx = None
-        while self.slots[idx].key is not EMPTY:
-            if self.slots[idx].hash_code == hash_code and self.slots[idx].key == key:
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and keys[idx] == key:
                 target_idx = idx
                 break
-            if target_idx is None and self.slots[idx].key is DUMMY:
+            if target_idx is None and keys[idx] is DUMMY:
                 target_idx = idx
 
-            idx = (idx + 1) % len(self.slots)
+            idx = (idx + 1) % len(keys)
+
+        if self.stats is not None:
+            self.stats.record_probes("setitem", *self.count_probes(hash_code, idx, keys))
 
         if target_idx is None:
             target_idx = idx
 
-        if self.slots[target_idx].key is EMPTY:
+        if keys[target_idx] is EMPTY:
             self.used += 1
             self.fill += 1
-        elif self.slots[target_idx].key is DUMMY:
+        elif keys[target_idx] is DUMMY:
             self.used += 1
 
-        self.slots[target_idx] = Slot(hash_code, key, value)
+        hashes[target_idx] = hash_code
+        keys[target_idx] = key
+        self.slots.values[target_idx] = value
 
-        if self.fill * 3 >= len(self.slots) * 2:
+        if self.fill * 3 >= len(keys) * 2:
             self.resize()
 
-        self._keys_set.add(key)
-
 
 class AlmostPythonDictImplementationNoRecycling(AlmostPythonDictBase):
     def __setitem__(self, key, value):
+        if self.old_slots is not None:
+            self.remove_from_old_slots(key)
+
         hash_code = hash(key)
-        idx = hash_code % len(self.slots)
+        hashes, keys = self.slots.hashes, self.slots.keys
+        idx = hash_code % len(keys)
         target_idx = None
-        while self.slots[idx].key is not EMPTY:
-            if self.slots[idx].hash_code == hash_code and\
-               self.slots[idx].key == key:
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and\
+               keys[idx] == key:
                 target_idx = idx
                 break
-            idx = (idx + 1) % len(self.slots)
+            idx = (idx + 1) % len(keys)
+
+        if self.stats is not None:
+            self.stats.record_probes("setitem", *self.count_probes(hash_code, idx, keys))
 
         if target_idx is None:
             target_idx = idx
-        if self.slots[target_idx].key is EMPTY:
+        if keys[target_idx] is EMPTY:
             self.used += 1
             self.fill += 1
 
-        self.slots[target_idx] = Slot(hash_code, key, value)
-        if self.fill * 3 >= len(self.slots) * 2:
+        hashes[target_idx] = hash_code
+        keys[target_idx] = key
+        self.slots.values[target_idx] = value
+        if self.fill * 3 >= len(keys) * 2:
             self.resize()
 
-        self._keys_set.add(key)
-
 
 class AlmostPythonDictImplementationNoRecyclingSimplerVersion(AlmostPythonDictBase):
     def __setitem__(self, key, value):
+        if self.old_slots is not None:
+            self.remove_from_old_slots(key)
+
         hash_code = hash(key)
-        idx = hash_code % len(self.slots)
-        while self.slots[idx].key is not EMPTY:
-            if self.slots[idx].hash_code == hash_code and\
-               self.slots[idx].key == key:
+        hashes, keys = self.slots.hashes, self.slots.keys
+        idx = hash_code % len(keys)
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and\
+               keys[idx] == key:
                 break
-            idx = (idx + 1) % len(self.slots)
+            idx = (idx + 1) % len(keys)
 
-        if self.slots[idx].key is EMPTY:
+        if self.stats is not None:
+            self.stats.record_probes("setitem", *self.count_probes(hash_code, idx, keys))
+
+        if keys[idx] is EMPTY:
             self.used += 1
             self.fill += 1
 
-        self.slots[idx] = Slot(hash_code, key, value)
-        if self.fill * 3 >= len(self.slots) * 2:
+        hashes[idx] = hash_code
+        keys[idx] = key
+        self.slots.values[idx] = value
+        if self.fill * 3 >= len(keys) * 2:
             self.resize()
-
-        self._keys_set.add(key)
@@ -1,3 +1,5 @@
+import json
+import random
 import unittest
 from common import DUMMY, EMPTY
 from hash_chapter3_class_impl import AlmostPythonDictImplementationRecycling, AlmostPythonDictImplementationNoRecycling
@@ -144,6 +146,185 @@ class HashDictImplementationTest(unittest.TestCase):
         assert_contains(13, 13, 13, 8)
         assert_contains(15, 15, 15, 6)
 
+    def test_incremental_resize(self):
+        class IncrementalRecycling(AlmostPythonDictImplementationRecycling):
+            INCREMENTAL_RESIZE_STEP = 4
+
+        d = IncrementalRecycling()
+        for i in range(5):
+            d[i] = i
+        self.assertIsNone(d.old_slots)
+
+        # crossing the threshold only allocates the new table
+        d[5] = 5
+        self.assertEqual(len(d.slots), 16)
+        self.assertEqual(len(d.old_slots), 8)
+        self.assertEqual(d.fill, 0)
+        self.assertEqual(d.used, 6)
+
+        # every operation moves 4 slots
+        self.assertEqual(d[0], 0)
+        self.assertEqual(d.old_slots_idx, 4)
+        self.assertEqual(d.fill, 4)
+        self.assertEqual(d[5], 5)
+        self.assertIsNone(d.old_slots)
+        self.assertEqual(d.fill, 6)
+        for i in range(6):
+            self.assertEqual(d.slots[i].key, i)
+
+        ref = {i: i for i in range(6)}
+        for i in range(5000):
+            key = random.randint(0, 1000)
+            if random.random() < 0.3 and key in ref:
+                del ref[key]
+                del d[key]
+            else:
+                ref[key] = i
+                d[key] = i
+            self.assertEqual(d.used, len(ref))
+
+        for key in range(1000):
+            if key in ref:
+                self.assertEqual(d[key], ref[key])
+            else:
+                with self.assertRaises(KeyError):
+                    d[key]
+
+    def test_probe_stats(self):
+        d = AlmostPythonDictImplementationRecycling()
+        stats = d.enable_stats()
+        for key in [0, 8, 16]:
+            d[key] = key
+        self.assertEqual(d[16], 16)
+        del d[8]
+        self.assertEqual(d[16], 16)
+        with self.assertRaises(KeyError):
+            d[24]
+
+        # 1 goes to the dummy left by 8, but the probing continues until the first empty slot
+        d[1] = 1
+        self.assertEqual(d.slots[1].key, 1)
+        for key in [3, 4, 5]:
+            d[key] = key
+
+        self.assertEqual(json.loads(stats.to_json()), {
+            "probes": {
+                "setitem": [0, 4, 1, 2],
+                "lookdict": [0, 0, 1, 2, 1],
+                "resize": [0, 5, 0, 1],
+            },
+            "dummies_skipped": {"setitem": 1, "lookdict": 2, "resize": 0},
+            "resizes": 1,
+            "resize_moved": 6,
+            "compactions": 0,
+            "compaction_probes_saved": 0,
+        })
+
+        self.assertIsNone(AlmostPythonDictImplementationRecycling().stats)
+
+    def test_compaction(self):
+        class CompactingRecycling(AlmostPythonDictImplementationRecycling):
+            COMPACT_DUMMY_RATIO = 0.25
+
+        d = CompactingRecycling()
+        stats = d.enable_stats()
+        for key in range(0, 40, 8):
+            d[key] = key
+        self.assertEqual(d.slots.keys[:5], [0, 8, 16, 24, 32])
+
+        del d[0]
+        del d[8]
+        self.assertEqual(stats.compactions, 0)
+
+        # 3 DUMMY slots out of 8, the table is rebuilt at the same size
+        del d[16]
+        self.assertEqual(stats.compactions, 1)
+        self.assertEqual(len(d.slots), 8)
+        self.assertEqual(d.fill, d.used)
+        self.assertEqual(d.slots.keys[:2], [24, 32])
+        # 24 and 32 were 4 and 5 slots away from their home slot, now they are 1 and 2 slots away
+        self.assertEqual(stats.compaction_probes_saved, 6)
+        self.assertEqual(d[24], 24)
+        self.assertEqual(d[32], 32)
+
+    def test_views(self):
+        d = AlmostPythonDictImplementationNoRecycling()
+        keys, values, items = d.keys(), d.values(), d.items()
+        for key in range(8):
+            d[key] = str(key)
+        del d[3]
+
+        self.assertEqual(len(d), 7)
+        self.assertEqual(len(keys), 7)
+        self.assertIn(5, d)
+        self.assertNotIn(3, d)
+        self.assertIn(5, keys)
+        self.assertIn((5, "5"), items)
+        self.assertNotIn((5, "6"), items)
+        self.assertIn("5", values)
+        self.assertEqual(sorted(d), [0, 1, 2, 4, 5, 6, 7])
+        self.assertEqual(sorted(values), ["0", "1", "2", "4", "5", "6", "7"])
+        self.assertEqual(sorted(items), [(k, str(k)) for k in [0, 1, 2, 4, 5, 6, 7]])
+        self.assertEqual(keys & {1, 3, 5}, {1, 5})
+        self.assertEqual(keys, set([0, 1, 2, 4, 5, 6, 7]))
+
+        class IncrementalNoRecycling(AlmostPythonDictImplementationNoRecycling):
+            INCREMENTAL_RESIZE_STEP = 1
+
+        d = IncrementalNoRecycling()
+        for key in range(6):
+            d[key] = key
+        # the keys are split between the old and the new table
+        self.assertIsNotNone(d.old_slots)
+        d[0]
+        self.assertEqual(sorted(d.items()), [(k, k) for k in range(6)])
+
+    def test_bulk_operations(self):
+        hash_calls = []
+
+        class Key(object):
+            def __init__(self, n):
+                self.n = n
+
+            def __hash__(self):
+                hash_calls.append(self.n)
+                return self.n
+
+            def __eq__(self, other):
+                return isinstance(other, Key) and self.n == other.n
+
+        keys = [Key(i) for i in range(100)]
+        d = AlmostPythonDictImplementationRecycling()
+        stats = d.enable_stats()
+        d.update((key, key.n) for key in keys)
+        # presized once instead of growing 8 -> 16 -> ... -> 256
+        self.assertEqual(stats.resizes, 1)
+        self.assertEqual(len(d.slots), 256)
+        self.assertEqual(len(d), 100)
+
+        del hash_calls[:]
+        copy = AlmostPythonDictImplementationNoRecycling()
+        copy.update(d)
+        self.assertEqual(hash_calls, [])
+        self.assertEqual(sorted(k.n for k in copy), list(range(100)))
+
+        copy.update({keys[0]: -1, Key(100): 100})
+        self.assertEqual(copy[keys[0]], -1)
+        self.assertEqual(len(copy), 101)
+
+        with self.assertRaises(KeyError):
+            copy.delete_many(keys[:90] + [Key(200)])
+        self.assertEqual(len(copy), 101)
+
+        copy.delete_many(keys[:90])
+        self.assertEqual(sorted(k.n for k in copy), list(range(90, 101)))
+        self.assertNotIn(DUMMY, copy.slots.keys)
+        copy.delete_many(keys[90:92])
+        self.assertEqual(len(copy), 9)
+
+        d = AlmostPythonDictImplementationRecycling.fromkeys("abca", 0)
+        self.assertEqual(sorted(d.items()), [("a", 0), ("b", 0), ("c", 0)])
+
 
 def main():
     unittest.main()
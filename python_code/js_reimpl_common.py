@@ -1,5 +1,6 @@
 import socket
 import json
+import struct
 
 from common import DUMMY, EMPTY
 
@@ -26,16 +27,25 @@ def dump_simple_py_obj(obj):
     return obj
 
 
-def dump_pairs(pairs):
+# The binary protocol has its own tags for ints, None and DUMMY, so only EMPTY has to be replaced
+def dump_compact_py_obj(obj):
+    if obj is EMPTY:
+        return None
+    elif obj is None:
+        return none_info
+    return obj
+
+
+def dump_pairs(pairs, dump_obj=dump_simple_py_obj):
     res = []
     for k, v in pairs:
-        res.append([dump_simple_py_obj(k), dump_simple_py_obj(v)])
+        res.append([dump_obj(k), dump_obj(v)])
 
     return res
 
 
-def dump_array(array):
-    return list(map(dump_simple_py_obj, array))
+def dump_array(array, dump_obj=dump_simple_py_obj):
+    return list(map(dump_obj, array))
 
 
 def parse_array(array):
@@ -55,44 +65,245 @@ def parse_simple_py_obj(obj):
     return obj
 
 
+class JsonCodec(object):
+    dump_obj = staticmethod(dump_simple_py_obj)
+
+    def handshake(self, sock, sockfile):
+        pass
+
+    def encode(self, data):
+        return bytes(json.dumps(data) + "\n", 'UTF-8')
+
+    def decode(self, payload):
+        return json.loads(payload.decode('UTF-8'))
+
+    def read(self, sockfile):
+        return self.decode(sockfile.readline())
+
+
+# Length-prefixed frames, the payload is the same document as in the json protocol, but every value starts with a tag:
+#     n: null, T/F: true/false, N: None, D: DUMMY
+#     i/j: non-negative/negative int, varint length + big-endian magnitude
+#     s: varint length + utf-8
+#     l: varint count + values, m: varint count + (varint length + utf-8 name, value) pairs
+# Ints don't have to be wrapped in {"type": "int", "value": str}, so int keys take a few bytes instead of ~30.
+# The hash of None is sent once in the handshake instead of with every None.
+FRAME_HEADER = struct.Struct('>I')
+
+
+def encode_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+# the same few names are in every message
+_encoded_names = {}
+
+
+def encode_value(out, obj):
+    t = type(obj)
+    if t is int:
+        if obj < 0:
+            out.append(0x6a)  # j
+            obj = -obj
+        else:
+            out.append(0x69)  # i
+        length = (obj.bit_length() + 7) // 8
+        encode_varint(out, length)
+        out += obj.to_bytes(length, 'big')
+    elif t is str:
+        encoded = obj.encode('UTF-8')
+        out.append(0x73)  # s
+        encode_varint(out, len(encoded))
+        out += encoded
+    elif t is dict:
+        if obj is none_info:
+            out.append(0x4e)  # N
+            return
+        out.append(0x6d)  # m
+        encode_varint(out, len(obj))
+        for name, value in obj.items():
+            encoded = _encoded_names.get(name)
+            if encoded is None:
+                encoded = bytearray()
+                encode_varint(encoded, len(name.encode('UTF-8')))
+                encoded = _encoded_names[name] = bytes(encoded + name.encode('UTF-8'))
+            out += encoded
+            encode_value(out, value)
+    elif obj is None:
+        out.append(0x6e)  # n
+    elif obj is True:
+        out.append(0x54)  # T
+    elif obj is False:
+        out.append(0x46)  # F
+    elif obj is DUMMY:
+        out.append(0x44)  # D
+    elif t is list or t is tuple:
+        out.append(0x6c)  # l
+        encode_varint(out, len(obj))
+        for item in obj:
+            encode_value(out, item)
+    elif isinstance(obj, int):
+        encode_value(out, int(obj))
+    else:
+        raise TypeError("Can't encode {}".format(type(obj).__name__))
+
+
+def decode_varint(payload, pos):
+    n = 0
+    shift = 0
+    while True:
+        byte = payload[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def decode_value(payload, pos):
+    tag = payload[pos]
+    pos += 1
+    if tag == 0x6d:  # m
+        count, pos = decode_varint(payload, pos)
+        res = {}
+        for _ in range(count):
+            length = payload[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = decode_varint(payload, pos)
+            name = payload[pos:pos + length].decode('UTF-8')
+            res[name], pos = decode_value(payload, pos + length)
+        return res, pos
+    if tag == 0x69 or tag == 0x6a:  # i, j
+        length = payload[pos]
+        if length < 0x80:
+            pos += 1
+        else:
+            length, pos = decode_varint(payload, pos)
+        magnitude = int.from_bytes(payload[pos:pos + length], 'big')
+        return -magnitude if tag == 0x6a else magnitude, pos + length
+    if tag == 0x73:  # s
+        length = payload[pos]
+        if length < 0x80:
+            pos += 1
+        else:
+            length, pos = decode_varint(payload, pos)
+        return payload[pos:pos + length].decode('UTF-8'), pos + length
+    if tag == 0x6e:  # n
+        return None, pos
+    if tag == 0x4e:  # N
+        return none_info, pos
+    if tag == 0x6c:  # l
+        count, pos = decode_varint(payload, pos)
+        res = []
+        for _ in range(count):
+            item, pos = decode_value(payload, pos)
+            res.append(item)
+        return res, pos
+    if tag == 0x54:  # T
+        return True, pos
+    if tag == 0x46:  # F
+        return False, pos
+    if tag == 0x44:  # D
+        return DUMMY, pos
+    raise ValueError("Unknown tag: {}".format(tag))
+
+
+class BinaryCodec(object):
+    dump_obj = staticmethod(dump_compact_py_obj)
+
+    def handshake(self, sock, sockfile):
+        # the server starts every connection in the json protocol
+        sock.sendall(JsonCodec().encode({"protocol": "binary", "noneHash": none_info["hash"]}))
+        response = JsonCodec().read(sockfile)
+        if response.get("protocol") != "binary":
+            raise Exception("The server does not support the binary protocol")
+
+    def encode(self, data):
+        out = bytearray(FRAME_HEADER.size)
+        encode_value(out, data)
+        FRAME_HEADER.pack_into(out, 0, len(out) - FRAME_HEADER.size)
+        return bytes(out)
+
+    def decode(self, payload):
+        obj, pos = decode_value(payload, 0)
+        assert pos == len(payload)
+        return obj
+
+    def read(self, sockfile):
+        length, = FRAME_HEADER.unpack(sockfile.read(FRAME_HEADER.size))
+        return self.decode(sockfile.read(length))
+
+
+CODECS = {
+    "json": JsonCodec(),
+    "binary": BinaryCodec(),
+}
+
+# TODO: unhardcode?
+SOCK_FILENAME = 'pynode.sock'
+
+# The protocol of the connection used by the chapter 1 and chapter 2 functions
+PROTOCOL = "json"
+
+
+def connect(protocol):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(SOCK_FILENAME)
+    sockfile = sock.makefile('rb')
+    codec = CODECS[protocol]
+    codec.handshake(sock, sockfile)
+    return sock, sockfile, codec
+
+
 sock = None
 sockfile = None
+codec = None
 
 
 def _init_sock_stuff():
     global sock
     global sockfile
-
-    # TODO: unhardcode?
-    SOCK_FILENAME = 'pynode.sock'
+    global codec
 
     if sock is None:
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.connect(SOCK_FILENAME)
-        sockfile = sock.makefile('r')
+        sock, sockfile, codec = connect(PROTOCOL)
 
     return sock, sockfile
 
 
+def send_request(sock, sockfile, data, codec=CODECS["json"]):
+    # a batch can be a large frame, send() alone may write only a part of it
+    sock.sendall(codec.encode(data))
+    response = codec.read(sockfile)
+    # the server answers a request it failed to handle with the error instead of closing the connection
+    if "error" in response:
+        raise Exception("The server failed to handle the request: {}".format(response["error"]))
+    return response
+
+
 def run_op_chapter1_chapter2(chapter, hash_codes, keys, op, **kwargs):
     _init_sock_stuff()
 
     for name in kwargs:
         if name != 'array':
-            kwargs[name] = dump_simple_py_obj(kwargs[name])
+            kwargs[name] = codec.dump_obj(kwargs[name])
         else:
-            kwargs[name] = dump_array(kwargs[name])
+            kwargs[name] = dump_array(kwargs[name], codec.dump_obj)
 
     data = {
         "dict": chapter,
         "op": op,
         "args": kwargs,
-        "hashCodes": dump_array(hash_codes) if hash_codes is not None else None,
-        "keys": dump_array(keys) if keys is not None else None,
+        "hashCodes": dump_array(hash_codes, codec.dump_obj) if hash_codes is not None else None,
+        "keys": dump_array(keys, codec.dump_obj) if keys is not None else None,
     }
 
-    sock.send(bytes(json.dumps(data) + "\n", 'UTF-8'))
-    response = json.loads(sockfile.readline())
+    response = send_request(sock, sockfile, data, codec)
 
     if "exception" in response and response["exception"]:
         raise KeyError()
@@ -0,0 +1,58 @@
+import socket
+import unittest
+from common import DUMMY, EMPTY
+from js_reimpl_common import CODECS, FRAME_HEADER, none_info, parse_simple_py_obj, dump_pairs, send_request
+
+
+class BridgeCodecTest(unittest.TestCase):
+    PY_OBJS = [EMPTY, DUMMY, None, 0, 1, -1, 127, 128, -2 ** 64, 3 ** 200, "", "abc", "юникод" * 50]
+
+    def test_round_trip(self):
+        for codec in CODECS.values():
+            message = {
+                "op": "__init__",
+                "session": True,
+                "args": {"pairs": dump_pairs(zip(self.PY_OBJS, reversed(self.PY_OBJS)), codec.dump_obj)},
+                "nested": [[], {}, [[False]]],
+            }
+            frame = codec.encode(message)
+            if codec is CODECS["binary"]:
+                self.assertEqual(FRAME_HEADER.unpack_from(frame)[0], len(frame) - FRAME_HEADER.size)
+                decoded = codec.decode(frame[FRAME_HEADER.size:])
+            else:
+                self.assertEqual(frame[-1:], b"\n")
+                decoded = codec.decode(frame[:-1])
+
+            self.assertEqual(decoded["op"], "__init__")
+            self.assertIs(decoded["session"], True)
+            self.assertEqual(decoded["nested"], [[], {}, [[False]]])
+            pairs = [(parse_simple_py_obj(k), parse_simple_py_obj(v)) for k, v in decoded["args"]["pairs"]]
+            self.assertEqual(pairs, list(zip(self.PY_OBJS, reversed(self.PY_OBJS))))
+
+    def test_binary_is_compact(self):
+        binary, json = CODECS["binary"], CODECS["json"]
+        self.assertEqual(binary.encode(binary.dump_obj(None)), FRAME_HEADER.pack(1) + b"N")
+        self.assertIs(binary.decode(b"N"), none_info)
+        self.assertEqual(binary.encode(binary.dump_obj(300)), FRAME_HEADER.pack(4) + b"i\x02\x01\x2c")
+        self.assertEqual(binary.encode(binary.dump_obj(-1)), FRAME_HEADER.pack(3) + b"j\x01\x01")
+        self.assertLess(len(binary.encode(binary.dump_obj(12345))), len(json.encode(json.dump_obj(12345))))
+
+    def test_error_response(self):
+        for codec in CODECS.values():
+            client, server = socket.socketpair()
+            sockfile = client.makefile('rb')
+            # the server answers before reading the request, it fits into the socket buffer
+            server.sendall(codec.encode({"error": "Unknown op: nope"}))
+            with self.assertRaisesRegex(Exception, "Unknown op: nope"):
+                send_request(client, sockfile, {"op": "nope"}, codec)
+            sockfile.close()
+            client.close()
+            server.close()
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
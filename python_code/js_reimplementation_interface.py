@@ -1,35 +1,82 @@
-import socket
-import json
+from contextlib import contextmanager
 
 from common import DUMMY, EMPTY
-from js_reimpl_common import dump_simple_py_obj, parse_simple_py_obj, dump_pairs
+from js_reimpl_common import parse_simple_py_obj, dump_pairs, send_request, connect
 from dict_reimpl_common import Slot
 
 
 class JsImplBase(object):
-    # TODO: unhardcode?
-    SOCK_FILENAME = 'pynode.sock'
+    # "json" or "binary", see js_reimpl_common
+    PROTOCOL = "json"
 
+    # In session mode, the node side keeps the table of every connection between ops. Only the op and its arguments
+    # are sent, and the table is fetched when slots, fill or used are read. Otherwise, every op sends
+    # the whole table and gets the whole table back.
+    SESSION = True
+
+    # Inside batch(), ops are queued and sent in one frame when flush() is called, when the batch ends
+    # or when the state is needed. They return None and don't raise: the (result, raised KeyError) pair of every op
+    # is appended to the list returned by batch().
     def __init__(self, pairs=None):
         pairs = pairs or []
 
-        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        self.sock.connect(self.SOCK_FILENAME)
-        self.sockfile = self.sock.makefile('r')
+        self.sock, self.sockfile, self.codec = connect(self.PROTOCOL)
 
-        self.slots = None
-        self.fill = None
-        self.used = None
+        self._slots = None
+        self._fill = None
+        self._used = None
+        self._state_is_stale = False
+        self._pending = None
+        self.batch_results = None
 
         self.run_op("__init__", pairs=pairs)
 
+    def _fetch_state(self):
+        self.flush()
+        if self._state_is_stale:
+            self.run_op("__dump__")
+
+    @contextmanager
+    def batch(self):
+        self._pending = []
+        self.batch_results = []
+        try:
+            yield self.batch_results
+            self.flush()
+        finally:
+            self._pending = None
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        requests, self._pending = self._pending, []
+        response = send_request(self.sock, self.sockfile, {"batch": requests}, self.codec)
+        for op_response in response["batch"]:
+            self.batch_results.append(self._process_response(op_response))
+
+    @property
+    def slots(self):
+        self._fetch_state()
+        return self._slots
+
+    @property
+    def fill(self):
+        self._fetch_state()
+        return self._fill
+
+    @property
+    def used(self):
+        self._fetch_state()
+        return self._used
+
     def __del__(self):
         self.sock.close()
 
     def dump_slots(self):
         def dump_slot(slot):
-            key = dump_simple_py_obj(slot.key)
-            value = dump_simple_py_obj(slot.value)
+            key = self.codec.dump_obj(slot.key)
+            value = self.codec.dump_obj(slot.value)
 
             hash_code = slot.hash_code
             if hash_code is EMPTY:
@@ -41,10 +88,10 @@ class JsImplBase(object):
                 "value": value,
             }
 
-        if self.slots is None:
+        if self._slots is None:
             return None
 
-        return list(map(dump_slot, self.slots))
+        return list(map(dump_slot, self._slots))
 
     def restore_slots(self, slots):
         def restore_slot(slot):
@@ -58,38 +105,56 @@ class JsImplBase(object):
 
             return Slot(hash_code, key, value)
 
-        self.slots = list(map(restore_slot, slots))
+        self._slots = list(map(restore_slot, slots))
 
     def run_op(self, op, **kwargs):
         for name in kwargs:
             if name != 'pairs':
-                kwargs[name] = dump_simple_py_obj(kwargs[name])
+                kwargs[name] = self.codec.dump_obj(kwargs[name])
             else:
-                kwargs[name] = dump_pairs(kwargs[name])
+                kwargs[name] = dump_pairs(kwargs[name], self.codec.dump_obj)
 
         data = {
             "dict": self.dict_type,
             "op": op,
             "args": kwargs,
-            "self": {
+        }
+        # __dump__ and the ops after the first one in a batch use the table the node side got from the previous op
+        if self.SESSION or self._pending or op == "__dump__":
+            data["session"] = True
+        else:
+            if self._state_is_stale:
+                self.run_op("__dump__")
+            data["self"] = {
                 "slots": self.dump_slots(),
-                "used": self.used,
-                "fill": self.fill
+                "used": self._used,
+                "fill": self._fill
             }
-        }
+
+        if self._pending is not None and op != "__dump__":
+            self._pending.append(data)
+            return None
 
         # pprint(("<< sending", data, op, kwargs))
-        self.sock.send(bytes(json.dumps(data) + "\n", 'UTF-8'))
-        response = json.loads(self.sockfile.readline())
+        response = send_request(self.sock, self.sockfile, data, self.codec)
         # pprint((">> receiving", response))
 
-        self.restore_slots(response["self"]["slots"])
-        self.fill = response["self"]["fill"]
-        self.used = response["self"]["used"]
-        if response["exception"]:
+        result, is_exception = self._process_response(response)
+        if is_exception:
             raise KeyError("whatever")
 
-        return parse_simple_py_obj(response["result"])
+        return result
+
+    def _process_response(self, response):
+        if "self" in response:
+            self.restore_slots(response["self"]["slots"])
+            self._fill = response["self"]["fill"]
+            self._used = response["self"]["used"]
+            self._state_is_stale = False
+        else:
+            self._state_is_stale = True
+
+        return parse_simple_py_obj(response["result"]), response["exception"]
 
 
 class Dict32JsImpl(JsImplBase):
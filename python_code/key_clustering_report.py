@@ -0,0 +1,144 @@
+import argparse
+import json
+import random
+
+from dict_reimplementation import PyDictReimplementation32
+import hash_chapter3_class_impl
+
+# The probing of chapters 2 and 3 and the perturbation probing of chapter 4
+# (the same sequence as chapter4_probing_python_reimplementation_test.probe_all())
+PROBINGS = {
+    "linear": hash_chapter3_class_impl.AlmostPythonDictImplementationNoRecycling().probe_sequence,
+    "perturbation": PyDictReimplementation32().probe_sequence,
+}
+
+
+def read_keys(path, key_type):
+    # one key per line, repeated keys are one entry of the table
+    keys = []
+    seen = set()
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            key = int(line) if key_type == "int" else line
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+    return keys
+
+
+def table_size_for(num_keys):
+    # like a dict built from scratch: the keys take at most 2/3 of the slots
+    size = 8
+    while size * 2 < num_keys * 3:
+        size *= 2
+    return size
+
+
+def cluster_lengths(occupied):
+    # the probing wraps around, so a cluster at the end of the table continues at the start
+    size = len(occupied)
+    if all(occupied):
+        return [size]
+
+    start = occupied.index(0)
+    lengths = []
+    current = 0
+    for i in range(start, start + size + 1):
+        if occupied[i % size]:
+            current += 1
+        elif current:
+            lengths.append(current)
+            current = 0
+    return lengths
+
+
+def histogram(lengths):
+    # buckets 1, 2-3, 4-7, 8-15, ...
+    buckets = {}
+    for length in lengths:
+        low = 1
+        while low * 2 <= length:
+            low *= 2
+        name = str(low) if low == 1 else "{}-{}".format(low, low * 2 - 1)
+        buckets[name] = buckets.get(name, 0) + 1
+    return buckets
+
+
+def analyze(hashes, size, probe_sequence):
+    occupied = bytearray(size)
+    probes = []
+    for hash_code in hashes:
+        for count, idx in enumerate(probe_sequence(hash_code, size), 1):
+            if not occupied[idx]:
+                occupied[idx] = 1
+                probes.append(count)
+                break
+
+    clusters = cluster_lengths(occupied)
+    sorted_probes = sorted(probes)
+    return {
+        "home_slot_collisions": len(hashes) - len(set(hash_code % size for hash_code in hashes)),
+        "mean_probes": float(sum(probes)) / len(probes),
+        "p99_probes": sorted_probes[len(sorted_probes) * 99 // 100],
+        "max_probes": sorted_probes[-1],
+        "max_cluster": max(clusters),
+        "clusters": histogram(clusters),
+    }
+
+
+def run(keys, size, seed):
+    # random 64-bit hashes show what the same number of keys looks like without any structure in the hashes
+    random.seed(seed)
+    corpora = [
+        ("keys", [hash(key) for key in keys]),
+        ("random hashes", [random.getrandbits(64) - 2 ** 63 for _ in keys]),
+    ]
+
+    report = []
+    for corpus_name, hashes in corpora:
+        for probing_name in sorted(PROBINGS):
+            # the perturbation only visits every slot of power of two tables
+            if probing_name == "perturbation" and size & (size - 1):
+                continue
+            row = analyze(hashes, size, PROBINGS[probing_name])
+            row.update(corpus=corpus_name, probing=probing_name)
+            report.append(row)
+    return report
+
+
+def print_report(report, num_keys, size):
+    print("{} keys, {} slots, load {:.2f}".format(num_keys, size, float(num_keys) / size))
+    print("{:<16}{:<14}{:>12}{:>8}{:>8}{:>8}{:>10}  {}".format(
+        "hashes", "probing", "home coll.", "mean", "p99", "max", "cluster", "cluster lengths"))
+    for row in report:
+        clusters = sorted(row["clusters"].items(), key=lambda item: int(item[0].split("-")[0]))
+        print("{corpus:<16}{probing:<14}{home_slot_collisions:>12}{mean_probes:>8.2f}{p99_probes:>8}{max_probes:>8}{max_cluster:>10}  {lengths}".format(
+            lengths=" ".join("{}:{}".format(name, count) for name, count in clusters), **row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Report how the keys of a corpus cluster under hash() % size, '
+                                                 'with linear probing and with the perturbation probing of CPython. '
+                                                 'hash() of str is randomized, set PYTHONHASHSEED for reproducible reports')
+    parser.add_argument('--keys-file', required=True, help='one key per line')
+    parser.add_argument('--key-type', choices=["str", "int"], default="str")
+    parser.add_argument('--size', type=int, help='number of slots, by default the size of a dict with these keys')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the random hashes baseline')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    keys = read_keys(args.keys_file, args.key_type)
+    if not keys:
+        parser.error("{} has no keys".format(args.keys_file))
+    size = args.size or table_size_for(len(keys))
+    if len(keys) > size:
+        parser.error("{} keys don't fit into {} slots".format(len(keys), size))
+
+    report = run(keys, size, args.seed)
+    if args.json:
+        print(json.dumps({"keys": len(keys), "size": size, "report": report}, sort_keys=True))
+    else:
+        print_report(report, len(keys), size)
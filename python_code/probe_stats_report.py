@@ -0,0 +1,66 @@
+import argparse
+import json
+import random
+
+from dict_reimplementation import PyDictReimplementation32, PyDictReimplementation36
+import hash_chapter3_class_impl
+from robin_hood_dict import RobinHoodDict
+from workloads import KV_CHOICES, make_kv_factory
+
+IMPLEMENTATIONS = {
+    "dict32_reimpl_py": PyDictReimplementation32,
+    "dict36_reimpl_py": PyDictReimplementation36,
+    "almost_python_dict_recycling_py": hash_chapter3_class_impl.AlmostPythonDictImplementationRecycling,
+    "almost_python_dict_no_recycling_py": hash_chapter3_class_impl.AlmostPythonDictImplementationNoRecycling,
+    "robin_hood_py": RobinHoodDict,
+}
+
+
+def with_compaction(klass, ratio):
+    return type(klass.__name__ + "Compacting", (klass,), {"COMPACT_DUMMY_RATIO": ratio})
+
+
+def collect_stats(klass, kv, num_inserts, remove_chance, seed):
+    random.seed(seed)
+    kv_factory = make_kv_factory(kv, num_inserts)
+    d = klass()
+    stats = d.enable_stats()
+    inserted = []
+    present = set()
+    for _ in range(num_inserts):
+        if inserted and random.random() < remove_chance:
+            idx = random.randrange(len(inserted))
+            inserted[idx], inserted[-1] = inserted[-1], inserted[idx]
+            key = inserted.pop()
+            del d[key]
+            present.remove(key)
+        else:
+            key = kv_factory.generate_key()
+            d[key] = kv_factory.generate_value()
+            if key not in present:
+                present.add(key)
+                inserted.append(key)
+
+    for key in inserted:
+        d[key]
+
+    return stats.as_dict()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Dump probe statistics of the dict implementations as JSON')
+    parser.add_argument('--implementation', choices=IMPLEMENTATIONS.keys(), action='append')
+    parser.add_argument('--kv', choices=KV_CHOICES, required=True)
+    parser.add_argument('--num-inserts', type=int, default=10000)
+    parser.add_argument('--remove-chance', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--compact-dummy-ratio', type=float, help='set COMPACT_DUMMY_RATIO on the implementations that have DUMMY slots')
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.implementation or sorted(IMPLEMENTATIONS.keys()):
+        klass = IMPLEMENTATIONS[name]
+        if args.compact_dummy_ratio is not None and hasattr(klass, "rebuild"):
+            klass = with_compaction(klass, args.compact_dummy_ratio)
+        report[name] = collect_stats(klass, args.kv, args.num_inserts, args.remove_chance, args.seed)
+    print(json.dumps(report, sort_keys=True))
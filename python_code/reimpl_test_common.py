@@ -0,0 +1,22 @@
+import random
+
+
+# Applies random inserts and deletes to d and to a dict, and checks that they agree. The keys come from
+# generate_key(rng), and all the randomness from a random.Random(seed), so a failure can be reproduced from its seed.
+def check_random_operations(test_case, d, generate_key, seed, num_ops=5000, remove_chance=0.4, check_keys=()):
+    rng = random.Random(seed)
+    ref = {}
+    for i in range(num_ops):
+        key = generate_key(rng)
+        if rng.random() < remove_chance and key in ref:
+            del ref[key]
+            del d[key]
+        else:
+            ref[key] = i
+            d[key] = i
+        test_case.assertEqual(len(d), len(ref), "seed {}, operation {}".format(seed, i))
+
+    test_case.assertEqual(dict(d.items()), ref, "seed {}".format(seed))
+    for key in check_keys:
+        test_case.assertEqual(key in d, key in ref, "seed {}, key {!r}".format(seed, key))
+    return ref
@@ -0,0 +1,68 @@
+import argparse
+import gc
+import random
+import timeit
+
+from dict_reimplementation import PyDictReimplementation32
+import hash_chapter3_class_impl
+
+IMPLEMENTATIONS = {
+    "dict32_reimpl_py": PyDictReimplementation32,
+    "almost_python_dict_recycling_py": hash_chapter3_class_impl.AlmostPythonDictImplementationRecycling,
+    "almost_python_dict_no_recycling_py": hash_chapter3_class_impl.AlmostPythonDictImplementationNoRecycling,
+}
+
+
+def with_incremental_resize(klass, step):
+    return type(klass.__name__ + "Incremental", (klass,), {"INCREMENTAL_RESIZE_STEP": step})
+
+
+def op_latencies(klass, keys, remove_chance):
+    timer = timeit.default_timer
+    latencies = []
+    d = klass()
+    inserted = []
+    for key in keys:
+        if inserted and random.random() < remove_chance:
+            to_remove = inserted.pop(random.randrange(len(inserted)))
+            start = timer()
+            del d[to_remove]
+        else:
+            inserted.append(key)
+            start = timer()
+            d[key] = key
+        latencies.append(timer() - start)
+
+    return sorted(latencies)
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def run(name, num_ops, steps, remove_chance):
+    keys = random.sample(range(10 * num_ops), num_ops)
+    klass = IMPLEMENTATIONS[name]
+    print(name)
+    variants = [("eager resize", klass)] + [("incremental, step={}".format(step), with_incremental_resize(klass, step)) for step in steps]
+    for label, variant in variants:
+        random.seed(num_ops)
+        # gc pauses would dominate the worst case otherwise
+        gc.disable()
+        latencies = op_latencies(variant, keys, remove_chance)
+        gc.enable()
+        print("    {:<24} p50 {:>8.2f}us p99 {:>8.2f}us p99.99 {:>10.2f}us max {:>12.2f}us total {:>8.3f}s".format(
+            label, *[percentile(latencies, p) * 10 ** 6 for p in [0.5, 0.99, 0.9999]] +
+            [latencies[-1] * 10 ** 6, sum(latencies)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare worst-case per-operation latency of eager and incremental resizes')
+    parser.add_argument('--implementation', choices=IMPLEMENTATIONS.keys(), action='append')
+    parser.add_argument('--num-ops', type=int, default=1000000)
+    parser.add_argument('--step', type=int, action='append')
+    parser.add_argument('--remove-chance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    for name in args.implementation or sorted(IMPLEMENTATIONS.keys()):
+        run(name, args.num_ops, args.step or [16, 64], args.remove_chance)
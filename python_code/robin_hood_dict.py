@@ -0,0 +1,167 @@
+from common import DUMMY, EMPTY
+from dict_reimpl_common import BaseDictImpl, SlotsArray
+
+
+# Linear probing where every key is kept at least as close to its home slot as the keys probed past it:
+# an insert takes the slot of the first key that is closer to its own home slot and pushes that key further.
+# A lookup can stop as soon as it meets such a key, and a delete shifts the following keys one slot back
+# instead of leaving a DUMMY, so probe chains don't grow between resizes.
+# The only DUMMY slots are the ones left in the old table during an incremental resize.
+class RobinHoodDict(BaseDictImpl):
+    START_SIZE = 8
+
+    def __init__(self, pairs=None):
+        BaseDictImpl.__init__(self)
+        if pairs:
+            self.presize(len(pairs))
+            for k, v in pairs:
+                self[k] = v
+
+    def probe_sequence(self, hash_code, size):
+        idx = hash_code % size
+        while True:
+            yield idx
+            idx = (idx + 1) % size
+
+    def lookdict(self, key, slots=None):
+        hash_code = hash(key)
+        slots = self.slots if slots is None else slots
+        hashes, keys = slots.hashes, slots.keys
+        size = len(keys)
+
+        idx = hash_code % size
+        dist = 0
+        found = False
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and keys[idx] == key:
+                found = True
+                break
+            if (idx - hashes[idx]) % size < dist:
+                break
+
+            idx = (idx + 1) % size
+            dist += 1
+
+        if self.stats is not None:
+            self.stats.record_probes("lookdict", *self.count_probes(hash_code, idx, keys))
+
+        if not found:
+            raise KeyError()
+        return idx
+
+    def __getitem__(self, key):
+        if self.old_slots is not None:
+            idx = self.lookdict_old_slots(key)
+            if idx is not None:
+                return self.old_slots.values[idx]
+
+        idx = self.lookdict(key)
+
+        return self.slots.values[idx]
+
+    def __setitem__(self, key, value):
+        if self.old_slots is not None:
+            self.remove_from_old_slots(key)
+
+        hash_code = hash(key)
+        hashes, keys = self.slots.hashes, self.slots.keys
+        size = len(keys)
+        idx = hash_code % size
+        dist = 0
+        found = False
+        while keys[idx] is not EMPTY:
+            if hashes[idx] == hash_code and keys[idx] == key:
+                found = True
+                break
+            if (idx - hashes[idx]) % size < dist:
+                break
+
+            idx = (idx + 1) % size
+            dist += 1
+
+        if self.stats is not None:
+            self.stats.record_probes("setitem", *self.count_probes(hash_code, idx, keys))
+
+        if found:
+            self.slots.values[idx] = value
+            return
+
+        self.used += 1
+        self.fill += 1
+        self.insert_at(idx, dist, hash_code, key, value)
+        if self.fill * 3 >= size * 2:
+            self.resize()
+
+    def insert_at(self, idx, dist, hash_code, key, value):
+        hashes, keys, values = self.slots.hashes, self.slots.keys, self.slots.values
+        size = len(keys)
+        while keys[idx] is not EMPTY:
+            slot_dist = (idx - hashes[idx]) % size
+            if slot_dist < dist:
+                hashes[idx], hash_code = hash_code, hashes[idx]
+                keys[idx], key = key, keys[idx]
+                values[idx], value = value, values[idx]
+                dist = slot_dist
+
+            idx = (idx + 1) % size
+            dist += 1
+
+        hashes[idx] = hash_code
+        keys[idx] = key
+        values[idx] = value
+
+    def __delitem__(self, key):
+        if self.old_slots is not None and self.remove_from_old_slots(key):
+            return
+
+        idx = self.lookdict(key)
+        hashes, keys, values = self.slots.hashes, self.slots.keys, self.slots.values
+        size = len(keys)
+
+        self.used -= 1
+        self.fill -= 1
+        next_idx = (idx + 1) % size
+        while keys[next_idx] is not EMPTY and (next_idx - hashes[next_idx]) % size != 0:
+            hashes[idx] = hashes[next_idx]
+            keys[idx] = keys[next_idx]
+            values[idx] = values[next_idx]
+            idx = next_idx
+            next_idx = (idx + 1) % size
+
+        hashes[idx] = 0
+        keys[idx] = EMPTY
+        values[idx] = EMPTY
+
+    def resize(self):
+        self.rebuild(self.find_nearest_size(2 * self.used))
+
+    def rebuild(self, new_size):
+        old_slots = self.slots
+        if self.INCREMENTAL_RESIZE_STEP is not None:
+            self.start_incremental_resize(new_size)
+            return
+
+        self.slots = SlotsArray(new_size)
+        self.fill = 0
+        for hash_code, key, value in zip(old_slots.hashes, old_slots.keys, old_slots.values):
+            if key is not EMPTY and key is not DUMMY:
+                self.insert_clean(hash_code, key, value)
+
+        if self.stats is not None:
+            self.stats.record_resize(self.used)
+
+    def insert_clean(self, hash_code, key, value):
+        # the key is not in the table, so the probing only looks for the slot to take
+        keys = self.slots.keys
+        hashes = self.slots.hashes
+        size = len(keys)
+        idx = hash_code % size
+        dist = 0
+        while keys[idx] is not EMPTY and (idx - hashes[idx]) % size >= dist:
+            idx = (idx + 1) % size
+            dist += 1
+
+        if self.stats is not None:
+            self.stats.record_probes("resize", *self.count_probes(hash_code, idx, keys))
+        self.fill += 1
+        self.insert_at(idx, dist, hash_code, key, value)
@@ -0,0 +1,52 @@
+import unittest
+from common import DUMMY, EMPTY
+from reimpl_test_common import check_random_operations
+from robin_hood_dict import RobinHoodDict
+
+
+class RobinHoodDictTest(unittest.TestCase):
+    def test_handcrafted(self):
+        d = RobinHoodDict()
+        self.assertEqual(len(d.slots), 8)
+
+        def assert_keys(keys):
+            self.assertEqual(d.slots.keys[:len(keys)], keys)
+            self.assertTrue(all(key is EMPTY for key in d.slots.keys[len(keys):]))
+
+        for key in [0, 8, 1]:
+            d[key] = key
+        assert_keys([0, 8, 1])
+
+        # 16 is 2 slots away from its home slot when it gets to 1, which is only 1 slot away
+        d[16] = 16
+        assert_keys([0, 8, 16, 1])
+
+        del d[8]
+        assert_keys([0, 16, 1])
+        self.assertNotIn(DUMMY, d.slots.keys)
+        self.assertEqual(d.used, 3)
+        self.assertEqual(d.fill, 3)
+
+        stats = d.enable_stats()
+        # the lookup stops at 1, because 24 would have taken its slot
+        self.assertNotIn(24, d)
+        self.assertEqual(stats.probes["lookdict"], [0, 0, 0, 1])
+        for key in [0, 16, 1]:
+            self.assertEqual(d[key], key)
+
+    def test_random_operations(self):
+        for step in [None, 3]:
+            class RobinHoodDictVariant(RobinHoodDict):
+                INCREMENTAL_RESIZE_STEP = step
+
+            for seed in range(3):
+                check_random_operations(self, RobinHoodDictVariant(), lambda rng: rng.randint(0, 1000), seed,
+                                        check_keys=range(1000))
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import random
+import timeit
+import tracemalloc
+
+from dict_reimpl_common import Slot, SlotsArray
+from dict_reimplementation import PyDictReimplementation32
+import hash_chapter3_class_impl
+import build_autogenerated_chapter3_chapter4
+
+# The extracted classes are generated from the same code as the reimplementations, but keep a list of Slot objects
+IMPLEMENTATIONS = {
+    "dict32": (PyDictReimplementation32, build_autogenerated_chapter3_chapter4.Dict32Extracted),
+    "almost_python_dict_recycling": (
+        hash_chapter3_class_impl.AlmostPythonDictImplementationRecycling,
+        build_autogenerated_chapter3_chapter4.HashClassRecyclingExtracted,
+    ),
+}
+
+
+def storage_bytes_per_entry(n):
+    keys = list(range(n))
+
+    tracemalloc.start()
+    slots = [Slot(hash(k), k, k) for k in keys]
+    slot_objects_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del slots
+
+    tracemalloc.start()
+    slots = SlotsArray(n)
+    for i, k in enumerate(keys):
+        slots.hashes[i] = hash(k)
+        slots.keys[i] = k
+        slots.values[i] = k
+    slots_array_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return slot_objects_size / n, slots_array_size / n
+
+
+def table_bytes_per_entry(klass, keys):
+    tracemalloc.start()
+    d = klass()
+    for k in keys:
+        d[k] = k
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(keys)
+
+
+def build_and_lookup_time(klass, keys, lookup_keys):
+    d = klass()
+
+    def build():
+        for k in keys:
+            d[k] = k
+
+    def lookup():
+        for k in lookup_keys:
+            d[k]
+
+    return timeit.timeit(build, number=1), timeit.timeit(lookup, number=1)
+
+
+def run(n, implementations):
+    print("Storage only, {} slots: Slot objects {:.1f} bytes/entry, SlotsArray {:.1f} bytes/entry".format(
+        n, *storage_bytes_per_entry(n)))
+
+    keys = [random.randint(0, 10 * n) for _ in range(n)]
+    lookup_keys = random.sample(keys, min(n, len(keys)))
+    for name in implementations:
+        soa_klass, slot_objects_klass = IMPLEMENTATIONS[name]
+        print(name)
+        for label, klass in [("SlotsArray", soa_klass), ("Slot objects", slot_objects_klass)]:
+            bytes_per_entry = table_bytes_per_entry(klass, keys)
+            build_time, lookup_time = build_and_lookup_time(klass, keys, lookup_keys)
+            print("    {:<14}{:>8.1f} bytes/entry {:>12.0f} builds/sec {:>12.0f} lookups/sec".format(
+                label, bytes_per_entry, n / build_time, n / lookup_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare memory and speed of the struct-of-arrays slots with Slot objects')
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--implementation', choices=IMPLEMENTATIONS.keys(), action='append')
+    args = parser.parse_args()
+
+    run(args.size, args.implementation or sorted(IMPLEMENTATIONS.keys()))
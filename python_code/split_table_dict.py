@@ -0,0 +1,155 @@
+from array import array
+
+from common import EMPTY
+from dict_reimpl_common import HASH_TYPECODE, BaseDictImpl, SlotsArray
+from dict_reimplementation import PyDictReimplementation32
+
+
+def usable_fraction(size):
+    # the number of keys a table of this size takes before a 3.2 dict resizes it
+    return (size * 2 + 1) // 3
+
+
+# The keys half of a split table (the ma_keys of PEP 412): shared by many dicts, each of them only has a values list
+# with a value (or EMPTY) per slot of this table. Keys are never removed, so there are no DUMMY slots.
+# users stands in for dk_refcnt: the number of split dicts created on these keys that have not been combined since
+# (the dicts that were garbage collected are still counted, so the keys look shared when they may not be).
+class SharedKeys(object):
+    def __init__(self, size):
+        self.hashes = array(HASH_TYPECODE, [0]) * size
+        self.keys = [EMPTY] * size
+        self.usable = usable_fraction(size)
+        self.users = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def insert_clean(self, probe_sequence, hash_code, key):
+        for idx in probe_sequence(hash_code, len(self.keys)):
+            if self.keys[idx] is EMPTY:
+                break
+        self.hashes[idx] = hash_code
+        self.keys[idx] = key
+        self.usable -= 1
+        return idx
+
+
+# The shared keys of the next dicts, like the ht_cached_keys of a class whose instances all get the same attributes
+class SharedKeysCache(object):
+    def __init__(self, size=PyDictReimplementation32.START_SIZE):
+        self.shared_keys = SharedKeys(size)
+
+
+# A PyDictReimplementation32 that starts as a split table on the shared keys of its cache, like the instance dicts
+# of CPython 3.3. A new key is added to the shared keys while they have room (the other dicts don't have a value for it).
+# When they are full, a dict that is their only user moves to larger shared keys and makes them the shared keys
+# of the cache; any other dict is converted to a combined table, and stays combined.
+# The 3.2 tables are unordered, so unlike in 3.6+, a deletion only clears the value and the dict stays split.
+class SplitTableDict(PyDictReimplementation32):
+    def __init__(self, pairs=None, cache=None):
+        self.cache = cache if cache is not None else SharedKeysCache()
+        self.shared_keys = None
+        BaseDictImpl.__init__(self)
+        # not presized: split tables grow one key at a time, see presize()
+        if pairs:
+            for k, v in pairs:
+                self[k] = v
+
+    def clear(self):
+        self.release_shared_keys()
+        self.shared_keys = self.cache.shared_keys
+        self.shared_keys.users += 1
+        self.split_values = [EMPTY] * len(self.shared_keys)
+        self.slots = None
+        self.fill = 0
+        self.used = 0
+        self.old_slots = None
+        self.old_slots_idx = 0
+
+    def release_shared_keys(self):
+        if self.shared_keys is not None:
+            self.shared_keys.users -= 1
+            self.shared_keys = self.split_values = None
+
+    def __getitem__(self, key):
+        if self.shared_keys is None:
+            return PyDictReimplementation32.__getitem__(self, key)
+
+        value = self.split_values[self.lookdict(key, self.shared_keys)]
+        if value is EMPTY:
+            raise KeyError()
+        return value
+
+    def __setitem__(self, key, value):
+        if self.shared_keys is None:
+            PyDictReimplementation32.__setitem__(self, key, value)
+            return
+
+        try:
+            idx = self.lookdict(key, self.shared_keys)
+        except KeyError:
+            if not self.shared_keys.usable:
+                if self.shared_keys.users > 1 or self.cache.shared_keys is not self.shared_keys:
+                    self.combine()
+                    PyDictReimplementation32.__setitem__(self, key, value)
+                    return
+                self.grow_shared_keys()
+            idx = self.shared_keys.insert_clean(self.probe_sequence, hash(key), key)
+
+        if self.split_values[idx] is EMPTY:
+            self.used += 1
+        self.split_values[idx] = value
+
+    def __delitem__(self, key):
+        if self.shared_keys is None:
+            PyDictReimplementation32.__delitem__(self, key)
+            return
+
+        idx = self.lookdict(key, self.shared_keys)
+        if self.split_values[idx] is EMPTY:
+            raise KeyError()
+        self.split_values[idx] = EMPTY
+        self.used -= 1
+
+    def grow_shared_keys(self):
+        old_keys, old_values = self.shared_keys, self.split_values
+        new_keys = SharedKeys(self.find_nearest_size(2 * len(old_keys)))
+        new_values = [EMPTY] * len(new_keys)
+        for hash_code, key, value in zip(old_keys.hashes, old_keys.keys, old_values):
+            if key is not EMPTY:
+                new_values[new_keys.insert_clean(self.probe_sequence, hash_code, key)] = value
+
+        self.release_shared_keys()
+        new_keys.users = 1
+        self.shared_keys, self.split_values = new_keys, new_values
+        self.cache.shared_keys = new_keys
+
+    def combine(self):
+        entries = list(self.iterentries())
+        self.release_shared_keys()
+        self.slots = SlotsArray(self.START_SIZE)
+        self.fill = 0
+        self.used = 0
+        self.insert_new_entries(entries)
+
+    def iterentries(self):
+        if self.shared_keys is None:
+            for entry in PyDictReimplementation32.iterentries(self):
+                yield entry
+            return
+
+        for hash_code, key, value in zip(self.shared_keys.hashes, self.shared_keys.keys, self.split_values):
+            if value is not EMPTY:
+                yield hash_code, key, value
+
+    def presize(self, count):
+        # split tables grow one key at a time
+        if self.shared_keys is None:
+            PyDictReimplementation32.presize(self, count)
+
+    def insert_new_entries(self, entries):
+        if self.shared_keys is None:
+            PyDictReimplementation32.insert_new_entries(self, entries)
+            return
+        for _, key, value in entries:
+            self[key] = value
@@ -0,0 +1,89 @@
+import unittest
+from common import EMPTY
+from dict_reimplementation import dump_reimpl_dict
+from reimpl_test_common import check_random_operations
+from split_table_dict import SharedKeysCache, SplitTableDict
+
+
+class SplitTableDictTest(unittest.TestCase):
+    def test_shared_keys(self):
+        cache = SharedKeysCache()
+        first = SplitTableDict(cache=cache)
+        # the only user of the shared keys grows them instead of leaving them
+        for i in range(10):
+            first["field{}".format(i)] = i
+        shared_keys = cache.shared_keys
+        self.assertIs(first.shared_keys, shared_keys)
+        self.assertEqual(shared_keys.users, 1)
+        self.assertEqual(len(shared_keys), 32)
+
+        second = SplitTableDict([("field{}".format(i), -i) for i in reversed(range(10))], cache=cache)
+        self.assertIs(second.shared_keys, shared_keys)
+        self.assertEqual(len(second), 10)
+        self.assertEqual(second["field3"], -3)
+        self.assertEqual(first["field3"], 3)
+
+        # a new key that fits is added to the shared keys, the other dicts don't have it
+        second["extra"] = "extra"
+        self.assertIs(second.shared_keys, shared_keys)
+        self.assertNotIn("extra", first)
+        self.assertEqual(len(first), 10)
+
+        # a deletion only clears the value
+        del second["field0"]
+        self.assertIs(second.shared_keys, shared_keys)
+        self.assertNotIn("field0", second)
+        self.assertEqual(first["field0"], 0)
+        with self.assertRaises(KeyError):
+            del second["field0"]
+        with self.assertRaises(KeyError):
+            del second["missing"]
+
+        self.assertEqual(sorted(second.values(), key=str), sorted([-i for i in range(1, 10)] + ["extra"], key=str))
+        hashes, keys, values, fill, used = dump_reimpl_dict(second)
+        self.assertEqual(keys, shared_keys.keys)
+        self.assertEqual(values, second.split_values)
+        self.assertEqual((fill, used), (11, 10))
+        self.assertEqual(hashes[keys.index("extra")], hash("extra"))
+        self.assertIs(hashes[keys.index(EMPTY)], EMPTY)
+
+    def test_combine(self):
+        cache = SharedKeysCache()
+        dicts = [SplitTableDict(cache=cache) for _ in range(2)]
+        for i in range(cache.shared_keys.usable):
+            dicts[0][i] = i
+        shared_keys = cache.shared_keys
+
+        # the shared keys are full, and shared
+        dicts[1]["new"] = "new"
+        self.assertIsNone(dicts[1].shared_keys)
+        self.assertEqual(shared_keys.users, 1)
+        self.assertEqual(dict(dicts[1].items()), {"new": "new"})
+        self.assertEqual(list(dicts[1].values()), ["new"])
+        self.assertEqual(dump_reimpl_dict(dicts[1])[4], 1)
+        self.assertNotIn("new", dicts[0])
+        self.assertIs(dicts[0].shared_keys, shared_keys)
+
+        # new dicts still share the keys
+        self.assertIs(SplitTableDict(cache=cache).shared_keys, shared_keys)
+
+    def test_random_operations(self):
+        # the dicts share the keys of one cache, every dict adds keys to them or ends up combined
+        cache = SharedKeysCache()
+        keys = ["key{}".format(i) for i in range(30)]
+        for seed in range(50):
+            d = SplitTableDict(cache=cache)
+            check_random_operations(self, d, lambda rng: rng.choice(keys), seed, num_ops=200, remove_chance=0.3,
+                                    check_keys=keys + ["missing"])
+
+            d.clear()
+            self.assertEqual(len(d), 0)
+            self.assertIsNotNone(d.shared_keys)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
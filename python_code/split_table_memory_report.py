@@ -0,0 +1,69 @@
+import argparse
+import random
+import sys
+import tracemalloc
+
+from dict_reimplementation import PyDictReimplementation32
+from split_table_dict import SharedKeysCache, SplitTableDict
+
+
+# Records with the same fields, like the objects of a class: a fraction of them gets an extra field of its own
+def generate_records(num_records, num_fields, diverge):
+    fields = ["field{}".format(i) for i in range(num_fields)]
+    records = []
+    for i in range(num_records):
+        pairs = [(field, random.randrange(10 ** 6)) for field in fields]
+        if random.random() < diverge:
+            pairs.append(("extra{}".format(i), i))
+        records.append(pairs)
+    return records
+
+
+def build(factory, records):
+    dicts = []
+    for pairs in records:
+        d = factory()
+        for k, v in pairs:
+            d[k] = v
+        dicts.append(d)
+    return dicts
+
+
+def measure(factory, records):
+    tracemalloc.start()
+    dicts = build(factory, records)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, dicts
+
+
+def run(num_records, fields_counts, diverge):
+    print("{} records, {:.0%} of them with an extra field".format(num_records, diverge))
+    print("{:>8}{:>20}{:>20}{:>10}{:>20}{:>12}".format(
+        "fields", "combined bytes/dict", "split bytes/dict", "saved", "shared keys bytes", "combined"))
+    for num_fields in fields_counts:
+        records = generate_records(num_records, num_fields, diverge)
+        combined_size = measure(PyDictReimplementation32, records)[0]
+
+        # the shared keys are allocated by the first dicts, so they are part of the total
+        cache = SharedKeysCache()
+        split_size, dicts = measure(lambda: SplitTableDict(cache=cache), records)
+        shared_keys_size = sys.getsizeof(cache.shared_keys.hashes) + sys.getsizeof(cache.shared_keys.keys)
+        num_combined = sum(1 for d in dicts if d.shared_keys is None)
+
+        print("{:>8}{:>20.1f}{:>20.1f}{:>10.0%}{:>20}{:>12}".format(
+            num_fields, float(combined_size) / num_records, float(split_size) / num_records,
+            1 - float(split_size) / combined_size, shared_keys_size, num_combined))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the memory of many dicts with the same keys, '
+                                                 'as combined tables and as split tables sharing their keys')
+    parser.add_argument('--num-records', type=int, default=10000)
+    parser.add_argument('--num-fields', type=int, action='append')
+    parser.add_argument('--diverge', type=float, default=0.0, help='fraction of the records with an extra key of their own')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    run(args.num_records, args.num_fields or [5, 10, 20, 50], args.diverge)
@@ -0,0 +1,119 @@
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The same matrix as stress_test_python.sh: (reference implementation, tested implementations, initial sizes)
+DICT_TESTS = [
+    ("dict_actual", ["dict32_reimpl_py_extracted", "dict_actual", "dict32_reimpl_py", "dict32_reimpl_js"]),
+    ("almost_python_dict_no_recycling_py", ["almost_python_dict_no_recycling_py_simpler", "almost_python_dict_no_recycling_py_extracted", "almost_python_dict_no_recycling_js"]),
+    ("almost_python_dict_recycling_py", ["almost_python_dict_recycling_py_extracted", "almost_python_dict_recycling_js"]),
+]
+# the real dicts of 3.11+ can be checked against the compact reimplementation
+if sys.version_info >= (3, 11):
+    DICT_TESTS.append(("dict_actual_setitem", ["dict311_reimpl_py"]))
+DICT_INITIAL_SIZES = [0, 9, -1]
+CHAPTER2_IMPLEMENTATIONS = ["js_reimpl", "py_extracted"]
+CHAPTER2_INITIAL_SIZES = [5, 10, 20, -1]
+CHAPTER1_IMPLEMENTATIONS = ["js", "py_extracted"]
+
+
+def is_js(name):
+    return name.startswith("js") or name.endswith("_js")
+
+
+def script(name):
+    return os.path.join("python_code", name)
+
+
+# Every cell is (name, uses the node server, command line)
+def expand_matrix(num_inserts, num_inserts_smaller, protocol):
+    cells = []
+    for kv in ["numbers", "all"]:
+        for ref, reimpls in DICT_TESTS:
+            for initial_size in DICT_INITIAL_SIZES:
+                for reimpl in reimpls:
+                    cells.append(("{} vs {}, kv={}, initial size={}".format(reimpl, ref, kv, initial_size), is_js(reimpl), [
+                        script("dict32_reimplementation_test_v2.py"), "--reference-implementation", ref,
+                        "--test-implementation", reimpl, "--no-extra-getitem-checks", "--num-inserts", str(num_inserts),
+                        "--kv", kv, "--initial-size", str(initial_size), "--protocol", protocol]))
+
+        for initial_size in CHAPTER2_INITIAL_SIZES:
+            for reimpl in CHAPTER2_IMPLEMENTATIONS:
+                cells.append(("chapter2 {}, kv={}, initial size={}".format(reimpl, kv, initial_size), is_js(reimpl), [
+                    script("hash_chapter2_reimplementation_test.py"), "--test-implementation", reimpl,
+                    "--num-inserts", str(num_inserts), "--initial-size", str(initial_size), "--kv", kv, "--protocol", protocol]))
+
+    for reimpl in CHAPTER1_IMPLEMENTATIONS:
+        cells.append(("chapter1 {}".format(reimpl), is_js(reimpl), [
+            script("hash_chapter1_reimplementation_test.py"), "--test-implementation", reimpl, "--num-inserts", str(num_inserts_smaller)]))
+        cells.append(("chapter1 linear search {}".format(reimpl), is_js(reimpl), [
+            script("chapter1_linear_search_reimplementation_test.py"), "--test-implementation", reimpl, "--size", str(num_inserts_smaller)]))
+
+    cells.append(("chapter4 probing visualization", True, [script("chapter4_probing_python_reimplementation_test.py")]))
+    return cells
+
+
+def run_cell(cell):
+    name, uses_js, args = cell
+    start = timeit.default_timer()
+    process = subprocess.Popen([sys.executable] + args, cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.communicate()[0].decode('UTF-8', 'replace')
+    return {
+        "name": name,
+        "command": " ".join(["python3"] + args),
+        "passed": process.returncode == 0,
+        "seconds": timeit.default_timer() - start,
+        "output": output,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the stress tests of stress_test_python.sh in parallel. '
+                                                 'The js cells need a running node server (npm run dictserver)')
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help='number of cells run at the same time')
+    parser.add_argument('--num-inserts', type=int, default=200)
+    parser.add_argument('--num-inserts-smaller', type=int, default=100)
+    parser.add_argument('--protocol', choices=["json", "binary"], default="json", help='wire format of the js implementations')
+    parser.add_argument('--no-js', action='store_true', help='skip the cells that need the node server')
+    parser.add_argument('--filter', help='only run the cells with this substring in the name')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args()
+
+    cells = expand_matrix(args.num_inserts, args.num_inserts_smaller, args.protocol)
+    if args.no_js:
+        cells = [cell for cell in cells if not cell[1]]
+    if args.filter:
+        cells = [cell for cell in cells if args.filter in cell[0]]
+    if any(cell[1] for cell in cells) and not os.path.exists(os.path.join(ROOT_DIR, "pynode.sock")):
+        parser.error("pynode.sock does not exist, start the node server with npm run dictserver or use --no-js")
+
+    start = timeit.default_timer()
+    # the cells are separate processes, the threads only wait for them
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(run_cell, cells))
+    total_seconds = timeit.default_timer() - start
+
+    for result in results:
+        print("{:<6}{:>8.2f}s  {}".format("ok" if result["passed"] else "FAIL", result["seconds"], result["name"]))
+    for result in results:
+        if not result["passed"]:
+            print("")
+            print("FAILED: {}".format(result["command"]))
+            print(result["output"])
+
+    failed = sum(1 for result in results if not result["passed"])
+    print("{} cells, {} failed, {:.2f}s total, slowest cell {:.2f}s".format(
+        len(results), failed, total_seconds, max(result["seconds"] for result in results)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"total_seconds": total_seconds, "results": results}, f, indent=2, sort_keys=True)
+
+    sys.exit(1 if failed else 0)
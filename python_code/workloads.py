@@ -0,0 +1,156 @@
+import bisect
+import itertools
+import random
+import string
+
+from common import AllKeyValueFactory, IntKeyValueFactory
+
+# Batch generators of keys: every function returns a list of n keys and draws its randomness from rng (a random.Random),
+# so a seeded rng always gives the same keys.
+ALPHANUMERIC = string.ascii_uppercase + string.digits
+UNICODE = ALPHANUMERIC + "йцукенгшщзхъфывапролджэячсмитьбю"
+
+_translate_tables = {}
+
+
+def random_chars(rng, count, alphabet):
+    # one getrandbits() call for all the characters instead of a random.choice() per character,
+    # the bytes are mapped to the alphabet by str.translate() (with a small bias if 256 is not a multiple of its length)
+    if count == 0:
+        return ""
+    table = _translate_tables.get(alphabet)
+    if table is None:
+        table = _translate_tables[alphabet] = dict((b, alphabet[b % len(alphabet)]) for b in range(256))
+    return rng.getrandbits(8 * count).to_bytes(count, 'little').decode('latin-1').translate(table)
+
+
+def random_strings(rng, n, min_len, max_len, alphabet=ALPHANUMERIC):
+    lengths = [rng.randint(min_len, max_len) for _ in range(n)]
+    chars = random_chars(rng, sum(lengths), alphabet)
+    strings = []
+    pos = 0
+    for length in lengths:
+        strings.append(chars[pos:pos + length])
+        pos += length
+    return strings
+
+
+def shared_prefix_strings(rng, n, prefix, suffix_len=6):
+    # long keys that only differ at the end, like paths or namespaced ids: every comparison walks the whole prefix
+    return [prefix + suffix for suffix in random_strings(rng, n, suffix_len, suffix_len)]
+
+
+def uniform_ints(rng, n, key_range):
+    randrange = rng.randrange
+    return [randrange(key_range) for _ in range(n)]
+
+
+def sequential_ints(n, start=0):
+    return list(range(start, start + n))
+
+
+def strided_ints(n, stride, start=0):
+    return list(range(start, start + n * stride, stride))
+
+
+def colliding_ints(rng, n, table_size, residue=0):
+    # hash(x) == x for ints below 2**61 - 1, so all these keys start probing from the same slot
+    # in any table of table_size slots or fewer (when table_size is a power of two)
+    limit = (2 ** 61 - 2 - residue) // table_size
+    return [residue + table_size * m for m in rng.sample(range(limit), n)]
+
+
+class ZipfDistribution(object):
+    # population is ordered from the hottest key, the key of rank r is drawn with a probability proportional to 1 / r ** exponent
+    def __init__(self, population, exponent=1.1):
+        self.population = list(population)
+        self.cumulative = list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, len(self.population) + 1)))
+
+    def sample(self, rng, n):
+        total = self.cumulative[-1]
+        population, cumulative, uniform = self.population, self.cumulative, rng.random
+        last = len(population) - 1
+        return [population[min(bisect.bisect(cumulative, uniform() * total), last)] for _ in range(n)]
+
+
+# (upper bound of the random number, min length, max length) of the strings of common.AllKeyValueFactory
+MIXED_STRING_LENGTHS = [(0.21, 1, 1), (0.51, 2, 2), (0.71, 3, 3), (0.88, 4, 25)]
+
+
+def mixed_objects(rng, n, int_range):
+    # the distribution of common.AllKeyValueFactory: ints, long numeric strings, unicode strings and None
+    kinds = [rng.random() for _ in range(n)]
+    objects = [None] * n
+    for i, r in enumerate(kinds):
+        if r <= 0.1:
+            objects[i] = rng.randrange(int_range) - int_range // 2
+        elif r <= 0.2:
+            digits = random_chars(rng, rng.randint(20, 50), string.digits)
+            objects[i] = ("-" if rng.random() < 0.5 else "") + str(rng.randint(1, 9)) + digits
+
+    # the strings are generated in one batch per length range
+    low = 0.2
+    for high, min_len, max_len in MIXED_STRING_LENGTHS:
+        slots = [i for i, r in enumerate(kinds) if low < r <= high]
+        for i, s in zip(slots, random_strings(rng, len(slots), min_len, max_len, UNICODE)):
+            objects[i] = s
+        low = high
+    return objects
+
+
+class BatchKeyValueFactory(object):
+    # the generate_key() / generate_value() interface of the factories in common.py over a function returning
+    # the next batch of keys, so the stress tests and the benchmarks can use any of the generators
+    BATCH_SIZE = 1024
+
+    def __init__(self, next_batch):
+        self._next_batch = next_batch
+        self._keys = []
+        self._insert_count = 0
+
+    def generate_key(self):
+        if not self._keys:
+            self._keys = self._next_batch(self.BATCH_SIZE)
+            self._keys.reverse()
+        return self._keys.pop()
+
+    def generate_value(self):
+        self._insert_count += 1
+        return self._insert_count
+
+
+KV_CHOICES = ["numbers", "all", "mixed", "zipf", "sequential", "strided", "prefix", "colliding"]
+
+STRIDE = 1024
+COLLIDING_TABLE_SIZE = 1024
+
+
+def make_kv_factory(kv, n_inserts, seed=None):
+    # numbers and all are the original factories; without a seed, the keys follow the global random state
+    if kv == "numbers":
+        return IntKeyValueFactory(n_inserts)
+    if kv == "all":
+        return AllKeyValueFactory(n_inserts)
+
+    rng = random.Random(seed if seed is not None else random.getrandbits(64))
+    if kv == "mixed":
+        return BatchKeyValueFactory(lambda n: mixed_objects(rng, n, n_inserts))
+    if kv == "zipf":
+        population = list(range(n_inserts))
+        rng.shuffle(population)
+        zipf = ZipfDistribution(population)
+        return BatchKeyValueFactory(lambda n: zipf.sample(rng, n))
+    if kv == "sequential":
+        counter = itertools.count()
+        return BatchKeyValueFactory(lambda n: list(itertools.islice(counter, n)))
+    if kv == "strided":
+        counter = itertools.count(0, STRIDE)
+        return BatchKeyValueFactory(lambda n: list(itertools.islice(counter, n)))
+    if kv == "prefix":
+        prefix = random_chars(rng, 64, ALPHANUMERIC)
+        return BatchKeyValueFactory(lambda n: shared_prefix_strings(rng, n, prefix, 3))
+    if kv == "colliding":
+        # like numbers, the keys are drawn from a pool of n_inserts keys, so some of them repeat
+        pool = colliding_ints(rng, max(n_inserts, 1), COLLIDING_TABLE_SIZE)
+        return BatchKeyValueFactory(lambda n: [rng.choice(pool) for _ in range(n)])
+    raise ValueError("Unknown kv: {}".format(kv))
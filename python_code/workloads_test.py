@@ -0,0 +1,46 @@
+import random
+import unittest
+
+from workloads import KV_CHOICES, ZipfDistribution, colliding_ints, make_kv_factory, mixed_objects, random_strings, shared_prefix_strings, strided_ints
+
+
+class WorkloadsTest(unittest.TestCase):
+    def test_seeded(self):
+        for kv in KV_CHOICES:
+            if kv in ("numbers", "all"):
+                continue
+            a, b = make_kv_factory(kv, 100, seed=5), make_kv_factory(kv, 100, seed=5)
+            self.assertEqual([a.generate_key() for _ in range(3000)], [b.generate_key() for _ in range(3000)])
+
+        self.assertEqual(mixed_objects(random.Random(1), 500, 100), mixed_objects(random.Random(1), 500, 100))
+
+    def test_strings(self):
+        rng = random.Random(1)
+        strings = random_strings(rng, 1000, 2, 5, "ab")
+        self.assertTrue(all(2 <= len(s) <= 5 and set(s) <= set("ab") for s in strings))
+        self.assertEqual(set(len(s) for s in strings), set([2, 3, 4, 5]))
+
+        keys = shared_prefix_strings(rng, 100, "x" * 50, 4)
+        self.assertTrue(all(len(k) == 54 and k.startswith("x" * 50) for k in keys))
+
+    def test_ints(self):
+        self.assertEqual(strided_ints(4, 8, 1), [1, 9, 17, 25])
+
+        keys = colliding_ints(random.Random(1), 1000, 1024, residue=3)
+        self.assertEqual(len(set(keys)), 1000)
+        self.assertEqual(set(hash(k) % 1024 for k in keys), set([3]))
+        self.assertEqual(set(hash(k) % 8 for k in keys), set([3]))
+
+    def test_zipf(self):
+        zipf = ZipfDistribution(["hot", "warm"] + list(range(1000)))
+        keys = zipf.sample(random.Random(1), 10000)
+        self.assertGreater(keys.count("hot"), keys.count("warm"))
+        self.assertGreater(keys.count("warm"), keys.count(500) * 10)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
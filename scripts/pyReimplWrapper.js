@@ -1,5 +1,4 @@
 const net = require('net');
-const split = require('split');
 import 'ignore-styles';
 
 import {BigNumber} from 'bignumber.js';
@@ -15,9 +14,12 @@ import {List as ImmutableList} from 'immutable';
 function parseSimplePyObj(obj) {
     if (obj === null || typeof obj === 'string') {
         return obj;
+    } else if (typeof obj === 'number') {
+        // the binary protocol sends small ints as plain numbers
+        return BigNumber(obj);
     } else if (typeof obj === 'object' && obj.type === 'None') {
         let res = None;
-        // TODO FIXME: this does not support multiple clients
+        // pyHash() reads the hash from the None singleton, handleRequest() restores the hash of the client for every request
         res._hashCode = obj.hash;
         return res;
     } else if (typeof obj === 'object' && obj.type === 'DUMMY') {
@@ -62,6 +64,168 @@ function dumpSimplePyObj(obj) {
     }
 }
 
+// The binary protocol, see js_reimpl_common.py for the format.
+// Values are decoded to the same objects JSON.parse() gives for the json protocol, except for small ints,
+// which become plain numbers, and encoded from the same objects that are passed to JSON.stringify().
+const MAX_NUMBER_INT_BYTES = 6;
+
+function decodeVarint(buf, pos) {
+    let n = 0;
+    let mul = 1;
+    while (true) {
+        const byte = buf[pos++];
+        n += (byte & 0x7f) * mul;
+        if (byte < 0x80) {
+            return [n, pos];
+        }
+        mul *= 128;
+    }
+}
+
+function decodeValue(buf, pos, noneHash) {
+    const tag = String.fromCharCode(buf[pos++]);
+    switch (tag) {
+        case 'n':
+            return [null, pos];
+        case 'T':
+            return [true, pos];
+        case 'F':
+            return [false, pos];
+        case 'N':
+            return [{type: 'None', hash: noneHash}, pos];
+        case 'D':
+            return [{type: 'DUMMY'}, pos];
+        case 'i':
+        case 'j': {
+            let length;
+            [length, pos] = decodeVarint(buf, pos);
+            let value = length > 0 ? new BigNumber(buf.toString('hex', pos, pos + length), 16) : new BigNumber(0);
+            if (tag === 'j') {
+                value = value.negated();
+            }
+            if (length <= MAX_NUMBER_INT_BYTES) {
+                return [value.toNumber(), pos + length];
+            }
+            return [{type: 'int', value: value.toFixed()}, pos + length];
+        }
+        case 's': {
+            let length;
+            [length, pos] = decodeVarint(buf, pos);
+            return [buf.toString('utf8', pos, pos + length), pos + length];
+        }
+        case 'l': {
+            let count;
+            [count, pos] = decodeVarint(buf, pos);
+            const res = [];
+            for (let i = 0; i < count; ++i) {
+                let item;
+                [item, pos] = decodeValue(buf, pos, noneHash);
+                res.push(item);
+            }
+            return [res, pos];
+        }
+        case 'm': {
+            let count;
+            [count, pos] = decodeVarint(buf, pos);
+            const res = {};
+            for (let i = 0; i < count; ++i) {
+                let length;
+                [length, pos] = decodeVarint(buf, pos);
+                const name = buf.toString('utf8', pos, pos + length);
+                [res[name], pos] = decodeValue(buf, pos + length, noneHash);
+            }
+            return [res, pos];
+        }
+        default:
+            throw new Error('Unknown tag: ' + tag);
+    }
+}
+
+function encodeVarint(parts, n) {
+    const bytes = [];
+    while (n >= 0x80) {
+        bytes.push((n % 0x80) | 0x80);
+        n = Math.floor(n / 0x80);
+    }
+    bytes.push(n);
+    parts.push(Buffer.from(bytes));
+}
+
+function encodeTag(parts, tag) {
+    parts.push(Buffer.from(tag, 'ascii'));
+}
+
+function encodeString(parts, s) {
+    const encoded = Buffer.from(s, 'utf8');
+    encodeVarint(parts, encoded.length);
+    parts.push(encoded);
+}
+
+function encodeInt(parts, num) {
+    encodeTag(parts, num.isNegative() ? 'j' : 'i');
+    let hex = num.abs().toString(16);
+    if (hex === '0') {
+        hex = '';
+    } else if (hex.length % 2 === 1) {
+        hex = '0' + hex;
+    }
+    const encoded = Buffer.from(hex, 'hex');
+    encodeVarint(parts, encoded.length);
+    parts.push(encoded);
+}
+
+function encodeValue(parts, obj) {
+    if (obj === null || obj === undefined) {
+        encodeTag(parts, 'n');
+    } else if (obj === true) {
+        encodeTag(parts, 'T');
+    } else if (obj === false) {
+        encodeTag(parts, 'F');
+    } else if (typeof obj === 'number') {
+        if (!Number.isInteger(obj)) {
+            throw new Error(`Can't encode ${obj}`);
+        }
+        encodeInt(parts, BigNumber(obj));
+    } else if (BigNumber.isBigNumber(obj)) {
+        encodeInt(parts, obj);
+    } else if (typeof obj === 'string') {
+        encodeTag(parts, 's');
+        encodeString(parts, obj);
+    } else if (ImmutableList.isList(obj)) {
+        // the tables are Immutable lists, JSON.stringify() turns them into arrays with toJSON()
+        encodeValue(parts, obj.toArray());
+    } else if (Array.isArray(obj)) {
+        encodeTag(parts, 'l');
+        encodeVarint(parts, obj.length);
+        for (const item of obj) {
+            encodeValue(parts, item);
+        }
+    } else if (obj.type === 'int' && obj.value !== undefined) {
+        encodeInt(parts, BigNumber(obj.value));
+    } else if (obj.type === 'None') {
+        encodeTag(parts, 'N');
+    } else if (obj.type === 'DUMMY') {
+        encodeTag(parts, 'D');
+    } else {
+        // like JSON.stringify(), skip undefined properties
+        const names = Object.keys(obj).filter(name => obj[name] !== undefined);
+        encodeTag(parts, 'm');
+        encodeVarint(parts, names.length);
+        for (const name of names) {
+            encodeString(parts, name);
+            encodeValue(parts, obj[name]);
+        }
+    }
+}
+
+function encodeFrame(obj) {
+    const parts = [Buffer.alloc(4)];
+    encodeValue(parts, obj);
+    const frame = Buffer.concat(parts);
+    frame.writeUInt32BE(frame.length - 4, 0);
+    return frame;
+}
+
 function restorePyDictState(state) {
     let {pySelf} = Dict32.__init__();
     if (state.slots != null) {
@@ -205,16 +369,22 @@ function chapter2run(hashCodes, keys, op, key, array) {
 
 const server = net.createServer(c => {
     console.log('Client connected');
+    // The table of the last dict op lives here between requests, every python JsImplBase object has its own connection.
+    // Session requests and the ops of a batch continue from it.
+    let sessionPySelf = null;
+    // hash(None) is different in every python process, and the connections can come from different processes
+    let noneHash = null;
 
     c.on('end', () => {
         console.log('Client disconnected');
     });
 
-    c.pipe(split()).on('data', line => {
-        console.log('Received line of length ' + line.length);
-        if (!line) return;
+    function handleRequest(data) {
+        // Everything is synchronous, so no other connection can change None between here and the end of the request
+        if (noneHash !== null) {
+            None._hashCode = noneHash;
+        }
 
-        const data = JSON.parse(line);
         const dictType = data.dict;
         const op = data.op;
         let {key, value, pairs, array} = data.args;
@@ -231,14 +401,14 @@ const server = net.createServer(c => {
             array = parseArray(array);
         }
 
-        console.log(op, data.args);
-
         let isException, result;
         let response;
 
         if (dictType === 'dict32' || dictType === 'almost_python_dict') {
-            let pySelf = restorePyDictState(data.self);
-            if (dictType === 'dict32') {
+            let pySelf = data.session ? sessionPySelf : restorePyDictState(data.self);
+            if (op === '__dump__') {
+                // Returns the table without changing it
+            } else if (dictType === 'dict32') {
                 ({pySelf, isException, result} = dict32RunOp(pySelf, op, key, value, pairs));
             } else if (dictType === 'almost_python_dict') {
                 ({pySelf, isException, result} = almostPyDictRunOp(pySelf, op, key, value, pairs));
@@ -249,8 +419,11 @@ const server = net.createServer(c => {
             response = {
                 exception: isException || false,
                 result: result !== undefined ? dumpSimplePyObj(result) : null,
-                self: dumpPyDictState(pySelf),
             };
+            sessionPySelf = pySelf;
+            if (!data.session || op === '__dump__') {
+                response.self = dumpPyDictState(pySelf);
+            }
         } else if (dictType === 'chapter2') {
             let hashCodes = data.hashCodes != null ? new ImmutableList(parseArray(data.hashCodes)) : undefined;
             let keys = data.keys != null ? new ImmutableList(parseArray(data.keys)) : undefined;
@@ -278,7 +451,96 @@ const server = net.createServer(c => {
             throw new Error('Unknown dict type');
         }
 
-        c.write(JSON.stringify(response) + '\n');
+        // The request could have had a None with the hash of the client
+        noneHash = None._hashCode;
+        return response;
+    }
+
+    function handleMessage(data) {
+        // A batch is an array of requests in one message, the responses come back in the same order in one message
+        return data.batch ? {batch: data.batch.map(handleRequest)} : handleRequest(data);
+    }
+
+    // A request that fails gets an error response instead of taking down the server and the other connections with it.
+    // A failed batch stops at the failed request, the session keeps the table of the request before it.
+    function respond(handle, encode) {
+        let encoded;
+        try {
+            encoded = encode(handle());
+        } catch (err) {
+            console.error('Request failed: ' + err.message);
+            encoded = encode({error: err.message});
+        }
+        c.write(encoded);
+    }
+
+    function encodeLine(response) {
+        return JSON.stringify(response) + '\n';
+    }
+
+    function handleLine(line) {
+        const data = JSON.parse(line);
+        if (data.protocol === 'binary') {
+            isBinary = true;
+            noneHash = data.noneHash;
+            return {protocol: 'binary'};
+        }
+        return handleMessage(data);
+    }
+
+    // Every connection starts with newline-delimited json. A {"protocol": "binary"} line switches it to
+    // length-prefixed binary frames.
+    let isBinary = false;
+    // The received data is kept as a list of chunks and concatenated once per message, a large batch frame can come in
+    // many chunks. Only the last chunk can have a newline, the ones before it were searched when they came in.
+    let chunks = [];
+    let bufferedLength = 0;
+
+    function takeBytes(n) {
+        const buffered = chunks.length === 1 ? chunks[0] : Buffer.concat(chunks, bufferedLength);
+        chunks = buffered.length > n ? [buffered.slice(n)] : [];
+        bufferedLength -= n;
+        return buffered.slice(0, n);
+    }
+
+    function readMessages() {
+        while (chunks.length) {
+            if (!isBinary) {
+                const last = chunks[chunks.length - 1];
+                const end = last.indexOf(10);
+                if (end === -1) break;
+                const line = takeBytes(bufferedLength - last.length + end + 1);
+                if (line.length === 1) continue;
+
+                respond(() => handleLine(line.toString('utf8', 0, line.length - 1)), encodeLine);
+            } else {
+                if (bufferedLength < 4) break;
+                if (chunks[0].length < 4) {
+                    chunks = [Buffer.concat(chunks, bufferedLength)];
+                }
+                const length = chunks[0].readUInt32BE(0);
+                if (bufferedLength < 4 + length) break;
+
+                const frame = takeBytes(4 + length);
+                respond(() => handleMessage(decodeValue(frame, 4, noneHash)[0]), encodeFrame);
+            }
+        }
+    }
+
+    c.on('data', chunk => {
+        chunks.push(chunk);
+        bufferedLength += chunk.length;
+        try {
+            readMessages();
+        } catch (err) {
+            // the stream can't be read any further, only this connection is closed
+            console.error('Closing the connection: ' + err.message);
+            c.destroy();
+        }
+    });
+
+    c.on('error', err => {
+        console.error('Connection error: ' + err.message);
     });
 });
 
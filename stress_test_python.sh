@@ -1,6 +1,7 @@
 #!/bin/bash
 set -e -o pipefail
 
+# python_code/stress_test_matrix.py runs the same matrix in parallel
 NUM_INSERTS=200
 NUM_INSERTS_SMALLER=100
 
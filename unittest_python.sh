@@ -5,6 +5,16 @@ eval "`pyenv init -`"
 pyenv shell 3.2.6
 
 python3 python_code/hash_chapter2_impl_test.py
+python3 python_code/hash_chapter2_vectorized_test.py
+python3 python_code/hash_chapter2_mmap_test.py
+python3 python_code/hash_chapter2_int_table_test.py
 python3 python_code/hash_chapter3_class_impl_test.py
+python3 python_code/dict_reimplementation_test.py
+python3 python_code/robin_hood_dict_test.py
+python3 python_code/direct_address_dict_test.py
+python3 python_code/split_table_dict_test.py
+python3 python_code/js_reimpl_common_test.py
+python3 python_code/dict_health_test.py
+python3 python_code/workloads_test.py
 python3 python_code/interface_test.py
 python3 python_code/actual_dict_factory_test.py